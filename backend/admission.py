@@ -0,0 +1,232 @@
+"""
+Admission control for outbound LNbits calls: token-bucket rate limits,
+globally and per wallet, a cap on requests in flight and a bounded
+queue in front of it. Calls that can't be admitted within `max_wait`
+are rejected right away instead of piling up on a struggling LNbits.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from cache import TTLCache
+from metrics import LNBITS_ADMISSION_REJECTIONS, LNBITS_ADMISSION_WAITING
+
+
+# Rejection reasons, also used as the metrics label
+REJECT_WALLET_RATE = "wallet_rate"
+REJECT_RATE = "rate"
+REJECT_QUEUE_FULL = "queue_full"
+REJECT_QUEUE_TIMEOUT = "queue_timeout"
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised instead of sending a call to LNbits.
+
+    `status_code` is 429 when one wallet is over its own limit and 503 when
+    the backend as a whole is; `retry_after` is a hint in seconds.
+    """
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = 429 if reason == REJECT_WALLET_RATE else 503
+        super().__init__(
+            "Too many requests for this wallet, try again later" if self.status_code == 429
+            else "LNbits is overloaded, try again later"
+        )
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self._rate = rate
+        self._burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+
+    def reserve(self, max_wait: float) -> float | None:
+        """
+        Takes a token, borrowing from the future if none is left.
+
+        Returns:
+            - seconds to wait before the call may go out, or None (and no
+                token taken) if that would be longer than max_wait
+        """
+        now = self._clock()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+        wait = max(0.0, (1 - self._tokens) / self._rate)
+        if wait > max_wait:
+            return None
+        self._tokens -= 1
+        return wait
+
+    def refund(self) -> None:
+        """Gives back a token taken for a call that never went out."""
+        self._tokens = min(self._burst, self._tokens + 1)
+
+
+class AdmissionController:
+    """
+    Decides whether a call to LNbits may go out now, after a short wait, or
+    not at all.
+
+    A call first takes a token from its wallet's bucket and from the global
+    bucket, then a slot among the `max_in_flight` calls LNbits may be
+    working on. Tokens of a call that is rejected or cancelled before it
+    goes out are given back. Calls wait for slots in FIFO order; when `max_queue` calls
+    are already waiting, or a call would wait longer than `max_wait`, it is
+    rejected with AdmissionRejected. Keys passed to exempt(), such as the
+    house wallet's, skip the per-wallet limit.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 100,
+        max_queue: int = 500,
+        max_wait: float = 2.0,
+        rate: float = 0.0,
+        burst: float = 0.0,
+        wallet_rate: float = 0.0,
+        wallet_burst: float = 0.0,
+        max_wallets: int = 100000,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            - max_in_flight (int): calls sent to LNbits at the same time
+            - max_queue (int): calls waiting for a slot before new ones are rejected
+            - max_wait (float): longest a call waits for a token or a slot, in seconds
+            - rate (float): calls per second across all wallets, 0 for no limit
+            - burst (float): calls allowed at once above `rate`, at least 1
+            - wallet_rate (float): calls per second per wallet key, 0 for no limit
+            - wallet_burst (float): calls allowed at once above `wallet_rate`, at least 1
+            - max_wallets (int): per-wallet buckets kept
+            - clock (callable): monotonic time source, overridable in tests
+        """
+        self._max_in_flight = max_in_flight
+        self._max_queue = max_queue
+        self._max_wait = max_wait
+        self._clock = clock
+
+        self._bucket = TokenBucket(rate, max(burst, 1), clock) if rate > 0 else None
+        self._wallet_rate = wallet_rate
+        self._wallet_burst = max(wallet_burst, 1)
+        # A bucket left alone until it is full again is the same as a new one
+        self._wallet_buckets = (
+            TTLCache(ttl=self._wallet_burst / wallet_rate, maxsize=max_wallets, clock=clock)
+            if wallet_rate > 0 else None
+        )
+        self._exempt: set[str] = set()
+
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def exempt(self, *wallet_keys: str) -> None:
+        """Lifts the per-wallet limit for these keys."""
+        self._exempt.update(wallet_keys)
+
+    @asynccontextmanager
+    async def admit(self, wallet_key: str | None = None):
+        """
+        Holds an in-flight slot for the duration of the block.
+
+        Raises:
+            - AdmissionRejected if the call can't be admitted within max_wait
+        """
+        delay, buckets = self._reserve_tokens(wallet_key)
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._acquire()
+        except BaseException:
+            for bucket in buckets:
+                bucket.refund()
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _reserve_tokens(self, wallet_key: str | None) -> tuple[float, list[TokenBucket]]:
+        """
+        Returns:
+            - seconds to wait before the call may go out, and the buckets a
+                token was taken from; none is taken if the call is rejected
+        """
+        delay = 0.0
+        buckets = []
+        if self._wallet_buckets is not None and wallet_key is not None and wallet_key not in self._exempt:
+            _, bucket = self._wallet_buckets.peek(wallet_key)
+            if bucket is None:
+                bucket = TokenBucket(self._wallet_rate, self._wallet_burst, self._clock)
+            wait = bucket.reserve(self._max_wait)
+            self._wallet_buckets.set(wallet_key, bucket)
+            if wait is None:
+                self._reject(REJECT_WALLET_RATE, self._wallet_burst / self._wallet_rate)
+            delay = wait
+            buckets.append(bucket)
+
+        if self._bucket is not None:
+            wait = self._bucket.reserve(self._max_wait - delay)
+            if wait is None:
+                for bucket in buckets:
+                    bucket.refund()
+                self._reject(REJECT_RATE, self._max_wait)
+            delay = max(delay, wait)
+            buckets.append(self._bucket)
+        return delay, buckets
+
+    async def _acquire(self) -> None:
+        if self._in_flight < self._max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+        if len(self._waiters) >= self._max_queue:
+            self._reject(REJECT_QUEUE_FULL, self._max_wait)
+
+        # A released slot is handed straight to the first waiter
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        LNBITS_ADMISSION_WAITING.inc()
+        try:
+            await asyncio.wait({slot}, timeout=self._max_wait)
+        except BaseException:
+            if slot.done():
+                self._release()
+            slot.cancel()
+            raise
+        finally:
+            if slot in self._waiters:
+                self._waiters.remove(slot)
+            LNBITS_ADMISSION_WAITING.dec()
+
+        if not slot.done():
+            slot.cancel()
+            self._reject(REJECT_QUEUE_TIMEOUT, self._max_wait)
+
+    def _release(self) -> None:
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self._in_flight -= 1
+
+    @staticmethod
+    def _reject(reason: str, retry_after: float):
+        LNBITS_ADMISSION_REJECTIONS.inc(reason=reason)
+        raise AdmissionRejected(reason, retry_after)
@@ -1,14 +1,82 @@
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
-from service import LNbits
-from fastapi import FastAPI, HTTPException
+import hashlib
+import hmac
+import json
+import logging
+import math
+import os
+import secrets
+import time
+from service import PAYMENT_FAILED, PAYMENT_SUCCESS, AsyncLNbits, TransferError
+from payouts import PayoutEngine, PayoutOrder
+from cache import TTLCache
+from wallet_pool import WalletPool
+from match_locks import MatchLocks
+from idempotency import IdempotencyConflict, IdempotencyStore
+from settlement import SettlementTracker
+from pools import settle_pool
+from odds import OddsEngine
+from wallet_events import WalletEventBus
+from ledger import ENTRY_BET, ENTRY_DEPOSIT, ENTRY_REVERSAL, ENTRY_WINNINGS, InsufficientFunds, Ledger, LedgerSettler
+from bet_store import Bet, BetStore, Match, MatchClosed, Payout, SQLiteBetStore, BET_LOST, BET_OPEN, BET_PAID, BET_PAYING, BET_PAYOUT_FAILED, BET_PENDING, BET_VOID, BET_WON, MATCH_CLOSED, MATCH_OPEN
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from metrics import HTTP_REQUEST_DURATION, LEDGER_BALANCE, LNBITS_CIRCUIT_STATE, OPEN_BETS, REGISTRY
+from resilience import CIRCUIT_STATES
+from admission import AdmissionController, AdmissionRejected
+from catalog import FileFixtureSource, MatchCatalog, SportsDbFixtureSource
+from leaderboard import WINDOW_ALL, WINDOWS, Leaderboard
+from logs import setup_logging, shutdown_logging
+from pydantic import BaseModel, Field
 import uvicorn
-from service import LNbits
 # from models import Account, Wallet, WalletInfo, Invoice
-from typing import Optional, Dict, List
-
-app = FastAPI()
+from typing import Literal, Optional, Dict, List
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging(
+        level=LOG_LEVEL,
+        # Events logged on every bet are only kept in part
+        sample_rates={"bet_placed": LOG_SAMPLE_RATE}
+    )
+    wallet_pool.start()
+    settlement_tracker.start()
+    await resume_pending_payments()
+    await release_interrupted_payouts()
+    if match_catalog is not None:
+        # Bets are validated against the catalog, so load it before serving
+        await match_catalog.refresh()
+        match_catalog.start()
+    if ledger_settler is not None:
+        ledger_settler.start()
+    await load_leaderboard()
+    yield
+    if ledger_settler is not None:
+        await ledger_settler.stop()
+    await settlement_tracker.stop()
+    if match_catalog is not None:
+        await match_catalog.stop()
+    await wallet_pool.stop()
+    await wallet_pool.close()
+    # Release the pooled LNbits connections on shutdown
+    await client.aclose()
+    await bet_store.close()
+    if ledger is not None:
+        await ledger.close()
+    shutdown_logging()
+
+
+logger = logging.getLogger("backend")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for frontend integration
 app.add_middleware(
@@ -19,6 +87,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template so /api/balance/{wallet_inkey} is one series
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status
+        )
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    """Turns calls refused by LNbits admission control into a fast 429 or 503."""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"success": False, "message": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
 # # Initialize LNbits client
 # client = LNbits("d8b998eb-43b2-4b5c-99c8-09be784d7130-00-2vruzzgf8t7wo.picard.replit.dev")
 
@@ -27,7 +123,155 @@ app.add_middleware(
 # ADMIN_WALLET_ADMINKEY = "YOUR_ADMIN_WALLET_ADMINKEY_HERE"
 
 
-client = LNbits("d8b998eb-43b2-4b5c-99c8-09be784d7130-00-2vruzzgf8t7wo.picard.replit.dev")
+# Connection pool limits and timeouts for the LNbits client
+LNBITS_MAX_CONNECTIONS = int(os.getenv("LNBITS_MAX_CONNECTIONS", "100"))
+LNBITS_MAX_KEEPALIVE = int(os.getenv("LNBITS_MAX_KEEPALIVE", "20"))
+LNBITS_TIMEOUT = float(os.getenv("LNBITS_TIMEOUT", "10"))
+LNBITS_CONNECT_TIMEOUT = float(os.getenv("LNBITS_CONNECT_TIMEOUT", "5"))
+# Hard per-operation timeouts, e.g. "get_wallet=2,list_payments=5"
+LNBITS_OPERATION_TIMEOUTS = {
+    operation.strip(): float(seconds)
+    for operation, seconds in (
+        item.split("=") for item in os.getenv("LNBITS_OPERATION_TIMEOUTS", "get_wallet=3").split(",") if item
+    )
+}
+# Reads are retried and hedged once slower than this latency percentile (0 disables hedging)
+LNBITS_READ_RETRIES = int(os.getenv("LNBITS_READ_RETRIES", "2"))
+LNBITS_HEDGE_PERCENTILE = float(os.getenv("LNBITS_HEDGE_PERCENTILE", "95"))
+# Consecutive failures after which calls fail fast, and seconds until LNbits is tried again
+LNBITS_BREAKER_THRESHOLD = int(os.getenv("LNBITS_BREAKER_THRESHOLD", "5"))
+LNBITS_BREAKER_RESET = float(os.getenv("LNBITS_BREAKER_RESET", "10"))
+# Admission control: LNbits calls in flight at once, calls queued behind them and
+# seconds a call may wait before it is refused with a 503 (or a 429 when a single
+# wallet is over its own rate). Rates are calls per second, 0 for no limit.
+LNBITS_MAX_IN_FLIGHT = int(os.getenv("LNBITS_MAX_IN_FLIGHT", str(LNBITS_MAX_CONNECTIONS)))
+LNBITS_ADMISSION_QUEUE = int(os.getenv("LNBITS_ADMISSION_QUEUE", "500"))
+LNBITS_ADMISSION_WAIT = float(os.getenv("LNBITS_ADMISSION_WAIT", "2"))
+LNBITS_RATE = float(os.getenv("LNBITS_RATE", "0"))
+LNBITS_BURST = float(os.getenv("LNBITS_BURST", "50"))
+LNBITS_WALLET_RATE = float(os.getenv("LNBITS_WALLET_RATE", "10"))
+LNBITS_WALLET_BURST = float(os.getenv("LNBITS_WALLET_BURST", "20"))
+
+# The LNbits instance to use, e.g. http://127.0.0.1:5000 for fake_lnbits.py
+LNBITS_URL = os.getenv("LNBITS_URL", "d8b998eb-43b2-4b5c-99c8-09be784d7130-00-2vruzzgf8t7wo.picard.replit.dev")
+
+admission = AdmissionController(
+    max_in_flight=LNBITS_MAX_IN_FLIGHT,
+    max_queue=LNBITS_ADMISSION_QUEUE,
+    max_wait=LNBITS_ADMISSION_WAIT,
+    rate=LNBITS_RATE,
+    burst=LNBITS_BURST,
+    wallet_rate=LNBITS_WALLET_RATE,
+    wallet_burst=LNBITS_WALLET_BURST,
+)
+
+client = AsyncLNbits(
+    LNBITS_URL,
+    max_connections=LNBITS_MAX_CONNECTIONS,
+    max_keepalive_connections=LNBITS_MAX_KEEPALIVE,
+    timeout=LNBITS_TIMEOUT,
+    connect_timeout=LNBITS_CONNECT_TIMEOUT,
+    operation_timeouts=LNBITS_OPERATION_TIMEOUTS,
+    read_retries=LNBITS_READ_RETRIES,
+    hedge_percentile=LNBITS_HEDGE_PERCENTILE or None,
+    breaker_threshold=LNBITS_BREAKER_THRESHOLD,
+    breaker_reset=LNBITS_BREAKER_RESET,
+    admission=admission,
+)
+
+# How many winner invoice+pay pipelines resolve_bet runs at the same time
+PAYOUT_CONCURRENCY = int(os.getenv("PAYOUT_CONCURRENCY", "16"))
+PAYOUT_MAX_ATTEMPTS = int(os.getenv("PAYOUT_MAX_ATTEMPTS", "3"))
+
+# Wallet balances served by /api/balance are cached for a short while
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "2"))
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "10000"))
+
+balance_cache = TTLCache(ttl=BALANCE_CACHE_TTL, maxsize=BALANCE_CACHE_SIZE)
+
+# /api/balances accepts up to BALANCES_MAX_WALLETS inkeys and looks up at most
+# BALANCES_CONCURRENCY of them in LNbits at the same time
+BALANCES_MAX_WALLETS = int(os.getenv("BALANCES_MAX_WALLETS", "500"))
+BALANCES_CONCURRENCY = int(os.getenv("BALANCES_CONCURRENCY", "32"))
+
+# Successful responses to requests sent with an Idempotency-Key header are
+# replayed to retries with the same key for this long
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_STORE_SIZE = int(os.getenv("IDEMPOTENCY_STORE_SIZE", "100000"))
+
+idempotency_store = IdempotencyStore(ttl=IDEMPOTENCY_TTL, maxsize=IDEMPOTENCY_STORE_SIZE)
+
+# Sats the house sends to every new wallet
+WALLET_INITIAL_SATS = int(os.getenv("WALLET_INITIAL_SATS", "1"))
+
+# Number of ready-made wallets kept for signups, 0 disables the pool
+WALLET_POOL_SIZE = int(os.getenv("WALLET_POOL_SIZE", "20"))
+WALLET_POOL_LOW_WATERMARK = int(os.getenv("WALLET_POOL_LOW_WATERMARK", "5"))
+
+# Live prices: house overround, how far prices move towards the money per
+# bet (0 to 1) and the sats assumed on every outcome before the first bet
+ODDS_MARGIN = float(os.getenv("ODDS_MARGIN", "0.05"))
+ODDS_DAMPING = float(os.getenv("ODDS_DAMPING", "0.5"))
+ODDS_PRIOR_STAKE = int(os.getenv("ODDS_PRIOR_STAKE", "1000"))
+
+odds_engine = OddsEngine(margin=ODDS_MARGIN, damping=ODDS_DAMPING, prior_stake=ODDS_PRIOR_STAKE)
+
+# Balance and bet status events pushed to subscribed wallets: events buffered
+# per connection before a slow one is cut off, and seconds between keepalives
+WALLET_EVENTS_QUEUE_SIZE = int(os.getenv("WALLET_EVENTS_QUEUE_SIZE", "100"))
+WALLET_EVENTS_KEEPALIVE = float(os.getenv("WALLET_EVENTS_KEEPALIVE", "15"))
+
+wallet_events = WalletEventBus(queue_size=WALLET_EVENTS_QUEUE_SIZE)
+
+# House share of pari-mutuel pools, in basis points of the pool
+POOL_RAKE_BPS = int(os.getenv("POOL_RAKE_BPS", "500"))
+SETTLEMENT_POOL = "pool"
+
+# Matches /api/resolve-bets accepts in one request
+RESOLVE_BATCH_MAX_MATCHES = int(os.getenv("RESOLVE_BATCH_MAX_MATCHES", "500"))
+
+# Bets are only accepted on matches of the catalog. MATCH_CATALOG_SOURCE "file" reads
+# MATCH_CATALOG_FILE, "sportsdb" lists TheSportsDB's SPORTSDB_LEAGUE_IDS and
+# SPORTSDB_EVENT_IDS, and "none" accepts any match_id. Sources are polled every
+# MATCH_CATALOG_REFRESH seconds, which is also how long clients may cache the listing.
+MATCH_CATALOG_SOURCE = os.getenv("MATCH_CATALOG_SOURCE", "file")
+MATCH_CATALOG_FILE = os.getenv("MATCH_CATALOG_FILE", os.path.join(os.path.dirname(__file__), "fixtures.json"))
+MATCH_CATALOG_REFRESH = float(os.getenv("MATCH_CATALOG_REFRESH", "300"))
+SPORTSDB_URL = os.getenv("SPORTSDB_URL", "https://www.thesportsdb.com/api/v1/json/3")
+SPORTSDB_LEAGUE_IDS = [i for i in os.getenv("SPORTSDB_LEAGUE_IDS", "").split(",") if i]
+SPORTSDB_EVENT_IDS = [i for i in os.getenv("SPORTSDB_EVENT_IDS", "2052711,2052712,2052713,2052714").split(",") if i]
+
+match_catalog: Optional[MatchCatalog] = None
+if MATCH_CATALOG_SOURCE == "file":
+    match_catalog = MatchCatalog([FileFixtureSource(MATCH_CATALOG_FILE)], refresh_interval=MATCH_CATALOG_REFRESH)
+elif MATCH_CATALOG_SOURCE == "sportsdb":
+    match_catalog = MatchCatalog(
+        [SportsDbFixtureSource(SPORTSDB_URL, league_ids=SPORTSDB_LEAGUE_IDS, event_ids=SPORTSDB_EVENT_IDS)],
+        refresh_interval=MATCH_CATALOG_REFRESH
+    )
+
+# Bets are kept in an embedded SQLite database shared by all workers
+BET_STORE_PATH = os.getenv("BET_STORE_PATH", "bets.db")
+
+bet_store: BetStore = SQLiteBetStore(BET_STORE_PATH)
+
+# The wallet pool's stock is kept in SQLite too, so restarts and other
+# workers reuse the wallets already funded instead of funding new ones
+WALLET_POOL_PATH = os.getenv("WALLET_POOL_PATH", BET_STORE_PATH)
+
+# Keeps bet placement and resolution of the same match from interleaving
+match_locks = MatchLocks()
+
+# Daily, weekly and all-time standings, rebuilt from the bet store on startup
+# and updated as bets are placed and matches resolved. Players appear under a
+# hash of their inkey, the key itself is never exposed.
+LEADERBOARD_PAGE_LIMIT = int(os.getenv("LEADERBOARD_PAGE_LIMIT", "100"))
+
+leaderboard = Leaderboard()
+
+
+def player_id(wallet_inkey: str) -> str:
+    return hashlib.sha256(wallet_inkey.encode()).hexdigest()[:16]
 
 # Hardcoded admin wallet keys - Replace these with your actual wallet keys
 # These should be from a wallet that already has funds
@@ -38,8 +282,55 @@ client = LNbits("d8b998eb-43b2-4b5c-99c8-09be784d7130-00-2vruzzgf8t7wo.picard.re
 
 
 
-ADMIN_WALLET_INKEY = "13ce6601e9974aa989c579236616c1c4"
-ADMIN_WALLET_ADMINKEY = "9fe85e1cacb0438ba8456a8ff9107e2f"
+ADMIN_WALLET_INKEY = os.getenv("ADMIN_WALLET_INKEY", "13ce6601e9974aa989c579236616c1c4")
+ADMIN_WALLET_ADMINKEY = os.getenv("ADMIN_WALLET_ADMINKEY", "9fe85e1cacb0438ba8456a8ff9107e2f")
+
+# Payouts and settlement checks all use the house wallet, it has no per-wallet limit
+admission.exempt(ADMIN_WALLET_INKEY, ADMIN_WALLET_ADMINKEY)
+
+payout_engine = PayoutEngine(
+    client,
+    payer_adminkey=ADMIN_WALLET_ADMINKEY,
+    concurrency=PAYOUT_CONCURRENCY,
+    max_attempts=PAYOUT_MAX_ATTEMPTS,
+)
+
+# BALANCE_MODE=internal keeps users' sats on a ledger: they deposit with the house
+# and bet from their ledger balance, so only deposits and withdrawals are Lightning
+# payments. Every LEDGER_SETTLE_INTERVAL seconds (0 disables it) the balances of
+# wallets idle for LEDGER_SETTLE_IDLE seconds are paid back to the wallets.
+BALANCE_MODE = os.getenv("BALANCE_MODE", "lightning")
+LEDGER_PATH = os.getenv("LEDGER_PATH", BET_STORE_PATH)
+LEDGER_SETTLE_INTERVAL = float(os.getenv("LEDGER_SETTLE_INTERVAL", "0"))
+LEDGER_SETTLE_IDLE = float(os.getenv("LEDGER_SETTLE_IDLE", "86400"))
+# Transaction id prefix of bets staked from the ledger, their winnings are credited there too
+LEDGER_TRANSACTION_PREFIX = "ledger:"
+
+ledger: Optional[Ledger] = None
+ledger_settler: Optional[LedgerSettler] = None
+if BALANCE_MODE == "internal":
+    ledger = Ledger(LEDGER_PATH)
+    ledger_settler = LedgerSettler(
+        ledger, payout_engine, interval=LEDGER_SETTLE_INTERVAL, idle_after=LEDGER_SETTLE_IDLE
+    )
+
+# Bet payments LNbits can't settle right away are confirmed by its webhook,
+# with batched status checks as the fallback. SETTLEMENT_WEBHOOK_URL is this
+# backend's base URL as LNbits reaches it, leave it empty to rely on checks only.
+# Set SETTLEMENT_WEBHOOK_SECRET explicitly when running several workers.
+SETTLEMENT_WEBHOOK_URL = os.getenv("SETTLEMENT_WEBHOOK_URL", "").rstrip("/")
+SETTLEMENT_WEBHOOK_SECRET = os.getenv("SETTLEMENT_WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+# How long place_bet waits for a pending payment before giving up on the bet
+PAYMENT_SETTLE_TIMEOUT = float(os.getenv("PAYMENT_SETTLE_TIMEOUT", "30"))
+
+settlement_tracker = SettlementTracker(client)
+
+
+def settlement_webhook():
+    """The webhook URL put on bet invoices, or None when webhooks are not configured."""
+    if not SETTLEMENT_WEBHOOK_URL:
+        return None
+    return f"{SETTLEMENT_WEBHOOK_URL}/api/webhooks/lnbits?token={SETTLEMENT_WEBHOOK_SECRET}"
 
 
 
@@ -58,6 +349,34 @@ class BalanceResponse(BaseModel):
     balance: Optional[int] = None
     message: Optional[str] = None
 
+class BalancesRequest(BaseModel):
+    wallet_inkeys: List[str]
+
+class BalancesResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    # One result per distinct inkey requested
+    balances: Dict[str, BalanceResponse] = {}
+    failed: int = 0
+
+class LedgerDepositRequest(BaseModel):
+    wallet_adminkey: str
+    wallet_inkey: str
+    amount: int
+
+class LedgerWithdrawRequest(BaseModel):
+    wallet_adminkey: str
+    wallet_inkey: str
+    # The whole balance when not given
+    amount: Optional[int] = None
+
+class LedgerResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    balance: Optional[int] = None
+    # The deposit or withdrawal completes once its payment's outcome is known
+    pending: bool = False
+
 class BetRequest(BaseModel):
     bet_id: str
     option: str
@@ -79,34 +398,238 @@ class ResolveBetResponse(BaseModel):
 ###
 
 
-ACTIVE_BETS = {}
-
-
 class PlaceBetRequest(BaseModel):
     match_id: str
     selected_outcome: str
     wallet_adminkey: str
     wallet_inkey: str
-    odds: float
-    amount: int = 1
+    # Lowest price the client accepts, bets are always made at the server's price
+    odds: Optional[float] = Field(None, gt=0)
+    amount: int = Field(1, gt=0)
 
 class PlaceBetResponse(BaseModel):
     success: bool
     message: str
     transaction_id: Optional[str] = None
+    round_trips: Optional[int] = None
+    # The bet is recorded and counts once its payment settles
+    pending: bool = False
+    # The price the bet was placed at
+    odds: Optional[float] = None
+
+# place_bet error messages by the step of the transfer that failed
+TRANSFER_ERROR_MESSAGES = {
+    "wallet": "Invalid wallet credentials",
+    "validate": "Failed to validate wallet",
+    "invoice": "Failed to create invoice",
+    "payment": "Payment failed - insufficient funds or network error",
+}
 
 class ResolveBetRequest(BaseModel):
     match_id: str
     winning_outcome: str
+    # "fixed" pays every winner stake * odds, "pool" splits the pool pari-mutuel
+    settlement: Literal["fixed", "pool"] = "fixed"
 
 class ResolveBetResponse(BaseModel):
     success: bool
     message: str
     payouts: int = 0
+    report: Optional[Dict] = None
+
+class ResolveBetsRequest(BaseModel):
+    matches: List[ResolveBetRequest]
+
+class ResolveBetsResponse(BaseModel):
+    success: bool
+    message: str
+    # Winners paid in total, and the outcome of every match
+    payouts: int = 0
+    matches: Dict[str, ResolveBetResponse] = {}
+    report: Optional[Dict] = None
+
+# Bet fields that /api/bets may return. Wallet keys are never exposed.
+BET_PUBLIC_FIELDS = ("id", "match_id", "outcome", "amount", "odds", "status", "transaction_id", "timestamp")
+BETS_PAGE_LIMIT = 1000
+
+class OutcomeSummary(BaseModel):
+    stake: int
+    bets: int
+    liability: int
 
+class MatchSummaryResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    match_id: Optional[str] = None
+    status: Optional[str] = None
+    winner: Optional[str] = None
+    total_stake: int = 0
+    total_bets: int = 0
+    outcomes: Dict[str, OutcomeSummary] = {}
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    player: str
+    profit: int
+    volume: int
+    bets: int
+    settled: int
+    wins: int
+    win_rate: float
+
+class LeaderboardResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    window: str = WINDOW_ALL
+    players: int = 0
+    entries: List[LeaderboardEntry] = []
+
+class LeaderboardStandingResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    window: str = WINDOW_ALL
+    players: int = 0
+    entry: Optional[LeaderboardEntry] = None
 
 
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Expose request, LNbits and payout metrics in the Prometheus text format,
+    including the LNbits circuit breaker state and retry/hedge counts.
+    """
+    OPEN_BETS.set(await bet_store.count(status=BET_OPEN))
+    if ledger is not None:
+        LEDGER_BALANCE.set(ledger.total())
+    LNBITS_CIRCUIT_STATE.set(CIRCUIT_STATES.index(client.breaker.state))
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+class OddsResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    match_id: Optional[str] = None
+    version: int = 0
+    prices: Dict[str, float] = {}
+
+
+async def load_odds(match_id):
+    """Seeds the odds engine with a match's stakes when it doesn't know the match yet."""
+    if match_id in odds_engine:
+        return
+    totals = await bet_store.outcome_totals(match_id)
+    stakes = {outcome: t.stake for outcome, t in totals.items()}
+    # Every outcome of a catalog match is priced, not only those with bets
+    fixture = match_catalog.get(match_id) if match_catalog is not None else None
+    if fixture is not None:
+        for outcome in fixture.outcomes:
+            stakes.setdefault(outcome, 0)
+    # Another request may have loaded it in the meantime
+    if match_id not in odds_engine:
+        odds_engine.seed(match_id, stakes)
+
+
+async def betting_open(match_id: str) -> bool:
+    """Whether the match takes bets: it is open, or a catalog fixture nobody bet on yet."""
+    match = await bet_store.get_match(match_id)
+    if match is not None:
+        return match.status == MATCH_OPEN
+    return match_catalog is not None and match_catalog.get(match_id) is not None
+
+
+@app.get("/api/odds/{match_id}", response_model=OddsResponse)
+async def get_odds(match_id: str):
+    """
+    Current decimal price of every outcome of an open match. Catalog
+    fixtures without bets are priced from the prior stake alone.
+    """
+    if not await betting_open(match_id):
+        return OddsResponse(success=False, message="Match is not open for betting")
+
+    await load_odds(match_id)
+    quote = odds_engine.quote(match_id)
+    return OddsResponse(success=True, match_id=match_id, version=quote.version, prices=quote.prices)
+
+
+@app.get("/api/odds/{match_id}/stream")
+async def stream_odds(match_id: str):
+    """
+    Live prices as server-sent events: the current prices first, then only
+    the prices that changed. Viewers that fall behind get the latest prices
+    instead of every intermediate one. The stream ends when the match is resolved.
+    """
+    if not await betting_open(match_id):
+        raise HTTPException(status_code=404, detail="Match is not open for betting")
+
+    await load_odds(match_id)
+    subscription = odds_engine.subscribe(match_id)
+
+    async def events():
+        try:
+            async for update in subscription:
+                yield f"data: {json.dumps(update.to_dict())}\n\n"
+        finally:
+            odds_engine.unsubscribe(match_id, subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/api/wallets/{wallet_inkey}/events")
+async def wallet_event_stream(wallet_inkey: str):
+    """
+    Pushes a wallet's balance changes and bet status changes as server-sent
+    events, so clients don't have to poll /api/balance.
+
+    Events:
+        - balance: {"delta": sats, "reason": "bet" | "payout" | "funding" | "deposit" | "withdrawal"}
+        - ledger: {"balance": sats, "reason": "bet" | "winnings" | "deposit" | "withdrawal"},
+            for wallets with internal balances
+        - bet: {"bet_id", "match_id", "status"}, for placed, resolved and paid bets
+        - resync: the client fell behind and should reload its balance and bets
+    """
+    subscription = wallet_events.subscribe(wallet_inkey)
+
+    async def events():
+        try:
+            while not subscription.dropped:
+                event = await subscription.get(timeout=WALLET_EVENTS_KEEPALIVE)
+                if event is None:
+                    # An SSE comment keeps idle connections from being closed by proxies
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            yield "event: resync\ndata: {}\n\n"
+        finally:
+            wallet_events.unsubscribe(wallet_inkey, subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+class WebhookResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+
+
+@app.post("/api/webhooks/lnbits", response_model=WebhookResponse)
+async def lnbits_webhook(payment: dict, token: str = Query("")):
+    """
+    Called by LNbits when an invoice created with settlement_webhook() is paid.
+    """
+    if not hmac.compare_digest(token, SETTLEMENT_WEBHOOK_SECRET):
+        raise HTTPException(status_code=403, detail="Invalid webhook token")
+
+    payment_hash = payment.get("payment_hash")
+    if not payment_hash:
+        raise HTTPException(status_code=400, detail="payment_hash is required")
+
+    paid = payment.get("status") != PAYMENT_FAILED
+    if not settlement_tracker.settle(payment_hash, paid=paid):
+        return WebhookResponse(success=True, message="Payment is not tracked")
+    return WebhookResponse(success=True)
+
+
 @app.get("/hello")
 def hello():
     return "hello"
@@ -176,49 +699,122 @@ def here():
 
 
 
-def fund_new_wallet(wallet_inkey, amount_sats=1):
+async def run_idempotent(endpoint, idempotency_key, fingerprint, handle):
+    """
+    Runs a mutating endpoint at most once per Idempotency-Key. Only
+    successful and pending responses are replayed, a failed request can
+    be retried with the same key.
+
+    Args:
+        - endpoint (str): namespaces the key, the same key may be used on different endpoints
+        - idempotency_key (str | None): the request's Idempotency-Key header
+        - fingerprint (str): the serialized request body
+        - handle (callable): async function producing the response
+
+    Raises:
+        - HTTPException 422 if the key was already used with a different body
+    """
+    key = (endpoint, idempotency_key) if idempotency_key else None
+    try:
+        return await idempotency_store.run(
+            key, fingerprint, handle, store=lambda response: response.success or response.pending
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def fund_new_wallet(wallet_inkey, amount_sats=WALLET_INITIAL_SATS):
 
     """Helper function to fund a newly created wallet with initial sats"""
     try:
         # Create invoice from the new wallet
-        invoice = client.create_invoice(
+        invoice = await client.create_invoice(
             wallet_key=wallet_inkey,
             amount_sats=amount_sats,
             memo="Initial funding"
         )
         
         # Pay the invoice using admin wallet
-        client.pay_invoice(
+        await client.pay_invoice(
             wallet_adminkey=ADMIN_WALLET_ADMINKEY,
             invoice=invoice.bolt11
         )
+
+        balance_cache.invalidate(wallet_inkey)
+        balance_cache.invalidate(ADMIN_WALLET_INKEY)
+        wallet_events.publish(wallet_inkey, "balance", delta=amount_sats, reason="funding")
         
         return True
     except Exception as e:
-        print(f"Error funding wallet: {e}")
+        logger.error("Error funding wallet: %s", e, extra={"event": "wallet_funding_failed"})
         return False
 
 
+# Keeps background rename tasks referenced until they finish
+_RENAME_TASKS = set()
+
+
+async def rename_pooled_wallet(wallet_adminkey, name):
+    try:
+        await client.rename_wallet(wallet_adminkey, name)
+    except Exception as e:
+        logger.warning("Error renaming pooled wallet: %s", e, extra={"event": "wallet_rename_failed"})
+
+
+wallet_pool = WalletPool(
+    client,
+    fund=fund_new_wallet,
+    path=WALLET_POOL_PATH,
+    size=WALLET_POOL_SIZE,
+    low_watermark=WALLET_POOL_LOW_WATERMARK,
+)
+
+
 @app.post("/api/create-wallet", response_model=CreateWalletResponse)
-async def create_wallet(username_data: dict):
+async def create_wallet(username_data: dict, idempotency_key: Optional[str] = Header(None)):
+    return await run_idempotent(
+        "create-wallet", idempotency_key, json.dumps(username_data, sort_keys=True),
+        lambda: _create_wallet(username_data)
+    )
+
+
+async def _create_wallet(username_data: dict) -> CreateWalletResponse:
     username = username_data.get("username")
     if not username:
         raise HTTPException(status_code=400, detail="Username is required")
+
+    # Hand out a pre-provisioned wallet when one is ready,
+    # it is renamed for the user in the background
+    pooled = await wallet_pool.take()
+    if pooled is not None:
+        task = asyncio.create_task(
+            rename_pooled_wallet(pooled.adminkey, f"{username}'s wallet")
+        )
+        _RENAME_TASKS.add(task)
+        task.add_done_callback(_RENAME_TASKS.discard)
+
+        return CreateWalletResponse(
+            success=True,
+            message="Wallet created successfully",
+            wallet_id=pooled.wallet_id,
+            adminkey=pooled.adminkey,
+            inkey=pooled.inkey
+        )
     
     try:
         # Create account
-        account = client.create_account(name=username)
+        account = await client.create_account(name=username)
         
         # Create wallet
-        wallet = client.create_wallet(
+        wallet = await client.create_wallet(
             account_api_key=account.adminkey,
             name=f"{username}'s wallet"
         )
 
 
-        fund_new_wallet(
+        await fund_new_wallet(
                 wallet_inkey=wallet.inkey,
-                amount_sats=1
+                amount_sats=WALLET_INITIAL_SATS
             )
         
         # Return success without attempting to fund the wallet
@@ -229,8 +825,10 @@ async def create_wallet(username_data: dict):
             adminkey=wallet.adminkey,
             inkey=wallet.inkey
         )
+    except AdmissionRejected:
+        raise
     except Exception as e:
-        print(f"Error creating wallet: {e}")
+        logger.error("Error creating wallet: %s", e, extra={"event": "wallet_creation_failed"})
         return CreateWalletResponse(
             success=False,
             message=f"Error creating wallet: {str(e)}"
@@ -240,9 +838,212 @@ async def create_wallet(username_data: dict):
 async def get_balance(wallet_inkey: str):
     """
     Get the balance of a wallet using the inkey from local storage.
+    Balances are served from balance_cache, so frequent polling of the
+    same wallet costs at most one LNbits call per BALANCE_CACHE_TTL.
+    """
+    return await fetch_balance(wallet_inkey)
+
+@app.post("/api/balances", response_model=BalancesResponse)
+async def get_balances(balances_request: BalancesRequest):
+    """
+    Get the balances of several wallets in one call, e.g. for dashboards.
+    Cached balances are reused and the rest are fetched from LNbits
+    concurrently, BALANCES_CONCURRENCY at a time. A wallet that can't be
+    fetched is reported in its own entry without failing the others.
+    """
+    wallet_inkeys = list(dict.fromkeys(balances_request.wallet_inkeys))
+    if len(wallet_inkeys) > BALANCES_MAX_WALLETS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {BALANCES_MAX_WALLETS} wallets can be requested at once"
+        )
+
+    semaphore = asyncio.Semaphore(BALANCES_CONCURRENCY)
+
+    async def fetch(wallet_inkey: str) -> BalanceResponse:
+        try:
+            # Cache hits don't take a slot
+            cached, _ = balance_cache.peek(wallet_inkey)
+            if cached:
+                return await fetch_balance(wallet_inkey)
+            async with semaphore:
+                return await fetch_balance(wallet_inkey)
+        except AdmissionRejected as e:
+            return BalanceResponse(success=False, message=str(e))
+
+    results = await asyncio.gather(*(fetch(wallet_inkey) for wallet_inkey in wallet_inkeys))
+    failed = sum(not result.success for result in results)
+    return BalancesResponse(
+        success=failed == 0,
+        message=f"{failed} of {len(results)} balances could not be fetched" if failed else None,
+        balances=dict(zip(wallet_inkeys, results)),
+        failed=failed
+    )
+
+@app.get("/api/ledger/{wallet_inkey}", response_model=LedgerResponse)
+async def get_ledger_balance(wallet_inkey: str):
+    """
+    Get a wallet's internal balance, the sats it can bet with when
+    BALANCE_MODE is internal. Served from memory, LNbits isn't called.
+    """
+    if ledger is None:
+        return LedgerResponse(success=False, message="Internal balances are disabled")
+    return LedgerResponse(success=True, balance=ledger.balance(wallet_inkey))
+
+@app.post("/api/ledger/deposit", response_model=LedgerResponse)
+async def deposit(deposit_request: LedgerDepositRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Move sats from the user's wallet to their internal balance. The first
+    deposit binds the internal balance to the paying wallet's adminkey.
+    """
+    return await run_idempotent(
+        "ledger-deposit", idempotency_key, deposit_request.model_dump_json(),
+        lambda: _deposit(deposit_request)
+    )
+
+async def owns_wallet(wallet_inkey: str, wallet_adminkey: str) -> bool:
+    """
+    Checks that an adminkey belongs to the same wallet as an inkey. LNbits
+    only shows a wallet's id to its adminkey, but a payment of the wallet
+    is visible to both keys, so an invoice created with the inkey is looked
+    up with the adminkey.
     """
+    invoice = await client.create_invoice(wallet_key=wallet_inkey, amount_sats=1, memo="Wallet check")
+    return await client.get_payment(wallet_adminkey, invoice.payment_hash) is not None
+
+
+async def _deposit(deposit_request: LedgerDepositRequest) -> LedgerResponse:
+    wallet_inkey = deposit_request.wallet_inkey
+    amount = deposit_request.amount
+
+    if ledger is None:
+        return LedgerResponse(success=False, message="Internal balances are disabled")
+    if amount <= 0:
+        return LedgerResponse(success=False, message="Amount must be positive")
+    if ledger.has_account(wallet_inkey):
+        if not ledger.authorize(wallet_inkey, deposit_request.wallet_adminkey):
+            return LedgerResponse(success=False, message="Invalid wallet credentials")
+    else:
+        # The first deposit binds the account to its adminkey, which must be the wallet's own
+        try:
+            owned = await owns_wallet(wallet_inkey, deposit_request.wallet_adminkey)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.warning("Error checking wallet keys: %s", e, extra={"event": "deposit_failed", "stage": "keys"})
+            return LedgerResponse(success=False, message="Failed to validate wallet")
+        if not owned:
+            return LedgerResponse(success=False, message="Invalid wallet credentials")
+
     try:
-        wallet_info = client.get_wallet(wallet_inkey)
+        transfer = await client.transfer(
+            from_adminkey=deposit_request.wallet_adminkey,
+            to_inkey=ADMIN_WALLET_INKEY,
+            amount=amount,
+            memo="Deposit",
+            webhook=settlement_webhook()
+        )
+    except TransferError as transfer_error:
+        if isinstance(transfer_error.__cause__, AdmissionRejected):
+            raise transfer_error.__cause__
+        logger.warning(
+            "Error depositing: %s", transfer_error,
+            extra={"event": "deposit_failed", "stage": transfer_error.stage}
+        )
+        return LedgerResponse(success=False, message=TRANSFER_ERROR_MESSAGES[transfer_error.stage])
+    except Exception as e:
+        logger.exception("Error depositing", extra={"event": "deposit_failed"})
+        return LedgerResponse(success=False, message=f"Error depositing: {str(e)}")
+
+    paid = await confirm_house_payment(transfer)
+    if paid is None:
+        # Credited by confirm_deposit() once the payment settles, even after a restart
+        payment_hash = transfer.invoice.payment_hash
+        await ledger.add_pending_deposit(payment_hash, wallet_inkey, deposit_request.wallet_adminkey, amount)
+        confirm_later(payment_hash, lambda paid: confirm_deposit(payment_hash, paid))
+        return LedgerResponse(
+            success=False,
+            pending=True,
+            message="Deposit recorded, it is credited once the payment settles",
+            balance=ledger.balance(wallet_inkey)
+        )
+    if not paid:
+        return LedgerResponse(success=False, message="Payment failed")
+
+    # Only a key that just paid can open an account
+    if not await ledger.open_account(wallet_inkey, deposit_request.wallet_adminkey):
+        logger.warning("Deposit raced another first deposit", extra={"event": "deposit_key_mismatch"})
+    # Keyed by the payment, so a deposit is never credited twice
+    await ledger.post(wallet_inkey, amount, ENTRY_DEPOSIT, ref=f"deposit:{transfer.invoice.payment_hash}")
+
+    balance_cache.invalidate(wallet_inkey)
+    balance_cache.invalidate(ADMIN_WALLET_INKEY)
+    balance = ledger.balance(wallet_inkey)
+    wallet_events.publish(wallet_inkey, "balance", delta=-amount, reason="deposit")
+    wallet_events.publish(wallet_inkey, "ledger", balance=balance, reason="deposit")
+    return LedgerResponse(success=True, message=f"Deposited {amount} sats", balance=balance)
+
+@app.post("/api/ledger/withdraw", response_model=LedgerResponse)
+async def withdraw(withdraw_request: LedgerWithdrawRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Pay sats from the internal balance back to the user's wallet.
+    The amount is returned to the balance if the payment fails, and a
+    payment whose outcome is unknown stays pending until it is checked.
+    """
+    return await run_idempotent(
+        "ledger-withdraw", idempotency_key, withdraw_request.model_dump_json(),
+        lambda: _withdraw(withdraw_request)
+    )
+
+async def _withdraw(withdraw_request: LedgerWithdrawRequest) -> LedgerResponse:
+    wallet_inkey = withdraw_request.wallet_inkey
+
+    if ledger is None:
+        return LedgerResponse(success=False, message="Internal balances are disabled")
+    if not ledger.authorize(wallet_inkey, withdraw_request.wallet_adminkey):
+        return LedgerResponse(success=False, message="Invalid wallet credentials")
+
+    amount = withdraw_request.amount
+    if amount is None:
+        amount = ledger.balance(wallet_inkey)
+    if amount <= 0:
+        return LedgerResponse(success=False, message="Nothing to withdraw", balance=ledger.balance(wallet_inkey))
+
+    try:
+        result = await ledger_settler.withdraw(wallet_inkey, amount)
+    except InsufficientFunds:
+        return LedgerResponse(success=False, message="Insufficient balance", balance=ledger.balance(wallet_inkey))
+
+    balance = ledger.balance(wallet_inkey)
+    if result.status == "pending":
+        # Still debited, the payment is checked and retried until its outcome is known
+        return LedgerResponse(
+            success=False,
+            pending=True,
+            message="Withdrawal pending, it is retried until its payment goes through or fails",
+            balance=balance
+        )
+    if result.status != "paid":
+        return LedgerResponse(success=False, message=f"Withdrawal failed: {result.error}", balance=balance)
+
+    balance_cache.invalidate(wallet_inkey)
+    balance_cache.invalidate(ADMIN_WALLET_INKEY)
+    wallet_events.publish(wallet_inkey, "balance", delta=amount, reason="withdrawal")
+    wallet_events.publish(wallet_inkey, "ledger", balance=balance, reason="withdrawal")
+    return LedgerResponse(success=True, message=f"Withdrew {amount} sats", balance=balance)
+
+async def fetch_balance(wallet_inkey: str) -> BalanceResponse:
+    """
+    Looks up a wallet's balance through balance_cache.
+
+    Returns:
+        - a BalanceResponse, unsuccessful if the wallet is unknown or LNbits failed
+    """
+    try:
+        wallet_info = await balance_cache.get_or_fetch(
+            wallet_inkey,
+            lambda: client.get_wallet(wallet_inkey)
+        )
 
         if wallet_info:
             return BalanceResponse(
@@ -254,8 +1055,10 @@ async def get_balance(wallet_inkey: str):
                 success=False,
                 message="Wallet not found"
             )
+    except AdmissionRejected:
+        raise
     except Exception as e:
-        print(f"Error getting balance: {e}")
+        logger.error("Error getting balance: %s", e, extra={"event": "balance_failed"})
         return BalanceResponse(
             success=False,
             message=f"Error getting balance: {str(e)}"
@@ -319,86 +1122,292 @@ async def get_balance(wallet_inkey: str):
 
 
 
+async def confirm_house_payment(transfer, **log_extra) -> Optional[bool]:
+    """
+    Waits up to PAYMENT_SETTLE_TIMEOUT for a payment to the house wallet
+    that LNbits reported as pending.
+
+    Returns:
+        - True once paid, False if the payment failed, None if it is still pending
+    """
+    if transfer.payment.status == PAYMENT_SUCCESS:
+        return True
+    if transfer.payment.status == PAYMENT_FAILED:
+        return False
+
+    settled = settlement_tracker.track(transfer.invoice.payment_hash, ADMIN_WALLET_INKEY)
+    try:
+        return await asyncio.wait_for(asyncio.shield(settled), PAYMENT_SETTLE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(
+            "Payment to the house still pending",
+            extra={"event": "bet_payment_pending", "payment_hash": transfer.invoice.payment_hash, **log_extra}
+        )
+        return None
+
+
+# Confirmations of payments that were still pending when their request returned
+pending_confirmations: set = set()
+
+
+def confirm_later(payment_hash: str, confirm) -> None:
+    """
+    Calls confirm(paid) in the background once a payment to the house settles.
+
+    Args:
+        - payment_hash (str): the house invoice's payment hash
+        - confirm (callable): async function taking whether the payment succeeded
+    """
+    settled = settlement_tracker.track(payment_hash, ADMIN_WALLET_INKEY)
+
+    async def wait():
+        try:
+            await confirm(await settled)
+        except Exception:
+            logger.exception(
+                "Error confirming pending payment", extra={"event": "pending_confirm_failed", "payment_hash": payment_hash}
+            )
+
+    task = asyncio.create_task(wait())
+    pending_confirmations.add(task)
+    task.add_done_callback(pending_confirmations.discard)
+
+
+async def confirm_bet(bet_id: int, paid: bool):
+    """Opens a pending bet once its stake arrived, or voids it."""
+    bet = await bet_store.settle_pending(bet_id, paid)
+    if bet is None:
+        return
+    if paid:
+        odds_engine.record_bet(bet.match_id, bet.outcome, bet.amount)
+        leaderboard.record_bet(player_id(bet.wallet_inkey), bet.amount)
+    else:
+        logger.warning("Pending bet voided", extra={"event": "bet_voided", "match_id": bet.match_id})
+        balance_cache.invalidate(bet.wallet_inkey)
+    wallet_events.publish(bet.wallet_inkey, "bet", bet_id=bet.id, match_id=bet.match_id, status=bet.status)
+
+
+async def refund_stake(wallet_inkey: str, amount: int, transaction_id: str, paid: bool = True):
+    """
+    Gives back the stake of a bet its match was closed before it could be
+    recorded. Does nothing if the stake's payment didn't go through.
+    """
+    if not paid:
+        return
+    if ledger is not None:
+        # A ledger stake is simply given back, there's no payment to chase
+        await ledger.post(wallet_inkey, amount, ENTRY_REVERSAL, ref=f"reversal:{transaction_id}")
+        return
+
+    report = await payout_engine.run([PayoutOrder(
+        wallet_inkey=wallet_inkey,
+        amount=amount,
+        memo="Refund, betting is closed",
+        key=f"refund:{transaction_id}"
+    )])
+    result = report.results[0]
+    if result.status != "paid":
+        logger.error(
+            "Error refunding stake: %s", result.error,
+            extra={"event": "stake_refund_failed", "transaction_id": transaction_id, "status": result.status}
+        )
+    balance_cache.invalidate(wallet_inkey)
+    balance_cache.invalidate(ADMIN_WALLET_INKEY)
+
+
+async def confirm_deposit(payment_hash: str, paid: bool):
+    """Credits a pending deposit once its payment arrived, or drops it."""
+    entry = await ledger.settle_deposit(payment_hash, paid)
+    if entry is None:
+        return
+    balance_cache.invalidate(entry.wallet_inkey)
+    balance_cache.invalidate(ADMIN_WALLET_INKEY)
+    wallet_events.publish(entry.wallet_inkey, "ledger", balance=ledger.balance(entry.wallet_inkey), reason="deposit")
+
+
+async def resume_pending_payments():
+    """Tracks the pending bets and deposits left by a previous run again."""
+    after_id = None
+    while True:
+        page = await bet_store.query(status=BET_PENDING, after_id=after_id, limit=BETS_PAGE_LIMIT)
+        for bet in page:
+            confirm_later(bet.transaction_id, lambda paid, bet_id=bet.id: confirm_bet(bet_id, paid))
+        if len(page) < BETS_PAGE_LIMIT:
+            break
+        after_id = page[-1].id
+
+    if ledger is not None:
+        for deposit in await ledger.pending_deposits():
+            confirm_later(
+                deposit.payment_hash, lambda paid, payment_hash=deposit.payment_hash: confirm_deposit(payment_hash, paid)
+            )
+
+
 @app.post("/api/place-bet", response_model=PlaceBetResponse)
-async def place_bet(bet_request: PlaceBetRequest):
+async def place_bet(bet_request: PlaceBetRequest, idempotency_key: Optional[str] = Header(None)):
     """
     Place a bet using the wallet adminkey from local storage.
     
     1. User sends wallet admin key and make an invoice to admin 
     2. Store user wallet invoice key against the option to help in the resolve
+
+    A retry sent with the same Idempotency-Key header gets the first
+    response back instead of paying for the bet again.
     """
+    return await run_idempotent(
+        "place-bet", idempotency_key, bet_request.model_dump_json(),
+        lambda: _place_bet(bet_request)
+    )
+
+
+async def _place_bet(bet_request: PlaceBetRequest) -> PlaceBetResponse:
     match_id = bet_request.match_id
     selected_outcome = bet_request.selected_outcome
     wallet_adminkey = bet_request.wallet_adminkey
     wallet_inkey = bet_request.wallet_inkey
-    odds = bet_request.odds
     amount = bet_request.amount
     
-    try:
-        # Validate wallet credentials
-        print("HERE")
+    # Only matches from the catalog can be bet on
+    if match_catalog is not None:
+        fixture = match_catalog.get(match_id)
+        if fixture is None:
+            return PlaceBetResponse(success=False, message="Unknown match")
+        if selected_outcome not in fixture.outcomes:
+            return PlaceBetResponse(success=False, message="Unknown outcome")
 
-        try:
-            wallet_info = client.get_wallet(wallet_adminkey)
-            if not wallet_info:
-                return PlaceBetResponse(success=False, message="Invalid wallet credentials")
-        except Exception as wallet_error:
-            print(f"Error validating wallet: {wallet_error}")
-            return PlaceBetResponse(success=False, message="Failed to validate wallet")
-        
-        # Create invoice from admin wallet
-        try:
-            invoice = client.create_invoice(
-                wallet_key=ADMIN_WALLET_INKEY,
-                amount_sats=amount,
-                memo=f"Bet on {match_id}: {selected_outcome}"
-            )
-        except Exception as invoice_error:
-            print(f"Error creating invoice: {invoice_error}")
-            return PlaceBetResponse(success=False, message="Failed to create invoice")
-        
-        # Pay the invoice from user wallet
-        try:
-            payment = client.pay_invoice(
-                wallet_adminkey=wallet_adminkey,
-                invoice=invoice.bolt11
+    try:
+        # Resolution of this match waits for the bet to be recorded, so it
+        # can't be closed between the status check and bet_store.add
+        async with match_locks.placing(match_id):
+            match = await bet_store.get_match(match_id)
+            if match is not None and match.status != MATCH_OPEN:
+                return PlaceBetResponse(success=False, message="Betting is closed")
+
+            # The bet is made at the current server price, taken before any
+            # sats move, never at the odds the client sent
+            await load_odds(match_id)
+            odds = odds_engine.price(match_id, selected_outcome)
+            if bet_request.odds is not None and odds < bet_request.odds:
+                return PlaceBetResponse(success=False, message=f"Odds changed, the current price is {odds}")
+
+            status = BET_OPEN
+
+            if ledger is not None:
+                # The stake comes off the ledger balance, no LNbits call needed
+                if not ledger.authorize(wallet_inkey, wallet_adminkey):
+                    return PlaceBetResponse(success=False, message="Invalid wallet credentials")
+                try:
+                    entry = await ledger.post(wallet_inkey, -amount, ENTRY_BET)
+                except InsufficientFunds:
+                    return PlaceBetResponse(success=False, message="Insufficient balance")
+                transaction_id = f"{LEDGER_TRANSACTION_PREFIX}{entry.id}"
+                round_trips = 0
+            else:
+                # Validate the wallet while the house invoice is being created,
+                # then pay that invoice from the user wallet
+                try:
+                    transfer = await client.transfer(
+                        from_adminkey=wallet_adminkey,
+                        to_inkey=ADMIN_WALLET_INKEY,
+                        amount=amount,
+                        memo=f"Bet on {match_id}: {selected_outcome}",
+                        webhook=settlement_webhook()
+                    )
+                except TransferError as transfer_error:
+                    if isinstance(transfer_error.__cause__, AdmissionRejected):
+                        raise transfer_error.__cause__
+                    logger.warning(
+                        "Error placing bet: %s", transfer_error,
+                        extra={"event": "bet_failed", "stage": transfer_error.stage, "match_id": match_id}
+                    )
+                    return PlaceBetResponse(success=False, message=TRANSFER_ERROR_MESSAGES[transfer_error.stage])
+
+                # The bet only counts once the house has actually received the stake
+                paid = await confirm_house_payment(transfer, match_id=match_id)
+                if paid is False:
+                    return PlaceBetResponse(success=False, message="Payment failed")
+
+                # Extract transaction ID, a pending bet keeps the hash its payment is tracked by
+                if paid is None:
+                    status = BET_PENDING
+                    transaction_id = transfer.invoice.payment_hash
+                else:
+                    transaction_id = transfer.payment.checking_id
+                round_trips = transfer.round_trips
+
+                balance_cache.invalidate(wallet_inkey)
+                balance_cache.invalidate(ADMIN_WALLET_INKEY)
+
+            logger.info(
+                "Bet placed",
+                extra={
+                    "event": "bet_placed",
+                    "match_id": match_id,
+                    "outcome": selected_outcome,
+                    "amount": amount,
+                    "round_trips": round_trips
+                }
             )
-            
-            # Extract transaction ID
-            transaction_id = payment.checking_id if hasattr(payment, 'checking_id') else "unknown"
 
-        except Exception as payment_error:
-            print(f"Error processing payment: {payment_error}")
-            return PlaceBetResponse(success=False, message="Payment failed - insufficient funds or network error")
-        
-        # Use setdefault to handle initialization in one step
-        bet_record = ACTIVE_BETS.setdefault(match_id, {
-            "status": "open",
-            "winner": None,
-            "participants": {}
-        })
-
-        # Use setdefault again for the participants list
-        participants = bet_record["participants"].setdefault(selected_outcome, [])
-
-        # Add the new participant to the list
-        participants.append({
-            "wallet_adminkey": wallet_adminkey,
-            "wallet_inkey": wallet_inkey,
-            "amount": amount,
-            "odds": odds,
-            "timestamp": datetime.now().isoformat()
-        })
-
-        print(ACTIVE_BETS)
-        
+            # Record the bet, this also opens the match on its first bet
+            try:
+                bet = await bet_store.add(Bet(
+                    match_id=match_id,
+                    outcome=selected_outcome,
+                    wallet_inkey=wallet_inkey,
+                    wallet_adminkey=wallet_adminkey,
+                    amount=amount,
+                    odds=odds,
+                    status=status,
+                    transaction_id=transaction_id
+                ))
+            except MatchClosed:
+                # Closed by a resolve in another process after the check above
+                if status == BET_PENDING:
+                    confirm_later(transaction_id, lambda paid: refund_stake(wallet_inkey, amount, transaction_id, paid))
+                else:
+                    await refund_stake(wallet_inkey, amount, transaction_id)
+                return PlaceBetResponse(success=False, message="Betting is closed")
+            except Exception:
+                if ledger is not None:
+                    await refund_stake(wallet_inkey, amount, transaction_id)
+                raise
+
+            if status == BET_PENDING:
+                confirm_later(transaction_id, lambda paid: confirm_bet(bet.id, paid))
+            else:
+                odds_engine.record_bet(match_id, selected_outcome, amount)
+                leaderboard.record_bet(player_id(wallet_inkey), amount)
+
+        if ledger is not None:
+            wallet_events.publish(wallet_inkey, "ledger", balance=ledger.balance(wallet_inkey), reason="bet")
+        else:
+            wallet_events.publish(wallet_inkey, "balance", delta=-amount, reason="bet")
+        wallet_events.publish(
+            wallet_inkey, "bet",
+            bet_id=bet.id, match_id=match_id, outcome=selected_outcome, amount=amount, status=bet.status
+        )
+
+        if status == BET_PENDING:
+            return PlaceBetResponse(
+                success=False,
+                pending=True,
+                message="Bet recorded, it counts once the payment settles",
+                transaction_id=transaction_id,
+                round_trips=round_trips,
+                odds=odds
+            )
         return PlaceBetResponse(
             success=True, 
             message=f"Bet placed on {selected_outcome}",
-            transaction_id=transaction_id
+            transaction_id=transaction_id,
+            round_trips=round_trips,
+            odds=odds
         )
+    except AdmissionRejected:
+        raise
     except Exception as e:
-        print(f"Error placing bet: {e}")
+        logger.exception("Error placing bet", extra={"event": "bet_failed", "match_id": match_id})
         return PlaceBetResponse(success=False, message=f"Error placing bet: {str(e)}")
     
     
@@ -458,11 +1467,190 @@ async def place_bet(bet_request: PlaceBetRequest):
 #     )
 
 @app.get("/api/bets")
-async def get_bets():
+async def get_bets(
+    match_id: Optional[str] = None,
+    status: Optional[str] = None,
+    outcome: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=BETS_PAGE_LIMIT),
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
     """
-    Get the list of active bets.
+    Get bets page by page, oldest first.
+
+    1. Filter by match_id, status and outcome
+    2. Pass the returned next_cursor as cursor to get the following page
+    3. Select fields with a comma separated list, wallet keys are never returned
+    4. With format=ndjson every matching bet is streamed, one JSON object per line
+    """
+    if fields:
+        selected = tuple(f.strip() for f in fields.split(",") if f.strip())
+        unknown = [f for f in selected if f not in BET_PUBLIC_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    else:
+        selected = BET_PUBLIC_FIELDS
+
+    def project(bet: Bet) -> dict:
+        return {name: getattr(bet, name) for name in selected}
+
+    filters = {"match_id": match_id, "status": status, "outcome": outcome}
+
+    if format == "ndjson":
+        async def stream():
+            after_id = cursor
+            while True:
+                page = await bet_store.query(**filters, after_id=after_id, limit=BETS_PAGE_LIMIT)
+                if not page:
+                    break
+                yield "".join(json.dumps(project(bet)) + "\n" for bet in page)
+                if len(page) < BETS_PAGE_LIMIT:
+                    break
+                after_id = page[-1].id
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    page = await bet_store.query(**filters, after_id=cursor, limit=limit)
+    return {
+        "bets": [project(bet) for bet in page],
+        "next_cursor": page[-1].id if len(page) == limit else None
+    }
+
+@app.get("/api/matches")
+async def list_matches(request: Request, league: Optional[str] = None):
+    """
+    List the matches that can be bet on, soonest first, optionally of one league.
+    The listing is rendered when the catalog changes, and clients holding
+    the current version get a 304 through its ETag.
     """
-    return ACTIVE_BETS
+    if match_catalog is None:
+        raise HTTPException(status_code=404, detail="The match catalog is disabled")
+
+    listing = match_catalog.listing(league)
+    if listing is None:
+        return {"matches": []}
+    body, etag = listing
+
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={int(MATCH_CATALOG_REFRESH)}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/matches/{match_id}/summary", response_model=MatchSummaryResponse)
+async def get_match_summary(match_id: str):
+    """
+    Get the stake, bet count and potential payout per outcome of a match.
+    These are running totals, so the cost doesn't depend on the number of bets.
+    """
+    match = await bet_store.get_match(match_id)
+    if match is None:
+        return MatchSummaryResponse(success=False, message="Match not found in active bets")
+
+    totals = await bet_store.outcome_totals(match_id)
+    return MatchSummaryResponse(
+        success=True,
+        match_id=match.match_id,
+        status=match.status,
+        winner=match.winner,
+        total_stake=sum(t.stake for t in totals.values()),
+        total_bets=sum(t.bets for t in totals.values()),
+        outcomes={
+            outcome: OutcomeSummary(stake=t.stake, bets=t.bets, liability=t.liability)
+            for outcome, t in totals.items()
+        }
+    )
+
+
+@app.get("/api/leaderboard", response_model=LeaderboardResponse)
+async def get_leaderboard(
+    window: str = Query(WINDOW_ALL, pattern=f"^({'|'.join(WINDOWS)})$"),
+    limit: int = Query(10, ge=1, le=LEADERBOARD_PAGE_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Get the players with the highest profit in the current day, week or of
+    all time, from position offset. Players with the same profit share a rank.
+    """
+    return LeaderboardResponse(
+        success=True,
+        window=window,
+        players=leaderboard.players(window),
+        entries=[
+            LeaderboardEntry(rank=rank, player=player, **standing.to_dict())
+            for rank, player, standing in leaderboard.top(window, limit=limit, offset=offset)
+        ]
+    )
+
+
+@app.get("/api/leaderboard/{wallet_inkey}", response_model=LeaderboardStandingResponse)
+async def get_leaderboard_standing(
+    wallet_inkey: str,
+    window: str = Query(WINDOW_ALL, pattern=f"^({'|'.join(WINDOWS)})$"),
+):
+    """
+    Get a wallet's rank and totals, along with the player id it appears
+    under in the leaderboard.
+    """
+    player = player_id(wallet_inkey)
+    found = leaderboard.standing(player, window)
+    if found is None:
+        return LeaderboardStandingResponse(
+            success=False, message="No bets in this window", window=window, players=leaderboard.players(window)
+        )
+    rank, standing = found
+    return LeaderboardStandingResponse(
+        success=True,
+        window=window,
+        players=leaderboard.players(window),
+        entry=LeaderboardEntry(rank=rank, player=player, **standing.to_dict())
+    )
+
+
+async def load_leaderboard():
+    """Rebuilds the leaderboard from every stored bet and closed match."""
+    after_id = None
+    while True:
+        page = await bet_store.query(after_id=after_id, limit=BETS_PAGE_LIMIT)
+        for bet in page:
+            # Pending bets are counted once confirm_bet() opens them
+            if bet.status in (BET_PENDING, BET_VOID):
+                continue
+            leaderboard.record_bet(
+                player_id(bet.wallet_inkey), bet.amount, at=datetime.fromisoformat(bet.timestamp).timestamp()
+            )
+        if len(page) < BETS_PAGE_LIMIT:
+            break
+        after_id = page[-1].id
+
+    for match in await bet_store.list_matches():
+        if match.status == MATCH_CLOSED:
+            # Matches closed before their closing time was stored only count all time
+            at = datetime.fromisoformat(match.closed_at).timestamp() if match.closed_at else 0.0
+            record_results(match, await bet_store.query(match_id=match.match_id), at=at)
+    logger.info("Leaderboard loaded", extra={"event": "leaderboard_loaded", "players": len(leaderboard)})
+
+
+def record_results(match: Match, bets: list, at: Optional[float] = None):
+    """
+    Adds the outcome of every bet of a closed match to the leaderboard,
+    with the winnings each bet is owed whether or not they were paid yet.
+    """
+    # A void bet's stake never arrived, it neither won nor lost
+    bets = [bet for bet in bets if bet.status != BET_VOID]
+    if match.settlement == SETTLEMENT_POOL:
+        pool = settle_pool(
+            [bet.id for bet in bets], [bet.outcome for bet in bets], [bet.amount for bet in bets],
+            match.winner, rake_bps=POOL_RAKE_BPS
+        )
+        payouts = dict(pool.payouts_by_bet())
+    else:
+        payouts = {bet.id: int(bet.amount * bet.odds) for bet in bets if bet.outcome == match.winner}
+
+    for bet in bets:
+        leaderboard.record_result(player_id(bet.wallet_inkey), bet.amount, payouts.get(bet.id, 0), at=at)
+
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
@@ -471,71 +1659,368 @@ if __name__ == "__main__":
 
 
 @app.post("/api/resolve-bet", response_model=ResolveBetResponse)
-async def resolve_bet(resolve_request: ResolveBetRequest):
+async def resolve_bet(resolve_request: ResolveBetRequest, idempotency_key: Optional[str] = Header(None)):
     """
     Resolve a bet and distribute winnings.
     
     1. Get the id and option on who has won
     2. Return the amounts to the people who have won
+
+    Resolving an already resolved match again with the same outcome
+    retries the payouts that failed and never pays a winner twice.
     """
-    match_id = resolve_request.match_id
-    winning_outcome = resolve_request.winning_outcome
-    
-    # Validate match exists in active bets
-    if match_id not in ACTIVE_BETS:
-        return ResolveBetResponse(success=False, message="Match not found in active bets")
-    
-    match_bets = ACTIVE_BETS[match_id]
-    
-    # Check if match is already resolved
-    if match_bets["status"] == "closed":
-        return ResolveBetResponse(success=False, message="Match is already resolved")
-    
-    # Mark match as closed with winner
-    match_bets["status"] = "closed"
-    match_bets["winner"] = winning_outcome
-    
-    # Get winning participants
-    winners = match_bets["participants"].get(winning_outcome, [])
-    
-    if not winners:
+    return await run_idempotent(
+        "resolve-bet", idempotency_key, resolve_request.model_dump_json(),
+        lambda: _resolve_bet(resolve_request)
+    )
+
+
+@app.post("/api/resolve-bets", response_model=ResolveBetsResponse)
+async def resolve_bets(resolve_request: ResolveBetsRequest, idempotency_key: Optional[str] = Header(None)):
+    """
+    Resolve many matches at once, e.g. a whole round of fixtures.
+
+    Winnings are added up per wallet across all the matches, so a wallet
+    gets one payment no matter how many of its bets won. The report maps
+    every payment to the bets it covers.
+    """
+    return await run_idempotent(
+        "resolve-bets", idempotency_key, resolve_request.model_dump_json(),
+        lambda: _resolve_bets(resolve_request)
+    )
+
+
+async def _resolve_bet(resolve_request: ResolveBetRequest) -> ResolveBetResponse:
+    error = await close_match_for_resolution(
+        resolve_request.match_id, resolve_request.winning_outcome, resolve_request.settlement
+    )
+    if error is not None:
+        return ResolveBetResponse(success=False, message=error)
+
+    claims, pool = await claim_winnings(
+        resolve_request.match_id, resolve_request.winning_outcome, resolve_request.settlement
+    )
+    if not claims:
         return ResolveBetResponse(success=True, message="No winners to pay out", payouts=0)
-    
-    # Pay out winnings
-    successful_payouts = 0
+
     try:
-        for winner in winners:
-            try:
-                # Calculate winnings based on odds
-                odds = float(winner.get("odds", 1.0))
-                bet_amount = winner.get("amount", 1)
-                payout_amount = int(bet_amount * odds)  # Convert to int for sats
-                
-                # Create invoice from winner's wallet
-                invoice = client.create_invoice(
-                    wallet_key=winner["wallet_inkey"],
-                    amount_sats=payout_amount,
-                    memo=f"Winnings from {match_id}: {winning_outcome}"
-                )
-                
-                # Pay the invoice from admin wallet
-                client.pay_invoice(
-                    wallet_adminkey=ADMIN_WALLET_ADMINKEY,
-                    invoice=invoice.bolt11
-                )
-                
-                successful_payouts += 1
-            except Exception as winner_error:
-                print(f"Error paying winner {winner['wallet_inkey']}: {winner_error}")
-        
-        return ResolveBetResponse(
+        report, paid_bets = await pay_winnings(claims)
+    except Exception as e:
+        logger.exception(
+            "Error resolving bet", extra={"event": "resolve_failed", "match_id": resolve_request.match_id}
+        )
+        return ResolveBetResponse(success=False, message=f"Error resolving bet: {str(e)}")
+
+    if pool is not None:
+        report["pool"] = pool_summary(pool)
+
+    return ResolveBetResponse(
+        success=True,
+        message=f"Match resolved with {len(paid_bets)} winners paid",
+        payouts=len(paid_bets),
+        report=report
+    )
+
+
+async def _resolve_bets(resolve_request: ResolveBetsRequest) -> ResolveBetsResponse:
+    # The same match twice adds nothing, and the whole batch is rejected
+    # before anything is closed if its outcomes or settlements differ
+    by_match: Dict[str, ResolveBetRequest] = {}
+    for r in resolve_request.matches:
+        first = by_match.setdefault(r.match_id, r)
+        if (first.winning_outcome, first.settlement) != (r.winning_outcome, r.settlement):
+            raise HTTPException(status_code=422, detail=f"Match {r.match_id} is listed with different results")
+    requests = list(by_match.values())
+    if len(requests) > RESOLVE_BATCH_MAX_MATCHES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {RESOLVE_BATCH_MAX_MATCHES} matches can be resolved at once"
+        )
+
+    matches = {}
+    claims = []
+    for request in requests:
+        error = await close_match_for_resolution(request.match_id, request.winning_outcome, request.settlement)
+        if error is not None:
+            matches[request.match_id] = ResolveBetResponse(success=False, message=error)
+            continue
+        match_claims, pool = await claim_winnings(request.match_id, request.winning_outcome, request.settlement)
+        claims += match_claims
+        matches[request.match_id] = ResolveBetResponse(
             success=True,
-            message=f"Match resolved with {successful_payouts} winners paid",
-            payouts=successful_payouts
+            message="Match resolved",
+            report={"pool": pool_summary(pool)} if pool is not None else None
+        )
+
+    if not claims:
+        return ResolveBetsResponse(
+            success=all(m.success for m in matches.values()),
+            message="No winners to pay out",
+            matches=matches
         )
+
+    try:
+        report, paid_bets = await pay_winnings(claims)
     except Exception as e:
-        print(f"Error resolving bet: {e}")
-        return ResolveBetResponse(success=False, message=f"Error resolving bet: {str(e)}")
+        logger.exception("Error resolving bets", extra={"event": "resolve_failed"})
+        return ResolveBetsResponse(success=False, message=f"Error resolving bets: {str(e)}", matches=matches)
+
+    paid_bets = set(paid_bets)
+    for bet, _ in claims:
+        if bet.id in paid_bets:
+            matches[bet.match_id].payouts += 1
+
+    return ResolveBetsResponse(
+        success=all(m.success for m in matches.values()),
+        message=f"{len(matches)} matches resolved with {len(paid_bets)} winners paid",
+        payouts=len(paid_bets),
+        matches=matches,
+        report=report
+    )
+
+
+def pool_summary(pool) -> dict:
+    """The part of a PoolSettlement a resolve reports."""
+    return {
+        "pool": pool.pool,
+        "rake": pool.rake,
+        "winning_stake": pool.winning_stake,
+        "refunded": pool.refunded,
+    }
+
+
+async def close_match_for_resolution(match_id: str, winning_outcome: str, settlement: str) -> Optional[str]:
+    """
+    Closes a match with its winner and settlement, or checks that it already
+    was closed with the same ones. The first close also adds the match's
+    results to the leaderboard.
+
+    Returns:
+        - None once the match is closed with this winner, an error message otherwise
+    """
+    # Stops new bets on the match and waits for the ones being placed
+    async with match_locks.resolving(match_id):
+        # Validate match exists in active bets
+        match = await bet_store.get_match(match_id)
+        if match is None:
+            return "Match not found in active bets"
+        if match.status == MATCH_OPEN and await bet_store.query(match_id=match_id, status=BET_PENDING, limit=1):
+            return "Bets on this match are waiting for their payment to settle"
+
+        # Mark match as closed with winner, this fails if it is already resolved
+        closed = await bet_store.close_match(match_id, winning_outcome, settlement)
+        if not closed:
+            match = await bet_store.get_match(match_id)
+            if match.winner != winning_outcome:
+                return "Match is already resolved"
+            # A retry must pay out the way the match was settled, matches closed
+            # before the settlement was stored can't be checked
+            if match.settlement is not None and match.settlement != settlement:
+                return f"Match was resolved with {match.settlement} settlement"
+        odds_engine.close(match_id)
+
+    # Only worth a query when the match was just closed or someone listens
+    if closed or wallet_events:
+        bets = await bet_store.query(match_id=match_id)
+        if closed:
+            record_results(Match(match_id, MATCH_CLOSED, winning_outcome, settlement), bets)
+        # Tell connected bettors whether they won
+        for bet in bets if wallet_events else ():
+            wallet_events.publish(
+                bet.wallet_inkey, "bet", bet_id=bet.id, match_id=match_id, status=bet.status
+            )
+    return None
+
+
+async def claim_winnings(match_id: str, winning_outcome: str, settlement: str):
+    """
+    Claims the unpaid winning bets of a resolved match for payment, so a
+    concurrent resolve of the same match can't pay them too.
+
+    Returns:
+        - (bet, winnings in sats) for every claimed bet that is owed something
+        - the PoolSettlement for pool matches, None otherwise
+    """
+    # Pool matches split everything staked on the match between the winners,
+    # or refund every bet when nobody backed the winning outcome
+    pool = None
+    payable = (BET_WON, BET_PAYOUT_FAILED)
+    if settlement == SETTLEMENT_POOL:
+        pool = settle_pool(*await bet_store.stakes(match_id), winning_outcome, rake_bps=POOL_RAKE_BPS)
+        pool_payouts = dict(pool.payouts_by_bet())
+        if pool.refunded:
+            payable += (BET_LOST,)
+
+    # Get winning participants that are not paid yet, including
+    # the ones whose payout failed when the match was resolved before
+    unpaid = []
+    for status in payable:
+        unpaid += await bet_store.query(match_id=match_id, status=status)
+
+    claimed = set(await bet_store.update_status(
+        [bet.id for bet in unpaid], BET_PAYING, expected=payable
+    ))
+
+    def winnings(bet: Bet) -> int:
+        if pool is not None:
+            return pool_payouts.get(bet.id, 0)
+        # Calculate winnings based on odds, converted to int for sats
+        return int(bet.amount * bet.odds)
+
+    claims = [(bet, winnings(bet)) for bet in unpaid if bet.id in claimed]
+
+    # A pool share can round down to nothing, there is nothing to send then
+    nothing_owed = [bet.id for bet, amount in claims if amount <= 0]
+    if nothing_owed:
+        await bet_store.update_status(nothing_owed, BET_PAID, expected=(BET_PAYING,))
+    return [(bet, amount) for bet, amount in claims if amount > 0], pool
+
+
+async def pay_winnings(claims: list) -> tuple[dict, list]:
+    """
+    Pays claimed winnings: bets staked from the ledger are credited there,
+    the rest are added up per wallet and paid with one payment per wallet.
+    Every invoice is recorded on its bets before it is paid, and bets that
+    already have one are paid with it again rather than a new one, so a
+    payment whose outcome was lost is never repeated. Claims that couldn't
+    be paid are released for the next resolve.
+
+    Args:
+        - claims (list): (bet, winnings in sats) pairs from claim_winnings
+
+    Returns:
+        - the payout report, whose results carry the ids of the bets each payment covers
+        - the ids of the bets paid
+    """
+    bets = {bet.id: bet for bet, _ in claims}
+    try:
+        # Bets staked from the ledger win back onto the ledger, without a payment
+        credited = [
+            (bet, amount) for bet, amount in claims
+            if ledger is not None and (bet.transaction_id or "").startswith(LEDGER_TRANSACTION_PREFIX)
+        ]
+        if credited:
+            # Keyed by bet, so winnings are never credited twice
+            await asyncio.gather(*(
+                ledger.post(bet.wallet_inkey, amount, ENTRY_WINNINGS, ref=f"winnings:{bet.id}")
+                for bet, amount in credited
+            ))
+            await bet_store.update_status([bet.id for bet, _ in credited], BET_PAID, expected=(BET_PAYING,))
+            for bet, _ in credited:
+                wallet_events.publish(
+                    bet.wallet_inkey, "ledger", balance=ledger.balance(bet.wallet_inkey), reason="winnings"
+                )
+                wallet_events.publish(bet.wallet_inkey, "bet", bet_id=bet.id, match_id=bet.match_id, status=BET_PAID)
+
+        # Bets whose invoice was created by an earlier resolve are paid with that invoice,
+        # the remaining winnings are netted per wallet
+        credited_ids = {bet.id for bet, _ in credited}
+        remaining = [(bet, amount) for bet, amount in claims if bet.id not in credited_ids]
+        payouts = await bet_store.get_payouts(sorted({bet.payout_hash for bet, _ in remaining if bet.payout_hash}))
+        invoiced: Dict[str, list] = {}
+        owed: Dict[str, list] = {}
+        for bet, amount in remaining:
+            if bet.payout_hash in payouts:
+                invoiced.setdefault(bet.payout_hash, []).append(bet.id)
+            else:
+                owed.setdefault(bet.wallet_inkey, []).append((bet, amount))
+
+        orders = []
+        for payment_hash, bet_ids in invoiced.items():
+            payout = payouts[payment_hash]
+            bet_ids.sort()
+            orders.append(PayoutOrder(
+                wallet_inkey=payout.wallet_inkey,
+                amount=payout.amount,
+                memo="Winnings",
+                ref=bet_ids,
+                key="winnings:" + hashlib.sha256(",".join(map(str, bet_ids)).encode()).hexdigest(),
+                bolt11=payout.bolt11,
+                payment_hash=payment_hash,
+            ))
+        for wallet_inkey, wallet_claims in owed.items():
+            bet_ids = sorted(bet.id for bet, _ in wallet_claims)
+            match_ids = sorted({bet.match_id for bet, _ in wallet_claims})
+            orders.append(PayoutOrder(
+                wallet_inkey=wallet_inkey,
+                amount=sum(amount for _, amount in wallet_claims),
+                memo=(
+                    f"Winnings from {', '.join(match_ids)}" if len(match_ids) <= 3
+                    else f"Winnings from {len(match_ids)} matches"
+                ),
+                ref=bet_ids,
+                # The same set of bets is only ever paid once
+                key="winnings:" + hashlib.sha256(",".join(map(str, bet_ids)).encode()).hexdigest(),
+            ))
+        async def record_invoice(order: PayoutOrder, invoice) -> None:
+            await bet_store.add_payout(
+                Payout(invoice.payment_hash, order.wallet_inkey, order.amount, invoice.bolt11), order.ref
+            )
 
+        report = await payout_engine.run(orders, on_invoice=record_invoice)
+
+        paid_bets = [bet_id for result in report.results if result.status == "paid" for bet_id in result.ref]
+        # Pending payments keep their invoice, the next resolve checks it before paying
+        failed_bets = [bet_id for result in report.results if result.status != "paid" for bet_id in result.ref]
+        await bet_store.update_status(paid_bets, BET_PAID, expected=(BET_PAYING,))
+        await bet_store.update_status(failed_bets, BET_PAYOUT_FAILED, expected=(BET_PAYING,))
+
+        balance_cache.invalidate(ADMIN_WALLET_INKEY)
+        for result in report.results:
+            balance_cache.invalidate(result.wallet_inkey)
+            if result.status == "paid":
+                wallet_events.publish(result.wallet_inkey, "balance", delta=result.amount, reason="payout")
+            for bet_id in result.ref:
+                wallet_events.publish(
+                    result.wallet_inkey, "bet",
+                    bet_id=bet_id, match_id=bets[bet_id].match_id,
+                    status=BET_PAID if result.status == "paid" else BET_PAYOUT_FAILED
+                )
 
+        for result in report.results:
+            if result.status != "paid":
+                logger.error(
+                    "Error paying winner: %s", result.error,
+                    extra={"event": "payout_failed", "bet_ids": result.ref}
+                )
+        logger.info(
+            "Winnings paid",
+            extra={
+                "event": "winnings_paid",
+                "match_ids": sorted({bet.match_id for bet in bets.values()}),
+                "bets": len(claims),
+                "payments": len(orders),
+                "paid": report.paid,
+                "credited": len(credited),
+                "failed": report.failed,
+                "elapsed": report.elapsed
+            }
+        )
 
+        summary = report.to_dict()
+        summary["credited"] = len(credited)
+        return summary, [bet.id for bet, _ in credited] + paid_bets
+    except Exception:
+        # Release the claims so the next resolve retries these winners
+        await bet_store.update_status(list(bets), BET_PAYOUT_FAILED, expected=(BET_PAYING,))
+        raise
+
+
+async def release_interrupted_payouts():
+    """
+    Releases bets left claimed by a run that stopped while paying them, so
+    the next resolve of their match pays them. Those that got an invoice
+    keep it, and it is checked before being paid again.
+    """
+    released = 0
+    after_id = None
+    while True:
+        page = await bet_store.query(status=BET_PAYING, after_id=after_id, limit=BETS_PAGE_LIMIT)
+        released += len(await bet_store.update_status(
+            [bet.id for bet in page], BET_PAYOUT_FAILED, expected=(BET_PAYING,)
+        ))
+        if len(page) < BETS_PAGE_LIMIT:
+            break
+        after_id = page[-1].id
+    if released:
+        logger.warning("Released interrupted payouts", extra={"event": "payouts_released", "bets": released})
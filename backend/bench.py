@@ -0,0 +1,167 @@
+"""
+End-to-end load benchmark for the betting backend.
+
+Simulates N concurrent users against a running backend: every user signs
+up through /api/create-wallet, then places bets and polls its balance,
+and finally every match is resolved. Prints throughput and latency
+percentiles per endpoint. Every run bets on matches of its own, so the
+backend runs without a match catalog.
+
+A reproducible setup, all three from the backend directory:
+
+    python fake_lnbits.py --port 5000 --latency 0.01 --seed 1 \\
+        --seed-wallet house-inkey:house-adminkey:100000000
+    LNBITS_URL=http://127.0.0.1:5000 ADMIN_WALLET_INKEY=house-inkey \\
+        ADMIN_WALLET_ADMINKEY=house-adminkey WALLET_INITIAL_SATS=100 \\
+        MATCH_CATALOG_SOURCE=none BET_STORE_PATH=bench.db uvicorn app:app --port 8000
+    python bench.py --users 200 --bets-per-user 5
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import httpx
+
+
+@dataclass
+class OperationStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    started: float | None = None
+    finished: float | None = None
+
+    def record(self, started: float, ok: bool) -> None:
+        now = time.perf_counter()
+        self.latencies.append(now - started)
+        if not ok:
+            self.errors += 1
+        self.started = started if self.started is None else min(self.started, started)
+        self.finished = now if self.finished is None else max(self.finished, now)
+
+    def summary(self) -> dict:
+        count = len(self.latencies)
+        elapsed = (self.finished - self.started) if count else 0.0
+        ordered = sorted(self.latencies)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "throughput": round(count / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        }
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LoadBenchmark:
+    def __init__(self, http: httpx.AsyncClient, users: int, bets_per_user: int, matches: int, amount: int, seed: int):
+        self._http = http
+        self._users = users
+        self._bets_per_user = bets_per_user
+        self._amount = amount
+        self._rng = random.Random(seed)
+
+        run_id = uuid.uuid4().hex[:8]
+        self._matches = [f"bench-{run_id}-{i}" for i in range(matches)]
+        self.stats: dict[str, OperationStats] = {
+            "create-wallet": OperationStats(),
+            "place-bet": OperationStats(),
+            "balance": OperationStats(),
+            "resolve-bet": OperationStats(),
+        }
+
+    async def _call(self, operation: str, method: str, url: str, **kwargs) -> dict | None:
+        started = time.perf_counter()
+        try:
+            response = await self._http.request(method, url, **kwargs)
+            data = response.json()
+            ok = response.status_code == 200 and data.get("success", False)
+        except Exception:
+            data, ok = None, False
+        self.stats[operation].record(started, ok)
+        return data if ok else None
+
+    async def _user(self, index: int) -> None:
+        wallet = await self._call(
+            "create-wallet", "POST", "/api/create-wallet",
+            json={"username": f"bench-user-{index}"}
+        )
+        if wallet is None:
+            return
+
+        for _ in range(self._bets_per_user):
+            await self._call(
+                "place-bet", "POST", "/api/place-bet",
+                json={
+                    "match_id": self._rng.choice(self._matches),
+                    "selected_outcome": self._rng.choice(("home", "away")),
+                    "wallet_adminkey": wallet["adminkey"],
+                    "wallet_inkey": wallet["inkey"],
+                    "amount": self._amount,
+                }
+            )
+            await self._call("balance", "GET", f"/api/balance/{wallet['inkey']}")
+
+    async def run(self) -> float:
+        started = time.perf_counter()
+        await asyncio.gather(*(self._user(i) for i in range(self._users)))
+        await asyncio.gather(*(
+            self._call(
+                "resolve-bet", "POST", "/api/resolve-bet",
+                json={"match_id": match_id, "winning_outcome": self._rng.choice(("home", "away"))}
+            )
+            for match_id in self._matches
+        ))
+        return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the betting backend")
+    parser.add_argument("--backend", default="http://127.0.0.1:8000", help="backend base URL")
+    parser.add_argument("--users", type=int, default=100, help="concurrent simulated users")
+    parser.add_argument("--bets-per-user", type=int, default=5)
+    parser.add_argument("--matches", type=int, default=5, help="matches the bets are spread over")
+    parser.add_argument("--amount", type=int, default=1, help="sats per bet")
+    parser.add_argument("--seed", type=int, default=1, help="seed for match and outcome choices")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.backend, limits=limits, timeout=60.0) as http:
+        bench = LoadBenchmark(http, args.users, args.bets_per_user, args.matches, args.amount, args.seed)
+        elapsed = await bench.run()
+
+    report = {
+        "users": args.users,
+        "elapsed_s": round(elapsed, 3),
+        "operations": {name: stats.summary() for name, stats in bench.stats.items()},
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{args.users} users, {report['elapsed_s']}s total")
+    print(f"{'operation':<15}{'count':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, s in report["operations"].items():
+        print(
+            f"{name:<15}{s['count']:>8}{s['errors']:>8}{s['throughput']:>10}"
+            f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
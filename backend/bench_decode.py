@@ -0,0 +1,127 @@
+"""
+Microbenchmark for decoding LNbits responses into models.
+
+Compares the slotted models in models.py, built with from_json, against
+the plain dataclasses they replaced, built with Model(**data). Reports
+decode throughput and the memory a decoded invoice and wallet keep alive.
+
+    python bench_decode.py --count 200000
+"""
+
+import argparse
+import dataclasses
+import json
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from models import Invoice, Wallet
+
+
+NOW = datetime(2025, 4, 4, 19, 49, 27, tzinfo=timezone.utc).isoformat()
+
+INVOICE_JSON = {
+    "checking_id": "a" * 64,
+    "payment_hash": "a" * 64,
+    "wallet_id": "b" * 32,
+    "amount": 100000,
+    "fee": 0,
+    "bolt11": "lnbc1u1fake" + "c" * 200,
+    "payment_request": "lnbc1u1fake" + "c" * 200,
+    "status": "pending",
+    "memo": "Bet on match 42",
+    "expiry": NOW,
+    "webhook": "",
+    "webhook_status": 0,
+    "preimage": "d" * 64,
+    "tag": "",
+    "extension": "",
+    "time": NOW,
+    "created_at": NOW,
+    "updated_at": NOW,
+    "extra": {},
+}
+
+WALLET_JSON = {
+    "id": "b" * 32,
+    "user": "e" * 32,
+    "name": "bench-wallet",
+    "adminkey": "f" * 32,
+    "inkey": "0" * 32,
+    "deleted": False,
+    "currency": "sat",
+    "balance_msat": 1000000,
+    "created_at": NOW,
+    "updated_at": NOW,
+    "extra": {},
+}
+
+
+def _legacy(model) -> type:
+    """The same fields as a plain dataclass, the way models.py used to declare them."""
+    annotations = {name: object for name in model._fields}
+    namespace = {"__annotations__": annotations, **model._defaults}
+    return dataclasses.dataclass(type(f"Legacy{model.__name__}", (), namespace))
+
+
+def _decode_legacy(cls, data: dict):
+    # The old models crash on unknown keys, so the response is filtered first
+    # the way get_wallet used to do it
+    names = {f.name for f in dataclasses.fields(cls)}
+    return cls(**{k: v for k, v in data.items() if k in names})
+
+
+def _throughput(decode, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        decode()
+    return count / (time.perf_counter() - started)
+
+
+def _bytes_per_object(decode, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [decode() for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return total / count
+
+
+def run(count: int) -> dict:
+    report = {}
+    for model, sample in ((Invoice, INVOICE_JSON), (Wallet, WALLET_JSON)):
+        legacy = _legacy(model)
+        # Decode from a fresh dict each time, like a real response body
+        body = json.dumps(sample)
+        cases = {
+            "dataclass": lambda legacy=legacy: _decode_legacy(legacy, json.loads(body)),
+            "slotted": lambda model=model: model.from_json(json.loads(body)),
+        }
+        for name, decode in cases.items():
+            report[f"{model.__name__.lower()}/{name}"] = {
+                "decodes_per_s": round(_throughput(decode, count)),
+                "bytes_per_object": round(_bytes_per_object(decode, min(count, 20000))),
+            }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark LNbits response decoding")
+    parser.add_argument("--count", type=int, default=100000, help="decodes per case")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.count)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'case':<22}{'decodes/s':>12}{'bytes/object':>14}")
+    for name, r in report.items():
+        print(f"{name:<22}{r['decodes_per_s']:>12}{r['bytes_per_object']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,748 @@
+import asyncio
+import sqlite3
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+
+# Bet statuses
+# The stake's payment hadn't settled when the bet was placed
+BET_PENDING = "pending"
+# The stake's payment failed, the bet doesn't count
+BET_VOID = "void"
+BET_OPEN = "open"
+BET_WON = "won"
+BET_LOST = "lost"
+# Claimed by a resolution that is paying it out right now
+BET_PAYING = "paying"
+BET_PAID = "paid"
+BET_PAYOUT_FAILED = "payout_failed"
+
+# Match statuses
+MATCH_OPEN = "open"
+MATCH_CLOSED = "closed"
+
+
+class MatchClosed(Exception):
+    """Raised when a bet is added to a match that was already closed."""
+
+
+@dataclass
+class Bet:
+    match_id: str
+    outcome: str
+    wallet_inkey: str
+    wallet_adminkey: str
+    amount: int
+    odds: float
+    status: str = BET_OPEN
+    # The stake payment's checking id, or its payment hash while it is pending
+    transaction_id: str | None = None
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    # Assigned by the store, increases with insertion order
+    id: int | None = None
+    # Payment hash of the invoice its winnings are being paid with
+    payout_hash: str | None = None
+
+
+@dataclass
+class Match:
+    match_id: str
+    status: str = MATCH_OPEN
+    winner: str | None = None
+    # How the winners were paid ("fixed" or "pool") and when the match closed
+    settlement: str | None = None
+    closed_at: str | None = None
+
+
+@dataclass
+class Payout:
+    """An invoice created to pay the winnings of one or more bets."""
+    payment_hash: str
+    wallet_inkey: str
+    amount: int
+    bolt11: str
+
+
+@dataclass
+class OutcomeTotals:
+    """Running totals of the bets placed on one outcome of a match."""
+    stake: int = 0
+    bets: int = 0
+    # What the house pays if this outcome wins, sum of int(amount * odds)
+    liability: int = 0
+
+    def add(self, bet: Bet) -> None:
+        self.stake += bet.amount
+        self.bets += 1
+        self.liability += int(bet.amount * bet.odds)
+
+
+class BetStore(ABC):
+    """
+    The interface every bet store implements.
+
+    Bets are appended once and afterwards only change status.
+    A match is created implicitly by its first bet. Pending and void bets
+    are left out of outcome totals and stakes.
+    """
+
+    @abstractmethod
+    async def add(self, bet: Bet) -> Bet:
+        """
+        Durably records a bet and creates its match if needed.
+
+        Returns:
+            - the stored bet with its id assigned
+
+        Raises:
+            - MatchClosed: the match was closed, nothing was recorded
+        """
+
+    @abstractmethod
+    async def get_match(self, match_id: str) -> Match | None:
+        """Returns the match, or None if nobody has bet on it yet."""
+
+    @abstractmethod
+    async def list_matches(self) -> list[Match]:
+        """Returns every known match."""
+
+    @abstractmethod
+    async def outcome_totals(self, match_id: str) -> dict[str, OutcomeTotals]:
+        """
+        Returns stake, bet count and liability per outcome of a match.
+        The totals are maintained as bets are added, not summed on read.
+        """
+
+    @abstractmethod
+    async def stakes(self, match_id: str) -> tuple[list[int], list[str], list[int]]:
+        """
+        Returns every bet of a match as columns, ordered by id.
+
+        Returns:
+            - (bet ids, outcomes, amounts)
+        """
+
+    @abstractmethod
+    async def settle_pending(self, bet_id: int, paid: bool) -> Bet | None:
+        """
+        Atomically opens a pending bet whose stake was paid, adding it to
+        its match's totals, or voids it if the payment failed.
+
+        Returns:
+            - the updated bet, or None if it wasn't pending
+        """
+
+    @abstractmethod
+    async def close_match(self, match_id: str, winner: str, settlement: str = "fixed") -> bool:
+        """
+        Atomically closes an open match and marks its bets won or lost.
+        The settlement and the closing time are recorded with the match.
+
+        Returns:
+            - False if the match does not exist or is already closed
+        """
+
+    @abstractmethod
+    async def query(
+        self,
+        match_id: str | None = None,
+        outcome: str | None = None,
+        wallet_inkey: str | None = None,
+        status: str | None = None,
+        after_id: int | None = None,
+        limit: int | None = None,
+    ) -> list[Bet]:
+        """
+        Returns bets matching every given filter, ordered by id.
+
+        Args:
+            - after_id (int | None): only bets with a greater id
+            - limit (int | None): maximum number of bets returned
+        """
+
+    @abstractmethod
+    async def count(self, status: str | None = None) -> int:
+        """Returns the number of bets, optionally only those with a status."""
+
+    @abstractmethod
+    async def update_status(
+        self,
+        bet_ids: list[int],
+        status: str,
+        expected: tuple[str, ...] | None = None,
+    ) -> list[int]:
+        """
+        Sets the status of the given bets.
+
+        Args:
+            - expected (tuple | None): if given, only bets currently in
+                one of these statuses are updated
+
+        Returns:
+            - the ids of the bets that were updated
+        """
+
+    @abstractmethod
+    async def add_payout(self, payout: Payout, bet_ids: list[int]) -> None:
+        """
+        Durably records the invoice the winnings of these bets are paid with,
+        before it is paid, so a later run pays the same invoice instead of a new one.
+        """
+
+    @abstractmethod
+    async def get_payouts(self, payment_hashes: list[str]) -> dict[str, Payout]:
+        """Returns the recorded payouts by payment hash, unknown ones are left out."""
+
+    async def close(self) -> None:
+        """Releases the store's resources."""
+
+
+class InMemoryBetStore(BetStore):
+    """A non-durable store for tests and local development."""
+
+    def __init__(self):
+        self._bets: dict[int, Bet] = {}
+        self._by_match: dict[str, list[int]] = {}
+        self._matches: dict[str, Match] = {}
+        self._totals: dict[str, dict[str, OutcomeTotals]] = {}
+        self._payouts: dict[str, Payout] = {}
+        self._next_id = 1
+
+    async def add(self, bet: Bet) -> Bet:
+        match = self._matches.get(bet.match_id)
+        if match is not None and match.status != MATCH_OPEN:
+            raise MatchClosed(bet.match_id)
+        bet = replace(bet, id=self._next_id)
+        self._next_id += 1
+
+        self._bets[bet.id] = bet
+        self._by_match.setdefault(bet.match_id, []).append(bet.id)
+        self._matches.setdefault(bet.match_id, Match(match_id=bet.match_id))
+        if bet.status != BET_PENDING:
+            self._totals.setdefault(bet.match_id, {}).setdefault(bet.outcome, OutcomeTotals()).add(bet)
+        return replace(bet)
+
+    async def get_match(self, match_id: str) -> Match | None:
+        match = self._matches.get(match_id)
+        return replace(match) if match else None
+
+    async def list_matches(self) -> list[Match]:
+        return [replace(match) for match in self._matches.values()]
+
+    async def outcome_totals(self, match_id: str) -> dict[str, OutcomeTotals]:
+        return {
+            outcome: replace(totals)
+            for outcome, totals in self._totals.get(match_id, {}).items()
+        }
+
+    async def stakes(self, match_id: str) -> tuple[list[int], list[str], list[int]]:
+        bets = [
+            self._bets[bet_id] for bet_id in self._by_match.get(match_id, [])
+            if self._bets[bet_id].status not in (BET_PENDING, BET_VOID)
+        ]
+        return [bet.id for bet in bets], [bet.outcome for bet in bets], [bet.amount for bet in bets]
+
+    async def settle_pending(self, bet_id: int, paid: bool) -> Bet | None:
+        bet = self._bets.get(bet_id)
+        if bet is None or bet.status != BET_PENDING:
+            return None
+        bet.status = BET_OPEN if paid else BET_VOID
+        if paid:
+            self._totals.setdefault(bet.match_id, {}).setdefault(bet.outcome, OutcomeTotals()).add(bet)
+        return replace(bet)
+
+    async def close_match(self, match_id: str, winner: str, settlement: str = "fixed") -> bool:
+        match = self._matches.get(match_id)
+        if match is None or match.status != MATCH_OPEN:
+            return False
+
+        match.status = MATCH_CLOSED
+        match.winner = winner
+        match.settlement = settlement
+        match.closed_at = datetime.now().isoformat()
+        for bet_id in self._by_match[match_id]:
+            bet = self._bets[bet_id]
+            if bet.status == BET_OPEN:
+                bet.status = BET_WON if bet.outcome == winner else BET_LOST
+        return True
+
+    async def query(
+        self,
+        match_id: str | None = None,
+        outcome: str | None = None,
+        wallet_inkey: str | None = None,
+        status: str | None = None,
+        after_id: int | None = None,
+        limit: int | None = None,
+    ) -> list[Bet]:
+        if match_id is not None:
+            candidates = self._by_match.get(match_id, [])
+        else:
+            candidates = self._bets.keys()
+
+        result = []
+        for bet_id in candidates:
+            bet = self._bets[bet_id]
+            if after_id is not None and bet.id <= after_id:
+                continue
+            if outcome is not None and bet.outcome != outcome:
+                continue
+            if wallet_inkey is not None and bet.wallet_inkey != wallet_inkey:
+                continue
+            if status is not None and bet.status != status:
+                continue
+            result.append(replace(bet))
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+    async def count(self, status: str | None = None) -> int:
+        if status is None:
+            return len(self._bets)
+        return sum(1 for bet in self._bets.values() if bet.status == status)
+
+    async def update_status(
+        self,
+        bet_ids: list[int],
+        status: str,
+        expected: tuple[str, ...] | None = None,
+    ) -> list[int]:
+        updated = []
+        for bet_id in bet_ids:
+            bet = self._bets.get(bet_id)
+            if bet is None or (expected is not None and bet.status not in expected):
+                continue
+            bet.status = status
+            updated.append(bet_id)
+        return updated
+
+    async def add_payout(self, payout: Payout, bet_ids: list[int]) -> None:
+        self._payouts[payout.payment_hash] = replace(payout)
+        for bet_id in bet_ids:
+            self._bets[bet_id].payout_hash = payout.payment_hash
+
+    async def get_payouts(self, payment_hashes: list[str]) -> dict[str, Payout]:
+        return {h: replace(self._payouts[h]) for h in payment_hashes if h in self._payouts}
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    match_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'open',
+    winner TEXT,
+    settlement TEXT,
+    closed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS bets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    match_id TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    wallet_inkey TEXT NOT NULL,
+    wallet_adminkey TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    odds REAL NOT NULL,
+    status TEXT NOT NULL,
+    transaction_id TEXT,
+    timestamp TEXT NOT NULL,
+    payout_hash TEXT
+);
+-- Index entries end with the rowid, so a filter plus "id > cursor ORDER BY id"
+-- is a range scan on any of these
+CREATE INDEX IF NOT EXISTS bets_match ON bets (match_id);
+CREATE INDEX IF NOT EXISTS bets_match_outcome ON bets (match_id, outcome);
+CREATE INDEX IF NOT EXISTS bets_outcome ON bets (outcome);
+CREATE INDEX IF NOT EXISTS bets_wallet ON bets (wallet_inkey);
+CREATE INDEX IF NOT EXISTS bets_status ON bets (status);
+CREATE TABLE IF NOT EXISTS payouts (
+    payment_hash TEXT PRIMARY KEY,
+    wallet_inkey TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    bolt11 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outcome_totals (
+    match_id TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    stake INTEGER NOT NULL,
+    bets INTEGER NOT NULL,
+    liability INTEGER NOT NULL,
+    PRIMARY KEY (match_id, outcome)
+);
+"""
+
+# Fills outcome_totals for bets recorded before the table existed
+_BACKFILL_TOTALS = """
+INSERT INTO outcome_totals (match_id, outcome, stake, bets, liability)
+SELECT match_id, outcome, SUM(amount), COUNT(*), SUM(CAST(amount * odds AS INTEGER))
+FROM bets WHERE status NOT IN ('pending', 'void') GROUP BY match_id, outcome
+"""
+
+_MATCH_COLUMNS = "match_id, status, winner, settlement, closed_at"
+
+_BET_COLUMNS = (
+    "id, match_id, outcome, wallet_inkey, wallet_adminkey, "
+    "amount, odds, status, transaction_id, timestamp, payout_hash"
+)
+
+
+class SQLiteBetStore(BetStore):
+    """
+    A durable store backed by an embedded SQLite database in WAL mode.
+
+    Every database call runs on one dedicated thread so the event loop
+    never blocks on disk I/O. Concurrent add() calls are group-committed:
+    bets arriving within `flush_interval` of each other (up to `batch_size`)
+    are inserted in a single transaction, and each add() returns only
+    once its bet is committed. Several processes may share one database
+    file; SQLite serializes their writes.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 0.002):
+        """
+        Args:
+            - path (str): the database file, created if missing
+            - batch_size (int): maximum number of bets per insert transaction
+            - flush_interval (float): seconds to wait for more bets before committing
+        """
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bet-store")
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        has_totals = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'outcome_totals'"
+        ).fetchone()
+        self._db.executescript(_SCHEMA)
+        if not has_totals:
+            self._db.execute(_BACKFILL_TOTALS)
+        # Matches closed before these columns existed keep NULL in them
+        match_columns = {row[1] for row in self._db.execute("PRAGMA table_info(matches)")}
+        for column in ("settlement", "closed_at"):
+            if column not in match_columns:
+                self._db.execute(f"ALTER TABLE matches ADD COLUMN {column} TEXT")
+        if "payout_hash" not in {row[1] for row in self._db.execute("PRAGMA table_info(bets)")}:
+            self._db.execute("ALTER TABLE bets ADD COLUMN payout_hash TEXT")
+
+        self._pending: list[tuple[Bet, asyncio.Future]] = []
+        self._flusher: asyncio.Task | None = None
+        self._batch_ready = asyncio.Event()
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def add(self, bet: Bet) -> Bet:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((bet, future))
+
+        if len(self._pending) >= self._batch_size:
+            self._batch_ready.set()
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_soon())
+        return await future
+
+    async def _flush_soon(self) -> None:
+        try:
+            if len(self._pending) < self._batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self._flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+            await self._flush()
+        finally:
+            self._flusher = None
+            # Bets that arrived while the last batch was being written
+            if self._pending:
+                self._flusher = asyncio.create_task(self._flush_soon())
+
+    async def _flush(self) -> None:
+        batch = self._pending[:self._batch_size]
+        del self._pending[:self._batch_size]
+        if not batch:
+            return
+
+        try:
+            ids = await self._run(self._insert_batch, [bet for bet, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (bet, future), bet_id in zip(batch, ids):
+            if future.done():
+                continue
+            if bet_id is None:
+                future.set_exception(MatchClosed(bet.match_id))
+            else:
+                future.set_result(replace(bet, id=bet_id))
+
+    def _insert_batch(self, bets: list[Bet]) -> list[int | None]:
+        """
+        Returns:
+            - the id of every bet, None for bets on a closed match
+        """
+        cursor = self._db.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            ids = []
+            for bet in bets:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO matches (match_id) VALUES (?)",
+                    (bet.match_id,)
+                )
+                # Checked in the insert's transaction, so a resolve by another
+                # process can't close the match in between
+                status = cursor.execute(
+                    "SELECT status FROM matches WHERE match_id = ?", (bet.match_id,)
+                ).fetchone()[0]
+                if status != MATCH_OPEN:
+                    ids.append(None)
+                    continue
+                cursor.execute(
+                    "INSERT INTO bets (match_id, outcome, wallet_inkey, wallet_adminkey, "
+                    "amount, odds, status, transaction_id, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        bet.match_id, bet.outcome, bet.wallet_inkey, bet.wallet_adminkey,
+                        bet.amount, bet.odds, bet.status, bet.transaction_id, bet.timestamp,
+                    )
+                )
+                ids.append(cursor.lastrowid)
+                if bet.status != BET_PENDING:
+                    self._add_totals(cursor, bet)
+            cursor.execute("COMMIT")
+            return ids
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    async def get_match(self, match_id: str) -> Match | None:
+        row = await self._run(self._fetchone, f"SELECT {_MATCH_COLUMNS} FROM matches WHERE match_id = ?", (match_id,))
+        return Match(*row) if row else None
+
+    async def list_matches(self) -> list[Match]:
+        rows = await self._run(self._fetchall, f"SELECT {_MATCH_COLUMNS} FROM matches", ())
+        return [Match(*row) for row in rows]
+
+    async def outcome_totals(self, match_id: str) -> dict[str, OutcomeTotals]:
+        rows = await self._run(
+            self._fetchall,
+            "SELECT outcome, stake, bets, liability FROM outcome_totals WHERE match_id = ?",
+            (match_id,)
+        )
+        return {outcome: OutcomeTotals(stake, bets, liability) for outcome, stake, bets, liability in rows}
+
+    async def stakes(self, match_id: str) -> tuple[list[int], list[str], list[int]]:
+        rows = await self._run(
+            self._fetchall,
+            "SELECT id, outcome, amount FROM bets WHERE match_id = ? AND status NOT IN (?, ?) ORDER BY id",
+            (match_id, BET_PENDING, BET_VOID)
+        )
+        if not rows:
+            return [], [], []
+        ids, outcomes, amounts = zip(*rows)
+        return list(ids), list(outcomes), list(amounts)
+
+    @staticmethod
+    def _add_totals(cursor, bet: Bet) -> None:
+        cursor.execute(
+            "INSERT INTO outcome_totals (match_id, outcome, stake, bets, liability) "
+            "VALUES (?, ?, ?, 1, ?) "
+            "ON CONFLICT (match_id, outcome) DO UPDATE SET "
+            "stake = stake + excluded.stake, bets = bets + 1, "
+            "liability = liability + excluded.liability",
+            (bet.match_id, bet.outcome, bet.amount, int(bet.amount * bet.odds))
+        )
+
+    async def settle_pending(self, bet_id: int, paid: bool) -> Bet | None:
+        return await self._run(self._settle_pending, bet_id, paid)
+
+    def _settle_pending(self, bet_id: int, paid: bool) -> Bet | None:
+        cursor = self._db.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                "UPDATE bets SET status = ? WHERE id = ? AND status = ?",
+                (BET_OPEN if paid else BET_VOID, bet_id, BET_PENDING)
+            )
+            bet = None
+            if cursor.rowcount == 1:
+                bet = self._to_bet(cursor.execute(f"SELECT {_BET_COLUMNS} FROM bets WHERE id = ?", (bet_id,)).fetchone())
+                if paid:
+                    self._add_totals(cursor, bet)
+            cursor.execute("COMMIT")
+            return bet
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    async def close_match(self, match_id: str, winner: str, settlement: str = "fixed") -> bool:
+        return await self._run(self._close_match, match_id, winner, settlement)
+
+    def _close_match(self, match_id: str, winner: str, settlement: str) -> bool:
+        cursor = self._db.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                "UPDATE matches SET status = ?, winner = ?, settlement = ?, closed_at = ? "
+                "WHERE match_id = ? AND status = ?",
+                (MATCH_CLOSED, winner, settlement, datetime.now().isoformat(), match_id, MATCH_OPEN)
+            )
+            closed = cursor.rowcount == 1
+            if closed:
+                cursor.execute(
+                    "UPDATE bets SET status = CASE WHEN outcome = ? THEN ? ELSE ? END "
+                    "WHERE match_id = ? AND status = ?",
+                    (winner, BET_WON, BET_LOST, match_id, BET_OPEN)
+                )
+            cursor.execute("COMMIT")
+            return closed
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    async def query(
+        self,
+        match_id: str | None = None,
+        outcome: str | None = None,
+        wallet_inkey: str | None = None,
+        status: str | None = None,
+        after_id: int | None = None,
+        limit: int | None = None,
+    ) -> list[Bet]:
+        clauses, params = [], []
+        for column, value in (
+            ("match_id", match_id),
+            ("outcome", outcome),
+            ("wallet_inkey", wallet_inkey),
+            ("status", status),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+
+        sql = f"SELECT {_BET_COLUMNS} FROM bets"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        rows = await self._run(self._fetchall, sql, tuple(params))
+        return [self._to_bet(row) for row in rows]
+
+    async def count(self, status: str | None = None) -> int:
+        if status is None:
+            row = await self._run(self._fetchone, "SELECT COUNT(*) FROM bets", ())
+        else:
+            row = await self._run(self._fetchone, "SELECT COUNT(*) FROM bets WHERE status = ?", (status,))
+        return row[0]
+
+    async def update_status(
+        self,
+        bet_ids: list[int],
+        status: str,
+        expected: tuple[str, ...] | None = None,
+    ) -> list[int]:
+        if not bet_ids:
+            return []
+        return await self._run(self._update_status, list(bet_ids), status, expected)
+
+    def _update_status(self, bet_ids: list[int], status: str, expected: tuple[str, ...] | None) -> list[int]:
+        cursor = self._db.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            updated = []
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(bet_ids), 500):
+                chunk = bet_ids[start:start + 500]
+                sql = f"UPDATE bets SET status = ? WHERE id IN ({','.join('?' * len(chunk))})"
+                params = [status, *chunk]
+                if expected is not None:
+                    sql += f" AND status IN ({','.join('?' * len(expected))})"
+                    params.extend(expected)
+                sql += " RETURNING id"
+                updated.extend(row[0] for row in cursor.execute(sql, params).fetchall())
+            cursor.execute("COMMIT")
+            return updated
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    async def add_payout(self, payout: Payout, bet_ids: list[int]) -> None:
+        await self._run(self._add_payout, payout, list(bet_ids))
+
+    def _add_payout(self, payout: Payout, bet_ids: list[int]) -> None:
+        cursor = self._db.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                "INSERT INTO payouts (payment_hash, wallet_inkey, amount, bolt11) VALUES (?, ?, ?, ?)",
+                (payout.payment_hash, payout.wallet_inkey, payout.amount, payout.bolt11)
+            )
+            for start in range(0, len(bet_ids), 500):
+                chunk = bet_ids[start:start + 500]
+                cursor.execute(
+                    f"UPDATE bets SET payout_hash = ? WHERE id IN ({','.join('?' * len(chunk))})",
+                    (payout.payment_hash, *chunk)
+                )
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    async def get_payouts(self, payment_hashes: list[str]) -> dict[str, Payout]:
+        payouts = {}
+        for start in range(0, len(payment_hashes), 500):
+            chunk = payment_hashes[start:start + 500]
+            rows = await self._run(
+                self._fetchall,
+                f"SELECT payment_hash, wallet_inkey, amount, bolt11 FROM payouts "
+                f"WHERE payment_hash IN ({','.join('?' * len(chunk))})",
+                tuple(chunk)
+            )
+            payouts.update((row[0], Payout(*row)) for row in rows)
+        return payouts
+
+    def _fetchone(self, sql: str, params: tuple):
+        return self._db.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple):
+        return self._db.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _to_bet(row) -> Bet:
+        (bet_id, match_id, outcome, wallet_inkey, wallet_adminkey,
+         amount, odds, status, transaction_id, timestamp, payout_hash) = row
+        return Bet(
+            id=bet_id,
+            match_id=match_id,
+            outcome=outcome,
+            wallet_inkey=wallet_inkey,
+            wallet_adminkey=wallet_adminkey,
+            amount=amount,
+            odds=odds,
+            status=status,
+            transaction_id=transaction_id,
+            timestamp=timestamp,
+            payout_hash=payout_hash,
+        )
+
+    async def close(self) -> None:
+        while self._pending or self._flusher is not None:
+            if self._flusher is not None:
+                await self._flusher
+            else:
+                await self._flush()
+        await self._run(self._db.close)
+        self._executor.shutdown(wait=True)
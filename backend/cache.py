@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _FetchCancelled(Exception):
+    """Set on a shared fetch whose caller was cancelled, its waiters fetch again."""
+
+
+class TTLCache:
+    """
+    A bounded, in-process cache for values fetched from upstream.
+
+    Entries expire after `ttl` seconds and the least recently used entry
+    is evicted once `maxsize` is reached. Concurrent lookups of a missing
+    key share one upstream fetch (single-flight) instead of each
+    issuing their own.
+    """
+
+    def __init__(self, ttl: float, maxsize: int, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            - ttl (float): seconds an entry stays fresh
+            - maxsize (int): maximum number of entries kept
+            - clock (callable): monotonic time source, overridable in tests
+        """
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        # Bumped on invalidation so fetches that started earlier don't store stale values
+        self._generations: dict[Hashable, int] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, key: Hashable) -> tuple[bool, Any]:
+        """
+        Looks a key up without fetching.
+
+        Returns:
+            - (True, value) for a fresh entry, (False, None) otherwise
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (self._clock() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drops a key, including any fetch for it that is still in flight."""
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+        if key in self._generations:
+            self._generations[key] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
+        self._generations.clear()
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached value for key, calling fetch() on a miss.
+
+        Exceptions raised by fetch() are propagated to every waiter
+        and are not cached. If the caller running the shared fetch is
+        cancelled, one of its waiters takes the fetch over.
+        """
+        hit, value = self.peek(key)
+        if hit:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                return await self._fetch(key, fetch)
+            try:
+                return await asyncio.shield(future)
+            except _FetchCancelled:
+                # The first waiter to get here starts a new fetch, the others wait for it
+                continue
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generations.setdefault(key, 0)
+
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            if not future.done():
+                future.set_exception(_FetchCancelled())
+                future.exception()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # Mark the exception as retrieved when nobody else is waiting
+                future.exception()
+            raise
+        else:
+            if not future.done():
+                future.set_result(value)
+            if self._generations.get(key) == generation:
+                self.set(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if key not in self._inflight:
+                self._generations.pop(key, None)
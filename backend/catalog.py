@@ -0,0 +1,350 @@
+"""
+The catalog of matches that can be bet on.
+
+Fixtures come from pluggable sources, a local JSON file or TheSportsDB,
+and are refreshed in the background. Upstream fetches are conditional
+(ETag or file modification time), so an unchanged source costs a 304 or
+a stat() and nothing is rebuilt. The catalog keeps fixtures indexed by
+id, league and start time and prerenders its JSON listings, so serving
+them and validating a bet's match are plain lookups.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import httpx
+
+from metrics import CATALOG_FETCHES, CATALOG_FIXTURES
+
+
+logger = logging.getLogger(__name__)
+
+# The outcome name of a draw, next to the two team names
+OUTCOME_DRAW = "Draw"
+
+
+@dataclass(frozen=True)
+class Fixture:
+    match_id: str
+    home_team: str
+    away_team: str
+    league: str
+    start_time: datetime
+    thumbnail: str | None = None
+
+    @property
+    def outcomes(self) -> tuple[str, str, str]:
+        """The selected_outcome values a bet on this match may use."""
+        return (self.home_team, self.away_team, OUTCOME_DRAW)
+
+    def to_dict(self) -> dict:
+        return {
+            "match_id": self.match_id,
+            "home_team": self.home_team,
+            "away_team": self.away_team,
+            "league": self.league,
+            "start_time": self.start_time.isoformat(),
+            "thumbnail": self.thumbnail,
+            "outcomes": list(self.outcomes),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Fixture":
+        return cls(
+            match_id=str(data["match_id"]),
+            home_team=data["home_team"],
+            away_team=data["away_team"],
+            league=data["league"],
+            start_time=_parse_time(data["start_time"]),
+            thumbnail=data.get("thumbnail"),
+        )
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Times without an offset are UTC
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+class FixtureSource(ABC):
+    """Where fixtures come from."""
+
+    name = "source"
+
+    @abstractmethod
+    async def fetch(self) -> list[Fixture] | None:
+        """
+        Returns:
+            - every fixture the source offers, or None if nothing changed
+                since the last successful fetch
+        """
+
+    async def close(self) -> None:
+        pass
+
+
+class FileFixtureSource(FixtureSource):
+    """
+    Fixtures from a JSON file holding a list of Fixture dicts, e.g. a stand-in
+    for a real provider in development. The file is only read again after
+    its modification time or size changed.
+    """
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self._path = path
+        self._stamp: tuple[int, int] | None = None
+
+    def _read(self) -> bytes:
+        with open(self._path, "rb") as f:
+            return f.read()
+
+    async def fetch(self) -> list[Fixture] | None:
+        stat = await asyncio.to_thread(os.stat, self._path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return None
+
+        data = json.loads(await asyncio.to_thread(self._read))
+        fixtures = [Fixture.from_dict(item) for item in data]
+        self._stamp = stamp
+        return fixtures
+
+
+class SportsDbFixtureSource(FixtureSource):
+    """
+    Fixtures from TheSportsDB: the next events of some leagues and/or
+    individual events by id. Each URL is fetched conditionally with the
+    ETag of its last response, and the URLs are fetched concurrently.
+    """
+
+    name = "sportsdb"
+
+    def __init__(
+        self,
+        base_url: str = "https://www.thesportsdb.com/api/v1/json/3",
+        league_ids: list[str] | None = None,
+        event_ids: list[str] | None = None,
+        concurrency: int = 4,
+        timeout: float = 10.0,
+    ):
+        """
+        Args:
+            - base_url (str): the API base including the key, e.g. .../json/3
+            - league_ids (list | None): leagues whose upcoming events are listed
+            - event_ids (list | None): single events to list
+            - concurrency (int): requests sent at the same time
+            - timeout (float): seconds per request
+        """
+        base_url = base_url.rstrip("/")
+        # Each URL is fetched once however often its id was given
+        self._urls = list(dict.fromkeys(
+            [f"{base_url}/eventsnextleague.php?id={league_id}" for league_id in league_ids or ()]
+            + [f"{base_url}/lookupevent.php?id={event_id}" for event_id in event_ids or ()]
+        ))
+        self._concurrency = concurrency
+        self._http = httpx.AsyncClient(timeout=timeout)
+        # Per URL: the ETag and fixtures of its last good response
+        self._etags: dict[str, str] = {}
+        self._fixtures: dict[str, list[Fixture]] = {}
+
+    async def fetch(self) -> list[Fixture] | None:
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def bounded(url: str) -> bool:
+            async with semaphore:
+                return await self._fetch_url(url)
+
+        changed = await asyncio.gather(*(bounded(url) for url in self._urls), return_exceptions=True)
+        for url, result in zip(self._urls, changed):
+            if isinstance(result, Exception):
+                logger.warning(
+                    "Error fetching fixtures: %s", result,
+                    extra={"event": "fixture_fetch_failed", "url": url}
+                )
+        if not any(result is True for result in changed):
+            return None
+        return [fixture for url in self._urls for fixture in self._fixtures.get(url, ())]
+
+    async def _fetch_url(self, url: str) -> bool:
+        """Returns whether the URL's fixtures changed."""
+        etag = self._etags.get(url)
+        headers = {"If-None-Match": etag} if etag else None
+        response = await self._http.get(url, headers=headers)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+
+        fixtures = []
+        for event in response.json().get("events") or ():
+            try:
+                fixtures.append(self._to_fixture(event))
+            except (KeyError, TypeError, ValueError):
+                # Events without teams or a date can't be bet on
+                continue
+
+        if "ETag" in response.headers:
+            self._etags[url] = response.headers["ETag"]
+        if fixtures == self._fixtures.get(url):
+            return False
+        self._fixtures[url] = fixtures
+        return True
+
+    @staticmethod
+    def _to_fixture(event: dict) -> Fixture:
+        start = event.get("strTimestamp") or f"{event['dateEvent']}T{event.get('strTime') or '00:00:00'}"
+        return Fixture(
+            match_id=str(event["idEvent"]),
+            home_team=event["strHomeTeam"],
+            away_team=event["strAwayTeam"],
+            league=event.get("strLeague") or "",
+            start_time=_parse_time(start),
+            thumbnail=event.get("strThumb") or None,
+        )
+
+    async def close(self) -> None:
+        await self._http.aclose()
+
+
+class MatchCatalog:
+    """
+    The fixtures of every source, merged by match id and indexed.
+
+    A refresh fetches all sources concurrently and keeps the last fixtures
+    of a source that failed or didn't change. The indexes and prerendered
+    listings are rebuilt only when the merged fixtures actually changed;
+    readers always see one complete version.
+    """
+
+    def __init__(self, sources: list[FixtureSource], refresh_interval: float = 300.0):
+        """
+        Args:
+            - sources (list): fixture sources, later ones win on duplicate match ids
+            - refresh_interval (float): seconds between background refreshes
+        """
+        self._sources = sources
+        self._refresh_interval = refresh_interval
+        self._task: asyncio.Task | None = None
+        self._fetched: dict[FixtureSource, list[Fixture]] = {}
+
+        self._by_id: dict[str, Fixture] = {}
+        self._by_league: dict[str, list[Fixture]] = {}
+        # Every fixture ordered by start time, and their start times for bisect
+        self._by_start: list[Fixture] = []
+        self._starts: list[datetime] = []
+        # league (None for all) -> (JSON body, ETag)
+        self._listings: dict[str | None, tuple[bytes, str]] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for source in self._sources:
+            await source.close()
+
+    def get(self, match_id: str) -> Fixture | None:
+        return self._by_id.get(match_id)
+
+    def league(self, league: str) -> list[Fixture]:
+        return self._by_league.get(league, [])
+
+    def upcoming(self, since: datetime, limit: int = 100) -> list[Fixture]:
+        """Fixtures starting at or after `since`, soonest first."""
+        start = bisect.bisect_left(self._starts, since)
+        return self._by_start[start:start + limit]
+
+    def listing(self, league: str | None = None) -> tuple[bytes, str] | None:
+        """
+        Returns:
+            - the prerendered JSON listing of all fixtures or of one league,
+                and its ETag, or None for an unknown league
+        """
+        return self._listings.get(league)
+
+    async def refresh(self) -> bool:
+        """
+        Fetches every source once.
+
+        Returns:
+            - whether the catalog changed
+        """
+        results = await asyncio.gather(*(source.fetch() for source in self._sources), return_exceptions=True)
+
+        changed = False
+        for source, result in zip(self._sources, results):
+            if isinstance(result, Exception):
+                CATALOG_FETCHES.inc(source=source.name, result="failed")
+                logger.warning(
+                    "Error refreshing fixtures: %s", result,
+                    extra={"event": "catalog_refresh_failed", "source": source.name}
+                )
+                continue
+            if result is None:
+                CATALOG_FETCHES.inc(source=source.name, result="unchanged")
+                continue
+            CATALOG_FETCHES.inc(source=source.name, result="changed")
+            if result != self._fetched.get(source):
+                self._fetched[source] = result
+                changed = True
+
+        if changed or (not self.loaded and self._fetched):
+            self._rebuild()
+        self.loaded = self.loaded or bool(self._fetched)
+        return changed
+
+    def _rebuild(self) -> None:
+        by_id: dict[str, Fixture] = {}
+        for source in self._sources:
+            for fixture in self._fetched.get(source, ()):
+                by_id[fixture.match_id] = fixture
+
+        by_start = sorted(by_id.values(), key=lambda fixture: (fixture.start_time, fixture.match_id))
+        by_league: dict[str, list[Fixture]] = {}
+        for fixture in by_start:
+            by_league.setdefault(fixture.league, []).append(fixture)
+
+        listings = {None: _render(by_start)}
+        for league, fixtures in by_league.items():
+            listings[league] = _render(fixtures)
+
+        # Swapped in together, between two awaits nobody sees a half-built catalog
+        self._by_id = by_id
+        self._by_start = by_start
+        self._starts = [fixture.start_time for fixture in by_start]
+        self._by_league = by_league
+        self._listings = listings
+        CATALOG_FIXTURES.set(len(by_id))
+        logger.info("Match catalog rebuilt", extra={"event": "catalog_rebuilt", "fixtures": len(by_id)})
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Error refreshing match catalog", extra={"event": "catalog_refresh_failed"})
+
+
+def _render(fixtures: list[Fixture]) -> tuple[bytes, str]:
+    body = json.dumps({"matches": [fixture.to_dict() for fixture in fixtures]}).encode()
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
@@ -0,0 +1,339 @@
+"""
+A local stand-in for an LNbits instance, for development and benchmarks.
+
+It implements the endpoints used by backend/service.py and src/service.py
+and keeps real balance accounting between its wallets. Latency and
+failures can be injected to see how the backend behaves against a slow
+or flaky node.
+
+    python fake_lnbits.py --port 5000 --latency 0.02 --error-rate 0.01 \\
+        --seed-wallet 13ce6601e9974aa989c579236616c1c4:9fe85e1cacb0438ba8456a8ff9107e2f:1000000
+
+Point the backend at it with LNBITS_URL=http://127.0.0.1:5000.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+import httpx
+import uvicorn
+
+
+@dataclass
+class FakeWallet:
+    id: str
+    user: str
+    name: str
+    adminkey: str
+    inkey: str
+    balance_msat: int = 0
+
+    def to_dict(self) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            "id": self.id,
+            "user": self.user,
+            "name": self.name,
+            "adminkey": self.adminkey,
+            "inkey": self.inkey,
+            "deleted": False,
+            "currency": "sat",
+            "balance_msat": self.balance_msat,
+            "created_at": now,
+            "updated_at": now,
+            "extra": {},
+        }
+
+
+@dataclass
+class FakePayment:
+    payment_hash: str
+    bolt11: str
+    wallet_id: str
+    amount_msat: int
+    memo: str
+    expiry: datetime
+    created_at: datetime
+    webhook: str | None = None
+    paid: bool = False
+    # Paid by a wallet but not settled yet
+    in_flight: bool = False
+    preimage: str = ""
+
+    def to_dict(self) -> dict:
+        return {
+            "checking_id": self.payment_hash,
+            "payment_hash": self.payment_hash,
+            "wallet_id": self.wallet_id,
+            "amount": self.amount_msat,
+            "fee": 0,
+            "bolt11": self.bolt11,
+            "payment_request": self.bolt11,
+            "status": "success" if self.paid else "pending",
+            "memo": self.memo,
+            "expiry": self.expiry.isoformat(),
+            "webhook": self.webhook or "",
+            "webhook_status": 0,
+            "preimage": self.preimage,
+            "tag": "",
+            "extension": "",
+            "time": self.created_at.isoformat(),
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.created_at.isoformat(),
+            "extra": {},
+        }
+
+
+class FakeLNbits:
+    """In-memory wallets and payments. Every operation is atomic on the event loop."""
+
+    def __init__(self):
+        self.wallets: dict[str, FakeWallet] = {}
+        # key -> (wallet, is_admin)
+        self.keys: dict[str, tuple[FakeWallet, bool]] = {}
+        self.payments: dict[str, FakePayment] = {}
+        self.invoices: dict[str, FakePayment] = {}
+
+    def add_wallet(
+        self,
+        name: str,
+        user: str | None = None,
+        inkey: str | None = None,
+        adminkey: str | None = None,
+        balance_msat: int = 0,
+    ) -> FakeWallet:
+        wallet = FakeWallet(
+            id=uuid.uuid4().hex,
+            user=user or uuid.uuid4().hex,
+            name=name,
+            adminkey=adminkey or uuid.uuid4().hex,
+            inkey=inkey or uuid.uuid4().hex,
+            balance_msat=balance_msat,
+        )
+        self.wallets[wallet.id] = wallet
+        self.keys[wallet.adminkey] = (wallet, True)
+        self.keys[wallet.inkey] = (wallet, False)
+        return wallet
+
+    def create_invoice(self, wallet: FakeWallet, amount_sats: int, memo: str, webhook: str | None) -> FakePayment:
+        preimage = uuid.uuid4().hex
+        payment_hash = hashlib.sha256(preimage.encode()).hexdigest()
+        now = datetime.now(timezone.utc)
+        invoice = FakePayment(
+            payment_hash=payment_hash,
+            bolt11=f"lnbcrt{amount_sats}n1fake{payment_hash}",
+            wallet_id=wallet.id,
+            amount_msat=amount_sats * 1000,
+            memo=memo,
+            expiry=now + timedelta(hours=1),
+            created_at=now,
+            webhook=webhook,
+            preimage=preimage,
+        )
+        self.invoices[invoice.bolt11] = invoice
+        self.payments[payment_hash] = invoice
+        return invoice
+
+    def pay_invoice(self, payer: FakeWallet, bolt11: str, settle: bool = True) -> FakePayment:
+        """Debits the payer, and credits the receiver too unless settle is False."""
+        invoice = self.invoices.get(bolt11)
+        if invoice is None:
+            raise LookupError("Invoice not found")
+        if invoice.paid or invoice.in_flight:
+            raise ValueError("Invoice already paid")
+        if payer.balance_msat < invoice.amount_msat:
+            raise ValueError("Insufficient balance")
+
+        payer.balance_msat -= invoice.amount_msat
+        invoice.in_flight = True
+        if settle:
+            self.settle(invoice)
+        return invoice
+
+    def settle(self, invoice: FakePayment) -> None:
+        self.wallets[invoice.wallet_id].balance_msat += invoice.amount_msat
+        invoice.in_flight = False
+        invoice.paid = True
+
+
+def create_app(
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    seed: int | None = None,
+    seed_wallets: list[tuple[str, str, int]] = (),
+    settle_delay: float = 0.0,
+    webhook_loss: float = 0.0,
+) -> FastAPI:
+    """
+    Builds the fake LNbits application.
+
+    Args:
+        - latency (float): seconds added to every request
+        - jitter (float): up to this many extra random seconds per request
+        - error_rate (float): probability of answering a request with a 500
+        - seed (int | None): seed for the latency and error randomness
+        - seed_wallets (list): (inkey, adminkey, balance_sats) wallets to create up front
+        - settle_delay (float): seconds a paid invoice stays pending before it settles
+        - webhook_loss (float): probability of not calling an invoice's webhook
+    """
+    app = FastAPI()
+    node = FakeLNbits()
+    rng = random.Random(seed)
+    app.state.node = node
+    background: set[asyncio.Task] = set()
+
+    def spawn(coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        background.add(task)
+        task.add_done_callback(background.discard)
+
+    async def call_webhook(invoice: FakePayment) -> None:
+        if not invoice.webhook or rng.random() < webhook_loss:
+            return
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as http:
+                await http.post(invoice.webhook, json=invoice.to_dict())
+        except httpx.HTTPError:
+            pass
+
+    async def settle_later(invoice: FakePayment) -> None:
+        await asyncio.sleep(settle_delay)
+        node.settle(invoice)
+        await call_webhook(invoice)
+
+    for inkey, adminkey, balance_sats in seed_wallets:
+        node.add_wallet("seed", inkey=inkey, adminkey=adminkey, balance_msat=balance_sats * 1000)
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        delay = latency + (rng.random() * jitter if jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if error_rate and rng.random() < error_rate:
+            return JSONResponse({"detail": "Injected failure"}, status_code=500)
+        return await call_next(request)
+
+    def lookup(key: str | None, admin: bool = False):
+        found = node.keys.get(key or "")
+        if found is None:
+            return None, JSONResponse({"detail": "Wallet not found."}, status_code=404)
+        wallet, is_admin = found
+        if admin and not is_admin:
+            return None, JSONResponse({"detail": "Invalid adminkey."}, status_code=401)
+        return wallet, None
+
+    @app.post("/api/v1/account")
+    async def create_account(body: dict):
+        wallet = node.add_wallet(body.get("name", ""))
+        return wallet.to_dict()
+
+    @app.post("/api/v1/wallet")
+    async def create_wallet(body: dict, x_api_key: str | None = Header(None)):
+        account, error = lookup(x_api_key, admin=True)
+        if error:
+            return error
+        return node.add_wallet(body.get("name", ""), user=account.user).to_dict()
+
+    @app.get("/api/v1/wallet")
+    async def get_wallet(x_api_key: str | None = Header(None)):
+        wallet, error = lookup(x_api_key)
+        if error:
+            return error
+        return {"id": wallet.id, "name": wallet.name, "balance": wallet.balance_msat}
+
+    @app.patch("/api/v1/wallet")
+    async def rename_wallet(body: dict, x_api_key: str | None = Header(None)):
+        wallet, error = lookup(x_api_key, admin=True)
+        if error:
+            return error
+        wallet.name = body.get("name", wallet.name)
+        return wallet.to_dict()
+
+    @app.post("/api/v1/payments")
+    async def payments(body: dict, x_api_key: str | None = Header(None)):
+        if not body.get("out"):
+            wallet, error = lookup(x_api_key)
+            if error:
+                return error
+            invoice = node.create_invoice(
+                wallet, int(body.get("amount", 0)), body.get("memo", ""), body.get("webhook")
+            )
+            return JSONResponse(invoice.to_dict(), status_code=201)
+
+        wallet, error = lookup(x_api_key, admin=True)
+        if error:
+            return error
+        try:
+            invoice = node.pay_invoice(wallet, body.get("bolt11", ""), settle=not settle_delay)
+        except LookupError as e:
+            return JSONResponse({"detail": str(e)}, status_code=404)
+        except ValueError as e:
+            return JSONResponse({"detail": str(e)}, status_code=520)
+        spawn(settle_later(invoice) if settle_delay else call_webhook(invoice))
+        return invoice.to_dict()
+
+    @app.get("/api/v1/payments")
+    async def list_payments(limit: int = 100, x_api_key: str | None = Header(None)):
+        wallet, error = lookup(x_api_key)
+        if error:
+            return error
+        own = [p for p in node.payments.values() if p.wallet_id == wallet.id]
+        # Newest first, like LNbits
+        return [p.to_dict() for p in reversed(own[-limit:])]
+
+    @app.get("/api/v1/payments/{payment_hash}")
+    async def check_payment(payment_hash: str, x_api_key: str | None = Header(None)):
+        wallet, error = lookup(x_api_key)
+        if error:
+            return error
+        payment = node.payments.get(payment_hash)
+        if payment is None or payment.wallet_id != wallet.id:
+            return JSONResponse({"detail": "Payment does not exist."}, status_code=404)
+        return {"paid": payment.paid, "status": payment.to_dict()["status"], "details": payment.to_dict()}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a fake LNbits instance")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 500")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latency and error randomness")
+    parser.add_argument("--settle-delay", type=float, default=0.0, help="seconds paid invoices stay pending")
+    parser.add_argument("--webhook-loss", type=float, default=0.0, help="share of invoice webhooks not sent")
+    parser.add_argument(
+        "--seed-wallet", action="append", default=[], metavar="INKEY:ADMINKEY:SATS",
+        help="create a wallet with these keys and balance, can be repeated"
+    )
+    args = parser.parse_args()
+
+    seed_wallets = []
+    for spec in args.seed_wallet:
+        inkey, adminkey, sats = spec.split(":")
+        seed_wallets.append((inkey, adminkey, int(sats)))
+
+    app = create_app(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        seed_wallets=seed_wallets,
+        settle_delay=args.settle_delay,
+        webhook_loss=args.webhook_loss,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
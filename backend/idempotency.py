@@ -0,0 +1,80 @@
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from cache import TTLCache
+
+
+T = TypeVar("T")
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused for a different request."""
+
+
+class _NotStored(Exception):
+    """Carries a response that ran to completion but must not be replayed."""
+
+    def __init__(self, fingerprint: str, response):
+        super().__init__("response not stored")
+        self.fingerprint = fingerprint
+        self.response = response
+
+
+class IdempotencyStore:
+    """
+    Remembers the responses of mutating requests by their idempotency key.
+
+    A request repeated with the same key gets the stored response instead
+    of running again. A repeat that arrives while the first request is still
+    running waits for it and shares its response. Keys expire after `ttl`
+    seconds and the least recently used ones are evicted beyond `maxsize`.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        """
+        Args:
+            - ttl (float): seconds a response is replayed for
+            - maxsize (int): maximum number of responses kept
+        """
+        self._responses = TTLCache(ttl=ttl, maxsize=maxsize)
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    async def run(
+        self,
+        key: Hashable | None,
+        fingerprint: str,
+        handle: Callable[[], Awaitable[T]],
+        store: Callable[[T], bool] = lambda response: True,
+    ) -> T:
+        """
+        Runs handle() once per key and returns its response.
+
+        Args:
+            - key (Hashable | None): the idempotency key, None runs handle() unconditionally
+            - fingerprint (str): identifies the request body the key was first used with
+            - handle (callable): async function producing the response
+            - store (callable): decides whether a response is replayed to later
+                repeats; responses it rejects are only shared with repeats that
+                were already waiting
+
+        Raises:
+            - IdempotencyConflict if the key was used with a different fingerprint
+        """
+        if key is None:
+            return await handle()
+
+        async def execute():
+            response = await handle()
+            if not store(response):
+                raise _NotStored(fingerprint, response)
+            return fingerprint, response
+
+        try:
+            stored_fingerprint, response = await self._responses.get_or_fetch(key, execute)
+        except _NotStored as not_stored:
+            stored_fingerprint, response = not_stored.fingerprint, not_stored.response
+
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict("Idempotency key was already used for a different request")
+        return response
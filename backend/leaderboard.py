@@ -0,0 +1,184 @@
+"""
+Leaderboard standings kept up to date bet by bet.
+
+Every window (the current UTC day, the current ISO week and all time)
+is a board holding each player's totals and a sorted index of players by
+profit. Recording a bet or a result touches one entry per window and
+moves it in the index, so updates, "my rank" and top-K pages all cost
+O(log n) in the number of players, however many bets they placed.
+"""
+
+import time
+from dataclasses import dataclass
+from sortedcontainers import SortedList
+
+
+WINDOW_DAY = "daily"
+WINDOW_WEEK = "weekly"
+WINDOW_ALL = "all"
+WINDOWS = (WINDOW_DAY, WINDOW_WEEK, WINDOW_ALL)
+
+
+@dataclass(slots=True)
+class Standing:
+    # Payouts received minus stakes of resolved bets
+    profit: int = 0
+    # Sats staked, counted when the bet is placed
+    volume: int = 0
+    bets: int = 0
+    # Resolved bets, and those among them that paid more than their stake
+    settled: int = 0
+    wins: int = 0
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.settled if self.settled else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "profit": self.profit,
+            "volume": self.volume,
+            "bets": self.bets,
+            "settled": self.settled,
+            "wins": self.wins,
+            "win_rate": round(self.win_rate, 4),
+        }
+
+
+class _Board:
+    """One window's standings, ordered by profit, highest first."""
+
+    def __init__(self):
+        self.standings: dict[str, Standing] = {}
+        # (-profit, player), so the best player comes first and ties go by player
+        self.order = SortedList()
+
+    def update(self, player: str, profit: int = 0, volume: int = 0, bets: int = 0, settled: int = 0, wins: int = 0):
+        standing = self.standings.get(player)
+        if standing is None:
+            standing = self.standings[player] = Standing()
+            self.order.add((0, player))
+        if profit:
+            self.order.remove((-standing.profit, player))
+            standing.profit += profit
+            self.order.add((-standing.profit, player))
+        standing.volume += volume
+        standing.bets += bets
+        standing.settled += settled
+        standing.wins += wins
+
+    def rank(self, player: str) -> int | None:
+        """1 + the number of players with a strictly higher profit."""
+        standing = self.standings.get(player)
+        if standing is None:
+            return None
+        # (-profit,) sorts before every (-profit, player) entry
+        return self.order.bisect_left((-standing.profit,)) + 1
+
+    def page(self, limit: int, offset: int) -> list[tuple[int, str, Standing]]:
+        entries = []
+        for key, player in self.order.islice(offset, offset + limit):
+            entries.append((self.rank(player), player, self.standings[player]))
+        return entries
+
+
+class Leaderboard:
+    """
+    Daily, weekly and all-time standings of players.
+
+    Events are bucketed by their UTC time: an event counts towards the day
+    and week it happened in, and only buckets of the current day and week
+    are kept. Events from an earlier bucket, e.g. replayed at startup, only
+    count towards the all-time board.
+    """
+
+    def __init__(self, clock=time.time):
+        """
+        Args:
+            - clock (callable): epoch time source, overridable in tests
+        """
+        self._clock = clock
+        self._all = _Board()
+        # Window -> (bucket key, board), only the latest bucket of each window is kept
+        self._buckets: dict[str, tuple[int, _Board]] = {}
+
+    def __len__(self) -> int:
+        """Number of players with at least one bet."""
+        return len(self._all.standings)
+
+    def record_bet(self, player: str, amount: int, at: float | None = None) -> None:
+        """Counts a placed bet's stake towards the player's volume."""
+        self._update(player, at, volume=amount, bets=1)
+
+    def record_result(self, player: str, stake: int, payout: int, at: float | None = None) -> None:
+        """
+        Counts a resolved bet.
+
+        Args:
+            - player (str): who placed the bet
+            - stake (int): the bet's amount
+            - payout (int): what the bet pays, 0 if it lost
+            - at (float | None): epoch time of the resolution, now by default
+        """
+        self._update(player, at, profit=payout - stake, settled=1, wins=int(payout > stake))
+
+    def top(self, window: str = WINDOW_ALL, limit: int = 10, offset: int = 0) -> list[tuple[int, str, Standing]]:
+        """
+        Returns:
+            - (rank, player, standing) of up to `limit` players from position `offset`
+        """
+        board = self._board(window)
+        return board.page(limit, offset) if board is not None else []
+
+    def standing(self, player: str, window: str = WINDOW_ALL) -> tuple[int, Standing] | None:
+        """
+        Returns:
+            - the player's rank and standing in the window, or None without bets in it
+        """
+        board = self._board(window)
+        if board is None or player not in board.standings:
+            return None
+        return board.rank(player), board.standings[player]
+
+    def players(self, window: str = WINDOW_ALL) -> int:
+        board = self._board(window)
+        return len(board.standings) if board is not None else 0
+
+    def _update(self, player: str, at: float | None, **changes) -> None:
+        now = self._clock()
+        day = _day(now if at is None else at)
+        today = _day(now)
+        self._all.update(player, **changes)
+        for window, key, current_key in (
+            (WINDOW_DAY, day, today),
+            (WINDOW_WEEK, _week(day), _week(today)),
+        ):
+            if key < current_key:
+                continue
+            current = self._buckets.get(window)
+            if current is None or current[0] != key:
+                current = self._buckets[window] = (key, _Board())
+            current[1].update(player, **changes)
+
+    def _board(self, window: str) -> _Board | None:
+        if window == WINDOW_ALL:
+            return self._all
+        if window not in (WINDOW_DAY, WINDOW_WEEK):
+            raise ValueError(f"Unknown leaderboard window: {window}")
+        current = self._buckets.get(window)
+        # Nothing happened yet in the current day or week
+        today = _day(self._clock())
+        if current is None or current[0] != (today if window == WINDOW_DAY else _week(today)):
+            return None
+        return current[1]
+
+
+def _day(at: float) -> int:
+    """The number of the UTC day `at` falls in."""
+    return int(at // 86400)
+
+
+def _week(day: int) -> int:
+    """The number of the ISO week (Monday to Sunday) a day falls in."""
+    # 1970-01-01 was a Thursday, so weeks start 3 days before day 0
+    return (day + 3) // 7
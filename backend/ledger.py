@@ -0,0 +1,567 @@
+"""
+Custodial balances: sats users deposited with the house and bet from
+without a Lightning payment per bet.
+
+Deposits and withdrawals are real LNbits payments; bets and winnings are
+only ledger entries. LedgerSettler pays balances back out to the users'
+own wallets, on demand or for wallets that have been idle for a while.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+from metrics import LEDGER_ENTRIES
+from payouts import PayoutEngine, PayoutOrder, PayoutReport, PayoutResult
+
+
+logger = logging.getLogger(__name__)
+
+# Ledger entry kinds
+ENTRY_DEPOSIT = "deposit"
+ENTRY_WITHDRAWAL = "withdrawal"
+ENTRY_BET = "bet"
+ENTRY_WINNINGS = "winnings"
+# Gives back a withdrawal whose payment failed, or a bet that wasn't recorded
+ENTRY_REVERSAL = "reversal"
+# Kinds that take sats off a balance, every other kind adds them
+DEBIT_ENTRIES = (ENTRY_WITHDRAWAL, ENTRY_BET)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger_accounts (
+    wallet_inkey TEXT PRIMARY KEY,
+    key_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ledger_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    wallet_inkey TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    ref TEXT UNIQUE,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ledger_entries_wallet ON ledger_entries (wallet_inkey);
+-- Withdrawals not known to be paid or failed yet, written with their entry
+CREATE TABLE IF NOT EXISTS ledger_withdrawals (
+    entry_id INTEGER PRIMARY KEY,
+    wallet_inkey TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    bolt11 TEXT,
+    payment_hash TEXT
+);
+-- Deposits whose payment hadn't settled when they were made
+CREATE TABLE IF NOT EXISTS ledger_pending_deposits (
+    payment_hash TEXT PRIMARY KEY,
+    wallet_inkey TEXT NOT NULL,
+    key_hash TEXT NOT NULL,
+    amount INTEGER NOT NULL
+);
+"""
+
+
+class InsufficientFunds(Exception):
+    """Raised when a debit would take a balance below zero."""
+
+
+@dataclass
+class LedgerEntry:
+    wallet_inkey: str
+    # Positive credits the wallet, negative debits it
+    amount: int
+    kind: str
+    # Entries with the same ref are only posted once
+    ref: str | None = None
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    # Assigned by the ledger, increases with posting order
+    id: int | None = None
+
+
+@dataclass
+class Withdrawal:
+    entry_id: int
+    wallet_inkey: str
+    # Sats to pay, positive
+    amount: int
+    # The invoice paying it out, recorded before it is paid
+    bolt11: str | None = None
+    payment_hash: str | None = None
+
+
+@dataclass
+class PendingDeposit:
+    payment_hash: str
+    wallet_inkey: str
+    # Hash of the adminkey that paid, the account is bound to it once credited
+    key_hash: str
+    amount: int
+
+
+def _key_hash(wallet_adminkey: str) -> str:
+    return hashlib.sha256(wallet_adminkey.encode()).hexdigest()
+
+
+class Ledger:
+    """
+    Per-wallet balances held by the house, journaled in SQLite.
+
+    Balances are kept in memory, so post() checks and applies a movement
+    before its first await: concurrent debits can never overdraw a wallet
+    and placing a bet needs no I/O besides the journal write. Entries are
+    group-committed like SQLiteBetStore's bets and post() returns once its
+    entry is durable; an entry whose commit fails is undone.
+
+    The in-memory balances belong to one process, so internal balances
+    need a single worker.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 500,
+        flush_interval: float = 0.002,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            - path (str): the database file, created if missing
+            - batch_size (int): maximum number of entries per insert transaction
+            - flush_interval (float): seconds to wait for more entries before committing
+            - clock (callable): monotonic time source for idleness, overridable in tests
+        """
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ledger")
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+
+        self._balances: dict[str, int] = dict(self._db.execute(
+            "SELECT wallet_inkey, SUM(amount) FROM ledger_entries GROUP BY wallet_inkey"
+        ).fetchall())
+        self._key_hashes: dict[str, str] = dict(self._db.execute(
+            "SELECT wallet_inkey, key_hash FROM ledger_accounts"
+        ).fetchall())
+        self._refs: set[str] = {
+            ref for (ref,) in self._db.execute("SELECT ref FROM ledger_entries WHERE ref IS NOT NULL")
+        }
+        # Last movement per wallet, balances loaded at startup count as fresh
+        now = clock()
+        self._last_activity: dict[str, float] = {wallet_inkey: now for wallet_inkey in self._balances}
+
+        self._pending: list[tuple[LedgerEntry, asyncio.Future]] = []
+        self._flusher: asyncio.Task | None = None
+        self._batch_ready = asyncio.Event()
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def balance(self, wallet_inkey: str) -> int:
+        return self._balances.get(wallet_inkey, 0)
+
+    def total(self) -> int:
+        """Sats held for all users together."""
+        return sum(self._balances.values())
+
+    def has_account(self, wallet_inkey: str) -> bool:
+        return wallet_inkey in self._key_hashes
+
+    def authorize(self, wallet_inkey: str, wallet_adminkey: str) -> bool:
+        """Checks the adminkey against the one the account was opened with."""
+        key_hash = self._key_hashes.get(wallet_inkey)
+        return key_hash is not None and hmac.compare_digest(key_hash, _key_hash(wallet_adminkey))
+
+    async def open_account(self, wallet_inkey: str, wallet_adminkey: str) -> bool:
+        """
+        Binds a wallet's ledger account to the adminkey that funds it.
+        Only the hash of the key is stored.
+
+        Returns:
+            - False if the account is already bound to another adminkey
+        """
+        return await self._bind(wallet_inkey, _key_hash(wallet_adminkey))
+
+    async def _bind(self, wallet_inkey: str, key_hash: str) -> bool:
+        known = self._key_hashes.setdefault(wallet_inkey, key_hash)
+        if not hmac.compare_digest(known, key_hash):
+            return False
+        await self._run(
+            self._db.execute,
+            "INSERT OR IGNORE INTO ledger_accounts (wallet_inkey, key_hash) VALUES (?, ?)",
+            (wallet_inkey, key_hash)
+        )
+        return True
+
+    async def add_pending_deposit(self, payment_hash: str, wallet_inkey: str, wallet_adminkey: str, amount: int) -> None:
+        """Durably remembers a deposit until settle_deposit() credits or drops it."""
+        await self._run(
+            self._db.execute,
+            "INSERT OR IGNORE INTO ledger_pending_deposits (payment_hash, wallet_inkey, key_hash, amount) "
+            "VALUES (?, ?, ?, ?)",
+            (payment_hash, wallet_inkey, _key_hash(wallet_adminkey), amount)
+        )
+
+    async def pending_deposits(self) -> list[PendingDeposit]:
+        rows = await self._run(
+            lambda: self._db.execute(
+                "SELECT payment_hash, wallet_inkey, key_hash, amount FROM ledger_pending_deposits"
+            ).fetchall()
+        )
+        return [PendingDeposit(*row) for row in rows]
+
+    async def settle_deposit(self, payment_hash: str, paid: bool) -> LedgerEntry | None:
+        """
+        Credits a pending deposit whose payment settled, binding the account
+        to the key that paid if it has none yet, or drops it if the payment failed.
+
+        Returns:
+            - the deposit entry, or None if nothing was credited
+        """
+        row = await self._run(
+            lambda: self._db.execute(
+                "SELECT payment_hash, wallet_inkey, key_hash, amount FROM ledger_pending_deposits "
+                "WHERE payment_hash = ?", (payment_hash,)
+            ).fetchone()
+        )
+        if row is None:
+            return None
+        deposit = PendingDeposit(*row)
+
+        entry = None
+        if paid:
+            if not await self._bind(deposit.wallet_inkey, deposit.key_hash):
+                logger.warning("Deposit raced another first deposit", extra={"event": "deposit_key_mismatch"})
+            # Keyed by the payment like immediate deposits, so it is never credited twice
+            entry = await self.post(deposit.wallet_inkey, deposit.amount, ENTRY_DEPOSIT, ref=f"deposit:{payment_hash}")
+        await self._run(
+            self._db.execute, "DELETE FROM ledger_pending_deposits WHERE payment_hash = ?", (payment_hash,)
+        )
+        return entry
+
+    async def open_withdrawals(self) -> list[Withdrawal]:
+        """Withdrawals debited but not yet known to be paid or failed."""
+        rows = await self._run(
+            lambda: self._db.execute(
+                "SELECT entry_id, wallet_inkey, amount, bolt11, payment_hash FROM ledger_withdrawals "
+                "ORDER BY entry_id"
+            ).fetchall()
+        )
+        return [Withdrawal(*row) for row in rows]
+
+    async def set_withdrawal_invoice(self, entry_id: int, bolt11: str, payment_hash: str) -> None:
+        await self._run(
+            self._db.execute,
+            "UPDATE ledger_withdrawals SET bolt11 = ?, payment_hash = ? WHERE entry_id = ?",
+            (bolt11, payment_hash, entry_id)
+        )
+
+    async def settle_withdrawal(self, entry_id: int, paid: bool) -> LedgerEntry | None:
+        """
+        Closes an open withdrawal, giving its amount back if it wasn't paid.
+
+        Returns:
+            - the reversal entry, or None if nothing was given back
+        """
+        row = await self._run(
+            lambda: self._db.execute(
+                "SELECT wallet_inkey, amount FROM ledger_withdrawals WHERE entry_id = ?", (entry_id,)
+            ).fetchone()
+        )
+        if row is None:
+            return None
+
+        entry = None
+        if not paid:
+            wallet_inkey, amount = row
+            entry = await self.post(wallet_inkey, amount, ENTRY_REVERSAL, ref=f"reversal:{entry_id}")
+        await self._run(self._db.execute, "DELETE FROM ledger_withdrawals WHERE entry_id = ?", (entry_id,))
+        return entry
+
+    def idle(self, seconds: float) -> list[tuple[str, int]]:
+        """
+        Returns:
+            - (wallet inkey, balance) of every wallet with a positive balance
+                and no movement in the last `seconds`
+        """
+        cutoff = self._clock() - seconds
+        return [
+            (wallet_inkey, balance)
+            for wallet_inkey, balance in self._balances.items()
+            if balance > 0 and self._last_activity.get(wallet_inkey, cutoff) <= cutoff
+        ]
+
+    async def post(self, wallet_inkey: str, amount: int, kind: str, ref: str | None = None) -> LedgerEntry | None:
+        """
+        Credits or debits a wallet.
+
+        Args:
+            - wallet_inkey (str): the wallet whose balance moves
+            - amount (int): sats, positive to credit and negative to debit
+            - kind (str): one of the ENTRY_* kinds
+            - ref (str | None): makes the entry idempotent, e.g. "bet:42"
+
+        Returns:
+            - the committed entry, or None if an entry with this ref was already posted
+
+        Raises:
+            - ValueError if the amount's sign doesn't match the kind
+            - InsufficientFunds if the debit exceeds the wallet's balance
+        """
+        # A negative bet or withdrawal would mint sats
+        if (amount >= 0) if kind in DEBIT_ENTRIES else (amount <= 0):
+            raise ValueError(f"Invalid amount {amount} for a {kind} entry")
+        if ref is not None and ref in self._refs:
+            return None
+        balance = self._balances.get(wallet_inkey, 0)
+        if balance + amount < 0:
+            raise InsufficientFunds(f"Balance of {balance} sats is too low for {-amount} sats")
+
+        self._balances[wallet_inkey] = balance + amount
+        self._last_activity[wallet_inkey] = self._clock()
+        if ref is not None:
+            self._refs.add(ref)
+
+        entry = LedgerEntry(wallet_inkey=wallet_inkey, amount=amount, kind=kind, ref=ref)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((entry, future))
+
+        if len(self._pending) >= self._batch_size:
+            self._batch_ready.set()
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_soon())
+        return await future
+
+    async def _flush_soon(self) -> None:
+        try:
+            if len(self._pending) < self._batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self._flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+            await self._flush()
+        finally:
+            self._flusher = None
+            # Entries posted while the last batch was being written
+            if self._pending:
+                self._flusher = asyncio.create_task(self._flush_soon())
+
+    async def _flush(self) -> None:
+        batch = self._pending[:self._batch_size]
+        del self._pending[:self._batch_size]
+        if not batch:
+            return
+
+        try:
+            ids = await self._run(self._insert_batch, [entry for entry, _ in batch])
+        except Exception as e:
+            logger.error("Error writing ledger entries: %s", e, extra={"event": "ledger_write_failed"})
+            for entry, future in batch:
+                self._balances[entry.wallet_inkey] -= entry.amount
+                self._refs.discard(entry.ref)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (entry, future), entry_id in zip(batch, ids):
+            LEDGER_ENTRIES.inc(kind=entry.kind)
+            if not future.done():
+                future.set_result(replace(entry, id=entry_id))
+
+    def _insert_batch(self, entries: list[LedgerEntry]) -> list[int]:
+        cursor = self._db.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            ids = []
+            for entry in entries:
+                cursor.execute(
+                    "INSERT INTO ledger_entries (wallet_inkey, amount, kind, ref, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (entry.wallet_inkey, entry.amount, entry.kind, entry.ref, entry.timestamp)
+                )
+                ids.append(cursor.lastrowid)
+                # Open until settle_withdrawal(), so a restart can't lose it
+                if entry.kind == ENTRY_WITHDRAWAL:
+                    cursor.execute(
+                        "INSERT INTO ledger_withdrawals (entry_id, wallet_inkey, amount) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, entry.wallet_inkey, -entry.amount)
+                    )
+            cursor.execute("COMMIT")
+            return ids
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    async def close(self) -> None:
+        while self._pending or self._flusher is not None:
+            if self._flusher is not None:
+                await self._flusher
+            else:
+                await self._flush()
+        await self._run(self._db.close)
+        self._executor.shutdown(wait=True)
+
+
+class LedgerSettler:
+    """
+    Settles ledger balances to the users' own wallets over Lightning.
+
+    A withdrawal is debited from the ledger before it is paid, and its
+    invoice is recorded before it is paid. The amount is only given back
+    once the payment surely failed: no invoice was paid or LNbits reports
+    it failed. A withdrawal whose outcome is unknown stays open, and open
+    withdrawals are checked and paid again on start() and on every
+    scheduled settlement. Every `interval` seconds the balances of wallets
+    without a movement for `idle_after` seconds are paid out in one batch,
+    so LNbits traffic follows deposits and withdrawals rather than bets.
+    """
+
+    def __init__(self, ledger: Ledger, payouts: PayoutEngine, interval: float = 0.0, idle_after: float = 3600.0):
+        """
+        Args:
+            - ledger (Ledger): the balances to settle
+            - payouts (PayoutEngine): pays the withdrawals from the house wallet
+            - interval (float): seconds between scheduled settlements, 0 disables them
+            - idle_after (float): seconds without a movement before a balance is paid out
+        """
+        self._ledger = ledger
+        self._payouts = payouts
+        self._interval = interval
+        self._idle_after = idle_after
+        self._task: asyncio.Task | None = None
+        # Entry ids of the withdrawals being paid right now
+        self._paying: set[int] = set()
+
+    def start(self) -> None:
+        """Resumes the withdrawals left open by a previous run, then settles every `interval` seconds."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._settle_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def withdraw(self, wallet_inkey: str, amount: int) -> PayoutResult:
+        """
+        Pays part of a wallet's balance out to the wallet.
+
+        Returns:
+            - the payout's result, the amount is back on the ledger if it failed
+                and still debited while it is pending
+
+        Raises:
+            - InsufficientFunds if the amount exceeds the wallet's balance
+        """
+        entry = await self._ledger.post(wallet_inkey, -amount, ENTRY_WITHDRAWAL)
+        report = await self._pay([Withdrawal(entry.id, wallet_inkey, amount)])
+        return report.results[0]
+
+    async def settle(self, withdrawals: list[tuple[str, int]]) -> PayoutReport:
+        """
+        Pays ledger balances out to the wallets they belong to, skipping
+        the ones whose balance dropped below the amount in the meantime.
+
+        Args:
+            - withdrawals (list): (wallet inkey, sats) pairs
+
+        Returns:
+            - a PayoutReport with one result per withdrawal that was attempted
+        """
+        entries = []
+        for wallet_inkey, amount in withdrawals:
+            try:
+                entries.append(await self._ledger.post(wallet_inkey, -amount, ENTRY_WITHDRAWAL))
+            except InsufficientFunds:
+                continue
+        return await self._pay([Withdrawal(entry.id, entry.wallet_inkey, -entry.amount) for entry in entries])
+
+    async def resume(self) -> PayoutReport:
+        """
+        Pays the open withdrawals nobody is paying right now. Those with an
+        invoice are paid with it, after checking it wasn't paid already.
+
+        Returns:
+            - a PayoutReport with one result per resumed withdrawal
+        """
+        withdrawals = [w for w in await self._ledger.open_withdrawals() if w.entry_id not in self._paying]
+        return await self._pay(withdrawals)
+
+    async def _pay(self, withdrawals: list[Withdrawal]) -> PayoutReport:
+        async def record_invoice(order: PayoutOrder, invoice) -> None:
+            await self._ledger.set_withdrawal_invoice(order.ref, invoice.bolt11, invoice.payment_hash)
+
+        entry_ids = {w.entry_id for w in withdrawals}
+        self._paying |= entry_ids
+        try:
+            report = await self._payouts.run([
+                PayoutOrder(
+                    wallet_inkey=w.wallet_inkey,
+                    amount=w.amount,
+                    memo="Withdrawal",
+                    ref=w.entry_id,
+                    key=f"ledger:{w.entry_id}",
+                    bolt11=w.bolt11,
+                    payment_hash=w.payment_hash,
+                )
+                for w in withdrawals
+            ], on_invoice=record_invoice)
+
+            # Give back only what surely wasn't paid, the rest stays open
+            settled = [result for result in report.results if result.status != "pending"]
+            await asyncio.gather(*(
+                self._ledger.settle_withdrawal(result.ref, paid=result.status == "paid")
+                for result in settled
+            ))
+        finally:
+            self._paying -= entry_ids
+
+        for result in report.results:
+            if result.status == "failed":
+                logger.error(
+                    "Error settling ledger balance: %s", result.error,
+                    extra={"event": "ledger_settlement_failed", "entry_id": result.ref}
+                )
+            elif result.status == "pending":
+                logger.warning(
+                    "Ledger withdrawal outcome unknown, it stays open: %s", result.error,
+                    extra={"event": "ledger_withdrawal_pending", "entry_id": result.ref}
+                )
+        return report
+
+    async def _settle_loop(self) -> None:
+        try:
+            await self.resume()
+        except Exception:
+            logger.exception("Error resuming ledger withdrawals", extra={"event": "ledger_settlement_failed"})
+        if self._interval <= 0:
+            return
+
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.resume()
+                idle = self._ledger.idle(self._idle_after)
+                if not idle:
+                    continue
+                report = await self.settle(idle)
+                logger.info(
+                    "Ledger balances settled",
+                    extra={"event": "ledger_settled", "paid": report.paid, "failed": report.failed}
+                )
+            except Exception:
+                logger.exception("Error settling ledger balances", extra={"event": "ledger_settlement_failed"})
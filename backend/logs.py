@@ -0,0 +1,173 @@
+"""
+Structured, non-blocking logging for the backend.
+
+Request handlers only put records on a bounded in-memory queue; a
+background thread formats them as JSON lines, redacts wallet keys and
+writes them out. High-volume events can be sampled before they are even
+queued, and records are dropped rather than blocking when the queue is full.
+
+    logger = logging.getLogger("backend")
+    logger.info("Bet placed", extra={"event": "bet_placed", "match_id": match_id})
+"""
+
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# Field names whose values are wallet secrets
+_SECRET_FIELD = re.compile(r"(adminkey|inkey|api[_-]?key|wallet_key|auth_key)", re.IGNORECASE)
+
+# LNbits keys are 32 hex characters; hashes and checking ids are longer and stay visible
+_SECRET_VALUE = re.compile(r"(?<![0-9a-fA-F])[0-9a-fA-F]{32}(?![0-9a-fA-F])")
+
+REDACTED = "[redacted]"
+
+# Libraries that log once per request
+_NOISY_LOGGERS = ("httpx", "httpcore")
+
+
+def redact(value):
+    """Returns a copy of value with wallet keys replaced, recursing into dicts and lists."""
+    if isinstance(value, str):
+        return _SECRET_VALUE.sub(REDACTED, value)
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if isinstance(k, str) and _SECRET_FIELD.search(k) else redact(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record and its `extra` fields as one redacted JSON object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(redact(entry), default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a share of the records of selected events.
+    Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        """
+        Args:
+            - rates (dict): event name -> share of its records to keep, 0 to 1
+        """
+        super().__init__()
+        self._rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rates.get(getattr(record, "event", None))
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that drops records instead of blocking or raising on a full queue."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message now, while its args are still valid, but leave
+        # formatting and redaction to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def setup_logging(
+    level: int = logging.INFO,
+    sample_rates: dict[str, float] | None = None,
+    queue_size: int = 10000,
+    stream=None,
+) -> DroppingQueueHandler:
+    """
+    Routes every log record through a bounded queue to a background
+    thread that writes redacted JSON lines. Safe to call more than once.
+
+    Args:
+        - level (int): the root logger level
+        - sample_rates (dict | None): event name -> share of records kept
+        - queue_size (int): records buffered before new ones are dropped
+        - stream: where the JSON lines go, stderr by default
+
+    Returns:
+        - the queue handler, whose `dropped` attribute counts lost records
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = DroppingQueueHandler(log_queue)
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, DroppingQueueHandler):
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    # httpx logs every LNbits request at INFO, which would flood the queue
+    for noisy in _NOISY_LOGGERS:
+        logging.getLogger(noisy).setLevel(max(root.level, logging.WARNING))
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return handler
+
+
+def shutdown_logging() -> None:
+    """Writes out the records still queued and stops the background thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
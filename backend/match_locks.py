@@ -0,0 +1,92 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class _MatchGate:
+    __slots__ = ("condition", "placing", "resolving", "users")
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        # Bet placements currently in progress
+        self.placing = 0
+        self.resolving = False
+        # Tasks holding or waiting for the gate, it is dropped when this reaches 0
+        self.users = 0
+
+
+class MatchLocks:
+    """
+    Per-match coordination between bet placement and match resolution.
+
+    Any number of placements on a match run at the same time, and matches
+    never wait on each other. Resolving a match first stops new placements
+    on it, then waits for the ones in progress to finish, so a bet can't be
+    recorded after its match has been closed. Gates are created on first
+    use and removed once no task holds or waits for them.
+
+    Every structure here is only touched from the event loop between awaits,
+    so there is no global lock to contend on.
+    """
+
+    def __init__(self):
+        self._gates: dict[str, _MatchGate] = {}
+
+    def __len__(self) -> int:
+        return len(self._gates)
+
+    def _acquire(self, match_id: str) -> _MatchGate:
+        gate = self._gates.get(match_id)
+        if gate is None:
+            gate = self._gates[match_id] = _MatchGate()
+        gate.users += 1
+        return gate
+
+    def _release(self, match_id: str, gate: _MatchGate) -> None:
+        gate.users -= 1
+        if gate.users == 0:
+            del self._gates[match_id]
+
+    @asynccontextmanager
+    async def placing(self, match_id: str) -> AsyncIterator[None]:
+        """
+        Held while a bet on match_id is checked, paid and recorded.
+        Waits if the match is being resolved right now.
+        """
+        gate = self._acquire(match_id)
+        try:
+            async with gate.condition:
+                await gate.condition.wait_for(lambda: not gate.resolving)
+                gate.placing += 1
+            try:
+                yield
+            finally:
+                async with gate.condition:
+                    gate.placing -= 1
+                    if gate.placing == 0:
+                        gate.condition.notify_all()
+        finally:
+            self._release(match_id, gate)
+
+    @asynccontextmanager
+    async def resolving(self, match_id: str) -> AsyncIterator[None]:
+        """
+        Held while match_id is closed. Only one resolution of a match runs
+        at a time and none runs while a bet on it is being placed.
+        """
+        gate = self._acquire(match_id)
+        try:
+            async with gate.condition:
+                await gate.condition.wait_for(lambda: not gate.resolving)
+                gate.resolving = True
+            # Cleared on any exit, also when cancelled while placements drain
+            try:
+                async with gate.condition:
+                    await gate.condition.wait_for(lambda: gate.placing == 0)
+                yield
+            finally:
+                async with gate.condition:
+                    gate.resolving = False
+                    gate.condition.notify_all()
+        finally:
+            self._release(match_id, gate)
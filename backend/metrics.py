@@ -0,0 +1,253 @@
+"""
+Minimal Prometheus-compatible metrics: counters, gauges and histograms
+with labels, rendered in the Prometheus text exposition format.
+"""
+
+import bisect
+import math
+
+
+# Latency buckets in seconds, from a fast cache hit up to a stuck LNbits call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for key, value in sorted(self._values.items()):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key: tuple[str, ...], value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Per-bucket (not cumulative) counts, the last slot is +Inf, then sum
+            state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _render_sample(self, key: tuple[str, ...], state) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), state[:-1]):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, by route template",
+    ("method", "route", "status"),
+)
+LNBITS_REQUEST_DURATION = REGISTRY.histogram(
+    "lnbits_request_duration_seconds",
+    "Time spent waiting for LNbits, by client operation",
+    ("operation",),
+)
+LNBITS_ERRORS = REGISTRY.counter(
+    "lnbits_errors_total",
+    "LNbits calls that failed, by operation and kind (status or transport)",
+    ("operation", "kind"),
+)
+LNBITS_INFLIGHT = REGISTRY.gauge(
+    "lnbits_inflight_requests",
+    "LNbits calls currently waiting for a response",
+    ("operation",),
+)
+PAYOUTS = REGISTRY.counter(
+    "payouts_total",
+    "Winner payouts by final status (paid or failed)",
+    ("status",),
+)
+PAYOUT_RETRIES = REGISTRY.counter(
+    "payout_retries_total",
+    "Extra attempts spent on winner payouts",
+)
+OPEN_BETS = REGISTRY.gauge(
+    "open_bets",
+    "Bets on matches that are not resolved yet",
+)
+SETTLEMENTS = REGISTRY.counter(
+    "settlements_total",
+    "Tracked invoices resolved, by source (webhook, check or expired) and result",
+    ("source", "result"),
+)
+SETTLEMENT_CHECKS = REGISTRY.counter(
+    "settlement_checks_total",
+    "LNbits requests spent on settlement checks, by kind (list or lookup)",
+    ("kind",),
+)
+WALLET_SUBSCRIBERS = REGISTRY.gauge(
+    "wallet_event_subscribers",
+    "Open wallet event streams",
+)
+WALLET_EVENT_DROPS = REGISTRY.counter(
+    "wallet_event_drops_total",
+    "Wallet event streams cut off because the client fell behind",
+)
+LNBITS_RETRIES = REGISTRY.counter(
+    "lnbits_retries_total",
+    "LNbits reads sent again after a failed attempt, by operation",
+    ("operation",),
+)
+LNBITS_HEDGES = REGISTRY.counter(
+    "lnbits_hedged_requests_total",
+    "Duplicate LNbits reads sent because the first one was slow, by operation",
+    ("operation",),
+)
+LNBITS_CIRCUIT_STATE = REGISTRY.gauge(
+    "lnbits_circuit_state",
+    "LNbits circuit breaker state: 0 closed, 1 half open, 2 open",
+)
+LNBITS_CIRCUIT_REJECTIONS = REGISTRY.counter(
+    "lnbits_circuit_rejections_total",
+    "LNbits calls failed fast because the circuit was open, by operation",
+    ("operation",),
+)
+LNBITS_ADMISSION_REJECTIONS = REGISTRY.counter(
+    "lnbits_admission_rejections_total",
+    "LNbits calls refused by admission control, by reason",
+    ("reason",),
+)
+LNBITS_ADMISSION_WAITING = REGISTRY.gauge(
+    "lnbits_admission_waiting",
+    "LNbits calls waiting for an in-flight slot",
+)
+LEDGER_ENTRIES = REGISTRY.counter(
+    "ledger_entries_total",
+    "Internal ledger entries committed, by kind",
+    ("kind",),
+)
+LEDGER_BALANCE = REGISTRY.gauge(
+    "ledger_balance_sats",
+    "Sats held on the internal ledger for all users together",
+)
+CATALOG_FETCHES = REGISTRY.counter(
+    "catalog_fetches_total",
+    "Match catalog source fetches, by source and result (changed, unchanged or failed)",
+    ("source", "result"),
+)
+CATALOG_FIXTURES = REGISTRY.gauge(
+    "catalog_fixtures",
+    "Matches in the match catalog",
+)
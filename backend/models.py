@@ -5,12 +5,120 @@
 #   Happy hacking!
 #
 
-from dataclasses import dataclass
+import types
+import typing
 from datetime import datetime
 from typing import Any
 
 
-@dataclass
+_MISSING = object()
+
+
+def _is_datetime(annotation) -> bool:
+    if annotation is datetime:
+        return True
+    if isinstance(annotation, types.UnionType) or typing.get_origin(annotation) is typing.Union:
+        return datetime in typing.get_args(annotation)
+    return False
+
+
+class _LazyDatetime:
+    """
+    Holds the raw ISO string LNbits sent and parses it into a datetime
+    on first access. Most responses are used for a key or an amount and
+    never need their timestamps.
+    """
+
+    __slots__ = ("_slot",)
+
+    def __init__(self, slot: str):
+        self._slot = slot
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self._slot)
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                return value
+            setattr(obj, self._slot, value)
+        return value
+
+    def __set__(self, obj, value) -> None:
+        setattr(obj, self._slot, value)
+
+
+class _Model:
+    __slots__ = ()
+
+    # Set by @model
+    _fields: tuple[str, ...] = ()
+    _defaults: dict[str, Any] = {}
+    # (response key, attribute slot, default) for every field
+    _decoders: tuple[tuple[str, str, Any], ...] = ()
+
+    def __init__(self, **kwargs):
+        for name in self._fields:
+            value = kwargs.pop(name, self._defaults.get(name, _MISSING))
+            if value is _MISSING:
+                raise TypeError(f"{type(self).__name__} missing required argument: {name!r}")
+            setattr(self, name, value)
+        if kwargs:
+            raise TypeError(f"{type(self).__name__} got unexpected arguments: {', '.join(kwargs)}")
+
+    @classmethod
+    def from_json(cls, data: dict):
+        """
+        Builds a model from an LNbits response body. Keys the model doesn't
+        know are ignored and missing ones fall back to the field default or None.
+        """
+        obj = cls.__new__(cls)
+        get = data.get
+        for key, slot, default in cls._decoders:
+            setattr(obj, slot, get(key, default))
+        return obj
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+
+def model(cls):
+    """
+    Turns an annotated class into a slotted model, like @dataclass(slots=True)
+    but with a precomputed decoder for LNbits responses and lazily parsed
+    datetime fields.
+    """
+    annotations = cls.__dict__.get("__annotations__", {})
+    fields = tuple(annotations)
+    lazy = {name for name, annotation in annotations.items() if _is_datetime(annotation)}
+
+    namespace = {
+        key: value for key, value in cls.__dict__.items()
+        if key not in fields and key not in ("__dict__", "__weakref__")
+    }
+    namespace["__slots__"] = tuple(f"_{name}" if name in lazy else name for name in fields)
+    for name in lazy:
+        namespace[name] = _LazyDatetime(f"_{name}")
+
+    defaults = {name: cls.__dict__[name] for name in fields if name in cls.__dict__}
+    namespace["_fields"] = fields
+    namespace["_defaults"] = defaults
+    namespace["_decoders"] = tuple(
+        (name, f"_{name}" if name in lazy else name, defaults.get(name))
+        for name in fields
+    )
+    return type(cls.__name__, (_Model,), namespace)
+
+
+@model
 class Account:
     id: str
     user: str
@@ -25,7 +133,7 @@ class Account:
     extra: dict | None = None
 
 
-@dataclass
+@model
 class Wallet:
     id: str
     user: str
@@ -40,13 +148,13 @@ class Wallet:
     extra: dict | None = None
 
 
-@dataclass
+@model
 class WalletInfo:
     name: str
     balance: int
 
 
-@dataclass
+@model
 class Invoice:
     checking_id: str
     payment_hash: str
@@ -69,6 +177,16 @@ class Invoice:
     # payment_request: str
     # lnurl_response: Any | None = None
 
+
+@model
+class Transfer:
+    invoice: Invoice
+    payment: Invoice
+    # Sequential request stages on the critical path
+    round_trips: int
+    # Requests sent in total, including ones that ran concurrently
+    requests: int
+
 # Schema from feb18 lnbits
 # {
 #   "checking_id": "string",
@@ -0,0 +1,198 @@
+import asyncio
+from dataclasses import dataclass, field
+
+
+@dataclass
+class OddsUpdate:
+    match_id: str
+    # Bumped every time a price of the match changes
+    version: int
+    # Only the outcomes whose price changed, or all of them in a snapshot
+    prices: dict[str, float]
+    closed: bool = False
+
+    def to_dict(self) -> dict:
+        return {
+            "match_id": self.match_id,
+            "version": self.version,
+            "prices": self.prices,
+            "closed": self.closed,
+        }
+
+
+class OddsSubscription:
+    """
+    A viewer's feed of price changes for one match.
+
+    Changes published while the viewer is still busy are merged, so a slow
+    viewer skips intermediate prices instead of building up a backlog.
+    """
+
+    def __init__(self, snapshot: OddsUpdate):
+        self._match_id = snapshot.match_id
+        self._version = snapshot.version
+        self._pending: dict[str, float] = dict(snapshot.prices)
+        self._closed = False
+        self._finished = False
+        self._ready = asyncio.Event()
+        self._ready.set()
+
+    def _push(self, update: OddsUpdate) -> None:
+        self._pending.update(update.prices)
+        self._version = update.version
+        self._closed = self._closed or update.closed
+        self._ready.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> OddsUpdate:
+        # The update announcing the close is the last one
+        if self._finished:
+            raise StopAsyncIteration
+        await self._ready.wait()
+        self._ready.clear()
+        prices, self._pending = self._pending, {}
+        self._finished = self._closed
+        return OddsUpdate(self._match_id, self._version, prices, self._closed)
+
+
+@dataclass
+class _MatchBook:
+    stakes: dict[str, int] = field(default_factory=dict)
+    total: int = 0
+    probabilities: dict[str, float] = field(default_factory=dict)
+    prices: dict[str, float] = field(default_factory=dict)
+    version: int = 0
+    subscribers: set[OddsSubscription] = field(default_factory=set)
+
+
+class OddsEngine:
+    """
+    Keeps implied probabilities and decimal prices for every open match.
+
+    An outcome's target probability is its share of the money staked on the
+    match, with `prior_stake` sats assumed on every outcome so the first bets
+    don't swing prices to extremes. Published probabilities move towards the
+    target by `damping` on each bet, and prices include the house `margin`.
+    A bet only touches its own match's outcomes, so an update costs
+    O(outcomes) no matter how many bets the match has.
+    """
+
+    def __init__(self, margin: float = 0.05, damping: float = 0.5, prior_stake: int = 1000):
+        """
+        Args:
+            - margin (float): house overround, 0.05 makes probabilities sum to 1.05
+            - damping (float): share of the distance to the target moved per bet, 0 to 1
+            - prior_stake (int): sats assumed on every outcome before any bet
+        """
+        if not 0 < damping <= 1:
+            raise ValueError("damping must be in (0, 1]")
+        self._margin = margin
+        self._damping = damping
+        self._prior_stake = prior_stake
+        self._books: dict[str, _MatchBook] = {}
+
+    def __contains__(self, match_id: str) -> bool:
+        return match_id in self._books
+
+    def seed(self, match_id: str, stakes: dict[str, int]) -> None:
+        """Starts a match from stakes already placed, e.g. after a restart."""
+        book = self._books.setdefault(match_id, _MatchBook())
+        for outcome, stake in stakes.items():
+            book.stakes[outcome] = book.stakes.get(outcome, 0) + stake
+            book.total += stake
+        # Nothing was published for the stakes yet, start from their target right away
+        book.probabilities = self._targets(book)
+        self._reprice(match_id, book)
+
+    def record_bet(self, match_id: str, outcome: str, amount: int) -> OddsUpdate | None:
+        """
+        Adds a bet's stake and republishes the prices it moved.
+
+        Returns:
+            - the published update, or None if no price changed
+        """
+        book = self._books.setdefault(match_id, _MatchBook())
+        book.stakes[outcome] = book.stakes.get(outcome, 0) + amount
+        book.total += amount
+
+        targets = self._targets(book)
+        if len(book.probabilities) != len(targets):
+            # A new outcome reshapes the whole market, jump straight to the targets
+            book.probabilities = targets
+        else:
+            moved = {
+                name: p + self._damping * (targets[name] - p)
+                for name, p in book.probabilities.items()
+            }
+            norm = sum(moved.values())
+            book.probabilities = {name: p / norm for name, p in moved.items()}
+        return self._reprice(match_id, book)
+
+    def quote(self, match_id: str) -> OddsUpdate:
+        book = self._books.get(match_id) or _MatchBook()
+        return OddsUpdate(match_id, book.version, dict(book.prices))
+
+    def price(self, match_id: str, outcome: str) -> float:
+        """
+        The price a bet on the outcome gets right now.
+
+        An outcome nobody bet on yet has no published price, it is priced
+        as if it joined the market with only the prior stake on it.
+        """
+        book = self._books.get(match_id) or _MatchBook()
+        if outcome in book.prices:
+            return book.prices[outcome]
+        prior_total = book.total + self._prior_stake * (len(book.stakes) + 1)
+        return self._price(self._prior_stake / prior_total)
+
+    def subscribe(self, match_id: str) -> OddsSubscription:
+        """Returns a feed starting with the current prices of the match."""
+        book = self._books.setdefault(match_id, _MatchBook())
+        subscription = OddsSubscription(self.quote(match_id))
+        book.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, match_id: str, subscription: OddsSubscription) -> None:
+        book = self._books.get(match_id)
+        if book is not None:
+            book.subscribers.discard(subscription)
+            # Drop books that only existed for viewers
+            if not book.subscribers and not book.stakes:
+                del self._books[match_id]
+
+    def close(self, match_id: str) -> None:
+        """Forgets a resolved match and ends its subscribers' feeds."""
+        book = self._books.pop(match_id, None)
+        if book is None:
+            return
+        update = OddsUpdate(match_id, book.version + 1, {}, closed=True)
+        for subscription in book.subscribers:
+            subscription._push(update)
+
+    def _targets(self, book: _MatchBook) -> dict[str, float]:
+        prior_total = book.total + self._prior_stake * len(book.stakes)
+        return {
+            name: (stake + self._prior_stake) / prior_total
+            for name, stake in book.stakes.items()
+        }
+
+    def _price(self, probability: float) -> float:
+        return max(1.01, round(1 / (probability * (1 + self._margin)), 2))
+
+    def _reprice(self, match_id: str, book: _MatchBook) -> OddsUpdate | None:
+        changed = {}
+        for name, probability in book.probabilities.items():
+            price = self._price(probability)
+            if book.prices.get(name) != price:
+                book.prices[name] = price
+                changed[name] = price
+        if not changed:
+            return None
+
+        book.version += 1
+        update = OddsUpdate(match_id, book.version, changed)
+        for subscription in book.subscribers:
+            subscription._push(update)
+        return update
@@ -0,0 +1,248 @@
+import asyncio
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from idempotency import IdempotencyConflict, IdempotencyStore
+from metrics import PAYOUT_RETRIES, PAYOUTS
+from service import PAYMENT_FAILED, PAYMENT_SUCCESS, AsyncLNbits
+
+
+@dataclass
+class PayoutOrder:
+    """A single amount to be paid from the house wallet to a winner."""
+    wallet_inkey: str
+    amount: int
+    memo: str = ""
+    # Caller-defined reference that is carried over to the result
+    ref: Any = None
+    # Orders with the same key are paid at most once by an engine
+    key: str | None = None
+    # An invoice created for this order by an earlier run, paid instead of a new one
+    bolt11: str | None = None
+    payment_hash: str | None = None
+
+
+@dataclass
+class PayoutResult:
+    wallet_inkey: str
+    amount: int
+    # "paid", "failed" when the payment surely didn't go through, or "pending"
+    # when its invoice may still have been paid and the outcome is unknown
+    status: str
+    attempts: int
+    checking_id: str | None = None
+    error: str | None = None
+    ref: Any = None
+
+    @property
+    def retried(self) -> bool:
+        return self.attempts > 1
+
+
+@dataclass
+class PayoutReport:
+    results: list[PayoutResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def paid(self) -> int:
+        return sum(1 for r in self.results if r.status == "paid")
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for r in self.results if r.status == "failed")
+
+    @property
+    def pending(self) -> int:
+        return sum(1 for r in self.results if r.status == "pending")
+
+    @property
+    def retried(self) -> int:
+        return sum(1 for r in self.results if r.retried)
+
+    @property
+    def total_paid_sats(self) -> int:
+        return sum(r.amount for r in self.results if r.status == "paid")
+
+    def to_dict(self) -> dict:
+        return {
+            "paid": self.paid,
+            "failed": self.failed,
+            "pending": self.pending,
+            "retried": self.retried,
+            "total_paid_sats": self.total_paid_sats,
+            "elapsed": round(self.elapsed, 3),
+            # Wallet keys stay out, reports are returned and stored as they are
+            "results": [
+                {name: value for name, value in asdict(r).items() if name != "wallet_inkey"}
+                for r in self.results
+            ],
+        }
+
+
+class PayoutEngine:
+    """
+    Pays out winners through LNbits with a bounded number of
+    invoice+pay pipelines running at the same time.
+
+    Each order is an independent pipeline: create an invoice on the winner's
+    inkey, then pay it from the house adminkey. Failed steps are retried
+    with exponential backoff. A failed payment is retried against the same
+    invoice, which LNbits settles at most once, so a retry can't pay twice;
+    the invoice's status is checked first, so a payment whose response was
+    lost counts as paid. An order whose last invoice may still have been
+    paid is reported as pending rather than failed. Callers that persist invoices through `on_invoice`
+    can hand them back in a later order and get the same guarantee across
+    runs and restarts. Within one engine, orders that carry a key are also
+    looked up in a payout ledger: a key that was already paid returns its
+    earlier result, and a key that is being paid right now is waited for.
+    """
+
+    def __init__(
+        self,
+        client: AsyncLNbits,
+        payer_adminkey: str,
+        concurrency: int = 16,
+        max_attempts: int = 3,
+        retry_backoff: float = 0.25,
+        ledger_ttl: float = 86400.0,
+        ledger_size: int = 100000,
+    ):
+        """
+        Args:
+            - client (AsyncLNbits): the LNbits client used for all calls
+            - payer_adminkey (str): adminkey of the wallet the winnings come from
+            - concurrency (int): maximum number of pipelines in flight
+            - max_attempts (int): attempts per order before it is reported as failed
+            - retry_backoff (float): delay before the first retry, doubled on each next one
+            - ledger_ttl (float): seconds a paid order key is remembered
+            - ledger_size (int): maximum number of paid order keys remembered
+        """
+        self._client = client
+        self._payer_adminkey = payer_adminkey
+        self._concurrency = concurrency
+        self._max_attempts = max_attempts
+        self._retry_backoff = retry_backoff
+        self._ledger = IdempotencyStore(ttl=ledger_ttl, maxsize=ledger_size)
+
+    async def run(self, orders: list[PayoutOrder], on_invoice=None) -> PayoutReport:
+        """
+        Executes all orders and waits for every one of them to finish.
+
+        Args:
+            - orders (list): the PayoutOrders to pay
+            - on_invoice (callable | None): async function called with an order and
+                its new invoice before the invoice is paid; if it fails, the
+                invoice is not paid
+
+        Returns:
+            - a PayoutReport with one result per order, in the order given
+        """
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def bounded(order: PayoutOrder) -> PayoutResult:
+            async with semaphore:
+                try:
+                    # Failed payouts are not remembered so the order can be retried
+                    return await self._ledger.run(
+                        order.key,
+                        f"{order.wallet_inkey}:{order.amount}",
+                        lambda: self._pay(order, on_invoice),
+                        store=lambda result: result.status == "paid"
+                    )
+                except IdempotencyConflict as e:
+                    return PayoutResult(
+                        wallet_inkey=order.wallet_inkey,
+                        amount=order.amount,
+                        status="failed",
+                        attempts=0,
+                        error=str(e),
+                        ref=order.ref,
+                    )
+
+        results = await asyncio.gather(*(bounded(order) for order in orders))
+        for result in results:
+            PAYOUTS.inc(status=result.status)
+            PAYOUT_RETRIES.inc(max(result.attempts - 1, 0))
+        return PayoutReport(results=list(results), elapsed=time.perf_counter() - started)
+
+    async def _pay(self, order: PayoutOrder, on_invoice) -> PayoutResult:
+        bolt11 = order.bolt11
+        payment_hash = order.payment_hash
+        error = None
+
+        for attempt in range(1, self._max_attempts + 1):
+            if attempt > 1:
+                await asyncio.sleep(self._retry_backoff * 2 ** (attempt - 2))
+            try:
+                if bolt11 is not None:
+                    # An earlier attempt may have paid it without getting the response
+                    invoice = await self._client.get_payment(order.wallet_inkey, payment_hash)
+                    if invoice is not None and invoice.status == PAYMENT_SUCCESS:
+                        return PayoutResult(
+                            wallet_inkey=order.wallet_inkey,
+                            amount=order.amount,
+                            status="paid",
+                            attempts=attempt,
+                            checking_id=payment_hash,
+                            ref=order.ref,
+                        )
+                    # An unknown or expired invoice can't be paid anymore, only then is a new one safe
+                    if invoice is None or invoice.status == PAYMENT_FAILED:
+                        bolt11 = None
+
+                if bolt11 is None:
+                    invoice = await self._client.create_invoice(
+                        wallet_key=order.wallet_inkey,
+                        amount_sats=order.amount,
+                        memo=order.memo
+                    )
+                    if on_invoice is not None:
+                        await on_invoice(order, invoice)
+                    bolt11, payment_hash = invoice.bolt11, invoice.payment_hash
+
+                payment = await self._client.pay_invoice(
+                    wallet_adminkey=self._payer_adminkey,
+                    invoice=bolt11
+                )
+                return PayoutResult(
+                    wallet_inkey=order.wallet_inkey,
+                    amount=order.amount,
+                    status="paid",
+                    attempts=attempt,
+                    checking_id=payment.checking_id,
+                    ref=order.ref,
+                )
+            except Exception as e:
+                error = str(e)
+
+        # Failed only when no invoice was left to pay or it can't be paid anymore
+        status = "failed"
+        if bolt11 is not None:
+            try:
+                invoice = await self._client.get_payment(order.wallet_inkey, payment_hash)
+            except Exception as e:
+                error, status = str(e), "pending"
+            else:
+                if invoice is not None and invoice.status == PAYMENT_SUCCESS:
+                    return PayoutResult(
+                        wallet_inkey=order.wallet_inkey,
+                        amount=order.amount,
+                        status="paid",
+                        attempts=self._max_attempts,
+                        checking_id=payment_hash,
+                        ref=order.ref,
+                    )
+                if invoice is not None and invoice.status != PAYMENT_FAILED:
+                    status = "pending"
+
+        return PayoutResult(
+            wallet_inkey=order.wallet_inkey,
+            amount=order.amount,
+            status=status,
+            attempts=self._max_attempts,
+            error=error,
+            ref=order.ref,
+        )
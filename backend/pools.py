@@ -0,0 +1,118 @@
+"""
+Pari-mutuel settlement: the stakes on all outcomes form one pool and,
+after the house rake, the winners split it in proportion to their stakes.
+
+Everything is computed on columnar numpy arrays in a handful of
+vectorized passes, exactly in integer sats:
+
+    - every winner gets floor(distributable * stake / winning_stake)
+    - the sats lost to rounding (fewer than the number of winners) go one
+      each to the winners with the largest rounding remainders, earlier
+      bets first on ties, so the payouts always add up to the distributable pool
+    - if nobody backed the winning outcome, every stake is refunded in full
+"""
+
+from dataclasses import dataclass
+from typing import Iterator, Sequence
+
+import numpy as np
+
+
+# Products above this can't be formed in int64 and use exact Python integers instead
+_INT64_MAX = np.iinfo(np.int64).max
+
+
+@dataclass
+class PoolSettlement:
+    # One entry per bet, in the order given
+    bet_ids: np.ndarray
+    payouts: np.ndarray
+    # Total stake of the pool
+    pool: int
+    # Sats kept by the house
+    rake: int
+    winning_stake: int
+    # Nobody backed the winner, so every stake is paid back
+    refunded: bool
+
+    @property
+    def paid_out(self) -> int:
+        return int(self.payouts.sum())
+
+    def payouts_by_bet(self) -> Iterator[tuple[int, int]]:
+        """Yields (bet id, payout) for every bet that receives anything."""
+        paid = np.flatnonzero(self.payouts)
+        return zip(self.bet_ids[paid].tolist(), self.payouts[paid].tolist())
+
+
+def settle_pool(
+    bet_ids: Sequence[int],
+    outcomes: Sequence[str],
+    amounts: Sequence[int],
+    winning_outcome: str,
+    rake_bps: int = 0,
+) -> PoolSettlement:
+    """
+    Splits a match's pool between the bets on the winning outcome.
+
+    Args:
+        - bet_ids (sequence): bet ids, used to break rounding ties in their order
+        - outcomes (sequence): the outcome each bet backed
+        - amounts (sequence): each bet's stake in sats
+        - winning_outcome (str): the outcome that won
+        - rake_bps (int): house share of the pool in basis points, rounded down
+
+    Returns:
+        - a PoolSettlement with one payout per bet, 0 for losing bets
+
+    Raises:
+        - a ValueError for mismatched columns, negative stakes or an invalid rake
+    """
+    ids = np.asarray(bet_ids, dtype=np.int64)
+    stakes = np.asarray(amounts, dtype=np.int64)
+    picks = np.asarray(outcomes)
+    if not (len(ids) == len(stakes) == len(picks)):
+        raise ValueError("bet_ids, outcomes and amounts must have the same length")
+    if not 0 <= rake_bps <= 10000:
+        raise ValueError("rake_bps must be between 0 and 10000")
+    if len(stakes) and stakes.min() < 0:
+        raise ValueError("Stakes can't be negative")
+
+    pool = int(stakes.sum())
+    winners = picks == winning_outcome
+    winning_stake = int(stakes[winners].sum())
+
+    if winning_stake == 0:
+        return PoolSettlement(
+            bet_ids=ids, payouts=stakes.copy(), pool=pool, rake=0,
+            winning_stake=0, refunded=True,
+        )
+
+    rake = pool * rake_bps // 10000
+    distributable = pool - rake
+    winning = np.flatnonzero(winners)
+    winning_stakes = stakes[winning]
+
+    if winning_stakes.size and distributable * int(winning_stakes.max()) > _INT64_MAX:
+        # Exact but slower: numpy falls back to Python integers
+        products = winning_stakes.astype(object) * distributable
+        shares = (products // winning_stake).astype(np.int64)
+        # Remainders are below winning_stake, which is far below 2**53, so floats are exact
+        remainders = (products % winning_stake).astype(np.float64)
+    else:
+        products = winning_stakes * distributable
+        shares = products // winning_stake
+        remainders = products % winning_stake
+
+    leftover = distributable - int(shares.sum())
+    if leftover:
+        # Largest remainder first, then the earlier bet
+        order = np.lexsort((ids[winning], -remainders))
+        shares[order[:leftover]] += 1
+
+    payouts = np.zeros(len(stakes), dtype=np.int64)
+    payouts[winning] = shares
+    return PoolSettlement(
+        bet_ids=ids, payouts=payouts, pool=pool, rake=rake,
+        winning_stake=winning_stake, refunded=False,
+    )
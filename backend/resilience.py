@@ -0,0 +1,120 @@
+"""
+Building blocks that keep LNbits hiccups from turning into slow or
+stuck requests: a circuit breaker, jittered backoff and a rolling
+latency window used to decide when to hedge a read.
+"""
+
+import math
+import random
+import time
+from collections import deque
+
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_HALF_OPEN = "half_open"
+CIRCUIT_OPEN = "open"
+
+# Values of the lnbits_circuit_state gauge
+CIRCUIT_STATES = (CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an upstream that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail immediately. Once `reset_timeout` seconds have passed a
+    single probe call is let through (half open): its success closes the
+    circuit again, its failure reopens it for another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, clock=time.monotonic):
+        """
+        Args:
+            - failure_threshold (int): consecutive failures that open the circuit
+            - reset_timeout (float): seconds the circuit stays open before a probe
+            - clock (callable): monotonic time source, overridable in tests
+        """
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return CIRCUIT_CLOSED
+        if self._probing or self._clock() - self._opened_at >= self._reset_timeout:
+            return CIRCUIT_HALF_OPEN
+        return CIRCUIT_OPEN
+
+    def before_call(self) -> bool:
+        """
+        Returns:
+            - True if the call is the half-open probe
+
+        Raises:
+            - CircuitOpenError if the call must not be sent
+        """
+        state = self.state
+        if state == CIRCUIT_CLOSED:
+            return False
+        if state == CIRCUIT_HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        raise CircuitOpenError("LNbits is unavailable, not sending the request")
+
+    def abandon_probe(self) -> None:
+        """Lets another call probe after the probe was cancelled without an answer."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or self._failures >= self._failure_threshold:
+            self._opened_at = self._clock()
+        self._probing = False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class LatencyWindow:
+    """The most recent latencies of an operation and their percentiles."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        """
+        Args:
+            - size (int): latencies kept
+            - min_samples (int): samples needed before percentile() answers
+        """
+        self._samples: deque[float] = deque(maxlen=size)
+        self._min_samples = min_samples
+        # Sorted copy, rebuilt lazily after new samples arrive
+        self._sorted: list[float] | None = None
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, p: float) -> float | None:
+        """Nearest-rank percentile, or None while there are too few samples."""
+        if len(self._samples) < self._min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        rank = max(1, math.ceil(p / 100 * len(self._sorted)))
+        return self._sorted[rank - 1]
@@ -5,9 +5,37 @@
 #   Happy hacking!
 #
 
+import asyncio
+import time
+
+import httpx
 import requests
 
-from models import Account, Wallet, WalletInfo, Invoice
+from models import Account, Wallet, WalletInfo, Invoice, Transfer
+from metrics import (
+    LNBITS_CIRCUIT_REJECTIONS, LNBITS_ERRORS, LNBITS_HEDGES,
+    LNBITS_INFLIGHT, LNBITS_REQUEST_DURATION, LNBITS_RETRIES,
+)
+from admission import AdmissionController
+from resilience import CircuitBreaker, CircuitOpenError, LatencyWindow, backoff_delay
+
+
+# LNbits payment statuses
+PAYMENT_SUCCESS = "success"
+PAYMENT_PENDING = "pending"
+PAYMENT_FAILED = "failed"
+
+
+class TransferError(Exception):
+    """
+    Raised by AsyncLNbits.transfer. `stage` tells which step failed:
+    "wallet" (the paying wallet does not exist), "validate",
+    "invoice" or "payment".
+    """
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
 
 
 class LNbits:
@@ -19,6 +47,8 @@ class LNbits:
 
     def __init__(self, url_base: str):
         self._URL_BASE = url_base
+        # A shared session keeps TCP/TLS connections to LNbits alive between calls
+        self._session = requests.Session()
 
         self._API_V1_URL = f"https://{self._URL_BASE}/api/v1"
 
@@ -42,7 +72,7 @@ class LNbits:
         """
 
         # Making the request
-        response = requests.post(
+        response = self._session.post(
             url=self._ACCOUNTS_RESOURCE,
             json={
                 "name": name
@@ -58,7 +88,7 @@ class LNbits:
             )
 
         # Converting a json dict into a model
-        return Account(**response.json())
+        return Account.from_json(response.json())
     
     def create_wallet(self, account_api_key: str, name: str) -> Wallet:
         """
@@ -77,7 +107,7 @@ class LNbits:
         """
 
         # Making the request
-        response = requests.post(
+        response = self._session.post(
             url=self._WALLETS_RESOURCE,
             headers=self._get_header(account_api_key),
             json={
@@ -94,7 +124,7 @@ class LNbits:
             )
 
         # Converting a json dict into a model
-        return Wallet(**response.json())
+        return Wallet.from_json(response.json())
     
     def get_wallet(self, wallet_key: str) -> WalletInfo | None:
         """
@@ -113,7 +143,7 @@ class LNbits:
         """
 
         # Making the request
-        response = requests.get(
+        response = self._session.get(
             url=self._WALLETS_RESOURCE,
             headers=self._get_header(wallet_key)
         )
@@ -134,14 +164,8 @@ class LNbits:
                 f"Response body: {response.content}"
             )
         
-        # Converting a json dict into a model
-        # return WalletInfo(**response.json())
-
-         # Extract only the fields your WalletInfo class expects
-        # Replace these with the actual fields your class accepts
-        expected_fields = {"name", "balance", "adminkey", "inkey"}
-        filtered_data = {k: v for k, v in data.items() if k in expected_fields}
-        return WalletInfo(**filtered_data)
+        # Converting a json dict into a model, fields WalletInfo doesn't have are skipped
+        return WalletInfo.from_json(data)
 
 
     def create_invoice(self, wallet_key: str, amount_sats: int, memo: str = "") -> Invoice:
@@ -162,7 +186,7 @@ class LNbits:
         """
 
         # Making the request
-        response = requests.post(
+        response = self._session.post(
             url=self._PAYMENTS_RESOURCE,
             headers=self._get_header(wallet_key),
             json={
@@ -175,7 +199,7 @@ class LNbits:
         # This is the correct check for a 201 Created status
         if response.status_code == 201:
             # Success path
-            return Invoice(**response.json())
+            return Invoice.from_json(response.json())
         else:
             # Error path
             raise Exception(
@@ -201,7 +225,7 @@ class LNbits:
         """
 
         # Making the request
-        response = requests.post(
+        response = self._session.post(
             url=self._PAYMENTS_RESOURCE,
             headers=self._get_header(wallet_adminkey),
             json={
@@ -219,7 +243,7 @@ class LNbits:
             )
         
         # Converting a json dict into a model
-        return Invoice(**response.json())
+        return Invoice.from_json(response.json())
 
     def _get_header(self, auth_key: str) -> dict[str, str]:
         """
@@ -235,4 +259,562 @@ class LNbits:
         return {
             "X-Api-Key": auth_key
         }
-    
\ No newline at end of file
+
+
+class AsyncLNbits:
+    """
+    An asyncio counterpart of LNbits with the same methods and return types.
+
+    All requests go through one pooled httpx.AsyncClient, so connections to
+    LNbits are kept alive and reused instead of being re-established for
+    every call, and a slow LNbits reply never blocks the event loop.
+
+    Every request has a timeout, per operation if configured. Reads that
+    are safe to repeat (get_wallet, get_payment, list_payments) are retried
+    with jittered backoff, and a duplicate is sent when the first attempt
+    takes longer than the operation's usual `hedge_percentile` latency.
+    A circuit breaker fails calls fast while LNbits keeps failing, and an
+    optional AdmissionController keeps bursts from flooding LNbits.
+    """
+
+    def __init__(
+        self,
+        url_base: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        operation_timeouts: dict[str, float] | None = None,
+        read_retries: int = 2,
+        retry_backoff: float = 0.05,
+        retry_backoff_cap: float = 1.0,
+        hedge_percentile: float | None = 95.0,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 10.0,
+        admission: AdmissionController | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        """
+        Args:
+            - url_base (str): the LNbits host, e.g. "demo.lnbits.com", or
+                a full base URL such as "http://127.0.0.1:5000"
+            - max_connections (int): upper bound on open connections to LNbits
+            - max_keepalive_connections (int): idle connections kept in the pool
+            - keepalive_expiry (float): seconds an idle connection is kept around
+            - timeout (float): read/write/pool timeout in seconds
+            - connect_timeout (float): connect timeout in seconds
+            - operation_timeouts (dict | None): total timeout in seconds by method name,
+                e.g. {"get_wallet": 2.0}, overriding `timeout`
+            - read_retries (int): extra attempts for a failed read
+            - retry_backoff (float): upper bound of the first retry delay, doubled per retry
+            - retry_backoff_cap (float): longest retry delay
+            - hedge_percentile (float | None): latency percentile after which a
+                read is duplicated, None disables hedging
+            - breaker_threshold (int): consecutive failures that open the circuit
+            - breaker_reset (float): seconds before an open circuit lets a probe through
+            - admission (AdmissionController | None): limits the calls sent to LNbits,
+                None sends every call right away
+            - transport (httpx.AsyncBaseTransport | None): sends the requests instead
+                of the network, e.g. an httpx.ASGITransport in tests
+        """
+        self._URL_BASE = url_base
+
+        if url_base.startswith("http://") or url_base.startswith("https://"):
+            self._API_V1_URL = f"{self._URL_BASE.rstrip('/')}/api/v1"
+        else:
+            self._API_V1_URL = f"https://{self._URL_BASE}/api/v1"
+
+        self._ACCOUNTS_RESOURCE = f"{self._API_V1_URL}/account"
+        self._WALLETS_RESOURCE = f"{self._API_V1_URL}/wallet"
+        self._PAYMENTS_RESOURCE = f"{self._API_V1_URL}/payments"
+
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            transport=transport,
+        )
+
+        self._operation_timeouts = operation_timeouts or {}
+        self._read_retries = read_retries
+        self._retry_backoff = retry_backoff
+        self._retry_backoff_cap = retry_backoff_cap
+        self._hedge_percentile = hedge_percentile
+        self._latencies: dict[str, LatencyWindow] = {}
+        self.breaker = CircuitBreaker(failure_threshold=breaker_threshold, reset_timeout=breaker_reset)
+        self.admission = admission
+
+    async def aclose(self) -> None:
+        """Closes every pooled connection. The client can't be used afterwards."""
+        await self._http.aclose()
+
+    async def __aenter__(self) -> "AsyncLNbits":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def create_account(self, name: str) -> Account:
+        """
+        Creates an LNbits account. See LNbits.create_account.
+        """
+        response = await self._request(
+            "create_account",
+            "POST",
+            self._ACCOUNTS_RESOURCE,
+            json={
+                "name": name
+            }
+        )
+
+        if response.status_code != 200:
+            raise Exception(
+                f"Couldn't create an account.\n"
+                f"Response status code: {response.status_code}\n"
+                f"Response body: {response.content}"
+            )
+
+        return Account.from_json(response.json())
+
+    async def create_wallet(self, account_api_key: str, name: str) -> Wallet:
+        """
+        Creates an LNbits wallet. See LNbits.create_wallet.
+        """
+        response = await self._request(
+            "create_wallet",
+            "POST",
+            self._WALLETS_RESOURCE,
+            auth_key=account_api_key,
+            json={
+                "name": name
+            }
+        )
+
+        if response.status_code != 200:
+            raise Exception(
+                f"Couldn't create a wallet.\n"
+                f"Response status code: {response.status_code}\n"
+                f"Response body: {response.content}"
+            )
+
+        return Wallet.from_json(response.json())
+
+    async def get_wallet(self, wallet_key: str) -> WalletInfo | None:
+        """
+        Fetches a wallet by its inkey or adminkey. See LNbits.get_wallet.
+        """
+        response = await self._request(
+            "get_wallet",
+            "GET",
+            self._WALLETS_RESOURCE,
+            auth_key=wallet_key,
+            idempotent=True
+        )
+
+        # Wallet not found
+        if response.status_code == 404:
+            return None
+
+        if response.status_code != 200:
+            raise Exception(
+                f"Couldn't fetch the wallet.\n"
+                f"Response status code: {response.status_code}\n"
+                f"Response body: {response.content}"
+            )
+
+        data = response.json()
+        return WalletInfo.from_json(data)
+
+    async def rename_wallet(self, wallet_adminkey: str, name: str) -> None:
+        """
+        Renames a wallet.
+
+        Args:
+            - wallet_adminkey (str): the wallet's adminkey (inkey will NOT work)
+            - name (str): the new name of the wallet
+
+        Raises:
+            - an Exception if the operation did not succeed.
+                Check API reference & response body for details
+        """
+        response = await self._request(
+            "rename_wallet",
+            "PATCH",
+            self._WALLETS_RESOURCE,
+            auth_key=wallet_adminkey,
+            json={
+                "name": name
+            }
+        )
+
+        if response.status_code != 200:
+            raise Exception(
+                f"Couldn't rename the wallet.\n"
+                f"Response status code: {response.status_code}\n"
+                f"Response body: {response.content}"
+            )
+
+    async def create_invoice(
+        self,
+        wallet_key: str,
+        amount_sats: int,
+        memo: str = "",
+        webhook: str | None = None,
+    ) -> Invoice:
+        """
+        Creates an invoice to be paid by another wallet. See LNbits.create_invoice.
+
+        Args:
+            - webhook (str | None): URL LNbits calls once the invoice is paid
+        """
+        body = {
+            "out": False,
+            "amount": amount_sats,
+            "memo": memo
+        }
+        if webhook:
+            body["webhook"] = webhook
+
+        response = await self._request(
+            "create_invoice",
+            "POST",
+            self._PAYMENTS_RESOURCE,
+            auth_key=wallet_key,
+            json=body
+        )
+
+        if response.status_code != 201:
+            raise Exception(
+                f"Couldn't create an invoice.\n"
+                f"Response status code: {response.status_code}\n"
+                f"Response body: {response.content}"
+            )
+
+        return Invoice.from_json(response.json())
+
+    async def pay_invoice(self, wallet_adminkey: str, invoice: str) -> Invoice:
+        """
+        Pays an invoice. See LNbits.pay_invoice.
+        """
+        response = await self._request(
+            "pay_invoice",
+            "POST",
+            self._PAYMENTS_RESOURCE,
+            auth_key=wallet_adminkey,
+            json={
+                "out": True,
+                "bolt11": invoice
+            }
+        )
+
+        if response.status_code != 200:
+            raise Exception(
+                f"Couldn't pay an invoice.\n"
+                f"Response status code: {response.status_code}\n"
+                f"Response body: {response.content}"
+            )
+
+        return Invoice.from_json(response.json())
+
+    async def list_payments(self, wallet_key: str, limit: int = 100) -> list[Invoice]:
+        """
+        Fetches the most recent payments of a wallet, incoming and outgoing,
+        in one request.
+
+        Args:
+            - wallet_key (str): the wallet's inkey or adminkey
+            - limit (int): maximum number of payments returned
+
+        Returns:
+            - a list of Invoice objects, newest first
+        """
+        response = await self._request(
+            "list_payments",
+            "GET",
+            f"{self._PAYMENTS_RESOURCE}?limit={limit}",
+            auth_key=wallet_key,
+            idempotent=True
+        )
+
+        if response.status_code != 200:
+            raise Exception(
+                f"Couldn't list payments.\n"
+                f"Response status code: {response.status_code}\n"
+                f"Response body: {response.content}"
+            )
+
+        return [Invoice.from_json(payment) for payment in response.json()]
+
+    async def get_payment(self, wallet_key: str, payment_hash: str) -> Invoice | None:
+        """
+        Fetches a single payment of a wallet.
+
+        Returns:
+            - an Invoice object, or None if the wallet has no such payment
+        """
+        response = await self._request(
+            "get_payment",
+            "GET",
+            f"{self._PAYMENTS_RESOURCE}/{payment_hash}",
+            auth_key=wallet_key,
+            idempotent=True
+        )
+
+        if response.status_code == 404:
+            return None
+
+        if response.status_code != 200:
+            raise Exception(
+                f"Couldn't fetch the payment.\n"
+                f"Response status code: {response.status_code}\n"
+                f"Response body: {response.content}"
+            )
+
+        data = response.json()
+        payment = Invoice.from_json(data.get("details") or {"payment_hash": payment_hash})
+        payment.status = data.get("status") or (PAYMENT_SUCCESS if data.get("paid") else PAYMENT_PENDING)
+        return payment
+
+    async def transfer(
+        self,
+        from_adminkey: str,
+        to_inkey: str,
+        amount: int,
+        memo: str = "",
+        validate: bool = True,
+        webhook: str | None = None,
+    ) -> Transfer:
+        """
+        Moves sats from one wallet to another with as few sequential
+        round trips as possible.
+
+        The source wallet check and the invoice creation on the receiving
+        wallet don't depend on each other, so they run concurrently and
+        only the payment has to wait: 3 requests in 2 round trips with
+        validation, 2 requests in 2 round trips without it.
+
+        Args:
+            - from_adminkey (str): adminkey of the paying wallet
+            - to_inkey (str): inkey of the receiving wallet
+            - amount (int): the amount in sats
+            - memo (str, default ""): the invoice memo
+            - validate (bool, default True): check that the paying wallet exists first
+            - webhook (str | None): URL LNbits calls once the invoice is paid
+
+        Returns:
+            - a Transfer object with the invoice, the payment and the round trip counts
+
+        Raises:
+            - a TransferError whose stage tells which step failed
+        """
+        invoice_call = self.create_invoice(wallet_key=to_inkey, amount_sats=amount, memo=memo, webhook=webhook)
+        round_trips = 1
+        requests_sent = 1
+
+        if validate:
+            wallet, invoice = await asyncio.gather(
+                self.get_wallet(from_adminkey),
+                invoice_call,
+                return_exceptions=True
+            )
+            requests_sent += 1
+            if isinstance(wallet, Exception):
+                raise TransferError("validate", str(wallet)) from wallet
+            if wallet is None:
+                raise TransferError("wallet", "The paying wallet does not exist")
+        else:
+            try:
+                invoice = await invoice_call
+            except Exception as e:
+                invoice = e
+
+        if isinstance(invoice, Exception):
+            raise TransferError("invoice", str(invoice)) from invoice
+
+        try:
+            payment = await self.pay_invoice(wallet_adminkey=from_adminkey, invoice=invoice.bolt11)
+        except Exception as e:
+            raise TransferError("payment", str(e)) from e
+        round_trips += 1
+        requests_sent += 1
+
+        return Transfer(
+            invoice=invoice,
+            payment=payment,
+            round_trips=round_trips,
+            requests=requests_sent
+        )
+
+    async def _request(
+        self,
+        operation: str,
+        method: str,
+        url: str,
+        auth_key: str | None = None,
+        json: dict | None = None,
+        idempotent: bool = False,
+    ) -> httpx.Response:
+        """
+        Sends a request over the pooled connection set. Idempotent requests
+        are hedged when slow and retried on transport errors and 5xx replies.
+
+        Args:
+            - operation (str): the client method name, used as metrics label
+                and to look up its timeout
+            - method (str): the HTTP method
+            - url (str): the full resource URL
+            - auth_key (str | None): an LNbits key for the X-Api-Key header
+            - json (dict | None): the request body
+            - idempotent (bool): the request may safely be sent more than once
+
+        Returns:
+            - the httpx.Response, whatever its status code
+
+        Raises:
+            - CircuitOpenError if the circuit breaker is open
+            - AdmissionRejected if admission control turned the request away
+            - an httpx.HTTPError if every attempt failed in transport
+        """
+        if not idempotent:
+            return await self._send(operation, method, url, auth_key, json)
+
+        for attempt in range(self._read_retries + 1):
+            last = attempt == self._read_retries
+            if attempt:
+                LNBITS_RETRIES.inc(operation=operation)
+                await asyncio.sleep(backoff_delay(attempt - 1, self._retry_backoff, self._retry_backoff_cap))
+            try:
+                response = await self._hedged(operation, method, url, auth_key, json)
+            except httpx.HTTPError:
+                if last:
+                    raise
+                continue
+            if response.status_code < 500 or last:
+                return response
+
+    async def _hedged(
+        self,
+        operation: str,
+        method: str,
+        url: str,
+        auth_key: str | None,
+        json: dict | None,
+    ) -> httpx.Response:
+        """
+        Sends a read, and a duplicate of it if the first attempt is slower
+        than the operation's hedge percentile. The first good reply wins and
+        the other request is cancelled.
+        """
+        window = self._latencies.get(operation)
+        delay = window.percentile(self._hedge_percentile) if window and self._hedge_percentile else None
+        if delay is None:
+            return await self._send(operation, method, url, auth_key, json)
+
+        first = asyncio.ensure_future(self._send(operation, method, url, auth_key, json))
+        pending = {first}
+        failed: asyncio.Future | None = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+
+            LNBITS_HEDGES.inc(operation=operation)
+            pending.add(asyncio.ensure_future(self._send(operation, method, url, auth_key, json)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        return task.result()
+                    if failed is None or task is first:
+                        failed = task
+            # Both attempts failed, report the original one's outcome
+            return failed.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _send(
+        self,
+        operation: str,
+        method: str,
+        url: str,
+        auth_key: str | None,
+        json: dict | None,
+    ) -> httpx.Response:
+        """
+        Sends a single request once admission control lets it through.
+
+        Raises:
+            - AdmissionRejected if LNbits is already busy enough
+        """
+        if self.admission is None:
+            return await self._send_now(operation, method, url, auth_key, json)
+        async with self.admission.admit(auth_key):
+            return await self._send_now(operation, method, url, auth_key, json)
+
+    async def _send_now(
+        self,
+        operation: str,
+        method: str,
+        url: str,
+        auth_key: str | None,
+        json: dict | None,
+    ) -> httpx.Response:
+        """
+        Sends a single request through the circuit breaker and records
+        its latency and outcome in the lnbits_* metrics.
+        """
+        try:
+            probe = self.breaker.before_call()
+        except CircuitOpenError:
+            LNBITS_CIRCUIT_REJECTIONS.inc(operation=operation)
+            raise
+
+        headers = {"X-Api-Key": auth_key} if auth_key is not None else None
+        timeout = self._operation_timeouts.get(operation)
+
+        LNBITS_INFLIGHT.inc(operation=operation)
+        started = time.perf_counter()
+        try:
+            request = self._http.request(
+                method, url, headers=headers, json=json,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+            )
+            if timeout is None:
+                response = await request
+            else:
+                # httpx applies the timeout per phase, this bounds the whole call
+                try:
+                    response = await asyncio.wait_for(request, timeout)
+                except asyncio.TimeoutError:
+                    raise httpx.TimeoutException(f"{operation} took longer than {timeout}s")
+        except httpx.HTTPError:
+            LNBITS_ERRORS.inc(operation=operation, kind="transport")
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # A cancelled hedge says nothing about LNbits' health
+            if probe:
+                self.breaker.abandon_probe()
+            raise
+        finally:
+            LNBITS_INFLIGHT.dec(operation=operation)
+            elapsed = time.perf_counter() - started
+            LNBITS_REQUEST_DURATION.observe(elapsed, operation=operation)
+
+        if response.status_code >= 500:
+            LNBITS_ERRORS.inc(operation=operation, kind="status")
+            self.breaker.record_failure()
+            return response
+
+        # A 404 is how LNbits reports an unknown wallet key, not a failure,
+        # and any other 4xx still means LNbits is up
+        if response.status_code >= 400 and response.status_code != 404:
+            LNBITS_ERRORS.inc(operation=operation, kind="status")
+        self.breaker.record_success()
+        self._latencies.setdefault(operation, LatencyWindow()).add(elapsed)
+        return response
@@ -0,0 +1,230 @@
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass, field
+
+from cache import TTLCache
+from metrics import SETTLEMENT_CHECKS, SETTLEMENTS
+from service import PAYMENT_FAILED, PAYMENT_PENDING, PAYMENT_SUCCESS, AsyncLNbits
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Pending:
+    payment_hash: str
+    wallet_key: str
+    future: asyncio.Future
+    expires_at: float
+    next_check: float
+    delay: float
+    # Set after a hash was missing from its wallet's listing
+    lookup: bool = False
+
+
+@dataclass(order=True)
+class _Scheduled:
+    at: float
+    payment_hash: str = field(compare=False)
+
+
+class SettlementTracker:
+    """
+    Tracks invoices until they are paid.
+
+    Settlement normally arrives through the LNbits webhook, which calls
+    settle(). Invoices whose webhook is late are checked in the background:
+    due invoices are grouped by wallet and each wallet's recent payments are
+    listed in one request, so confirming many invoices costs one request per
+    wallet rather than one per invoice. Every unsuccessful check doubles the
+    delay before the next one, up to `max_delay`.
+    """
+
+    def __init__(
+        self,
+        client: AsyncLNbits,
+        first_check: float = 2.0,
+        max_delay: float = 60.0,
+        expire_after: float = 3600.0,
+        tick: float = 0.5,
+        list_limit: int = 500,
+        concurrency: int = 8,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            - client (AsyncLNbits): the LNbits client used for status checks
+            - first_check (float): seconds the webhook gets before the first check
+            - max_delay (float): longest wait between two checks of an invoice
+            - expire_after (float): seconds after which an unpaid invoice is given up
+            - tick (float): how often due checks are collected into batches
+            - list_limit (int): payments fetched per wallet listing
+            - concurrency (int): wallet listings sent at the same time
+            - clock (callable): monotonic time source, overridable in tests
+        """
+        self._client = client
+        self._first_check = first_check
+        self._max_delay = max_delay
+        self._expire_after = expire_after
+        self._tick = tick
+        self._list_limit = list_limit
+        self._concurrency = concurrency
+        self._clock = clock
+
+        self._pending: dict[str, _Pending] = {}
+        # Check schedule, entries of settled or rescheduled invoices are skipped when popped
+        self._schedule: list[_Scheduled] = []
+        self._task: asyncio.Task | None = None
+        # Webhooks that arrived before their invoice was tracked
+        self._early = TTLCache(ttl=expire_after, maxsize=10000)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._check_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def track(self, payment_hash: str, wallet_key: str) -> asyncio.Future:
+        """
+        Starts tracking an invoice, or joins the tracking already in progress.
+
+        Args:
+            - payment_hash (str): the invoice's payment hash
+            - wallet_key (str): inkey of the wallet that receives the payment
+
+        Returns:
+            - a future that resolves to True once the invoice is paid, or to
+                False if the payment failed or the invoice expired unpaid
+        """
+        pending = self._pending.get(payment_hash)
+        if pending is not None:
+            return pending.future
+
+        settled, paid = self._early.peek(payment_hash)
+        if settled:
+            self._early.invalidate(payment_hash)
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(paid)
+            return future
+
+        now = self._clock()
+        pending = _Pending(
+            payment_hash=payment_hash,
+            wallet_key=wallet_key,
+            future=asyncio.get_running_loop().create_future(),
+            expires_at=now + self._expire_after,
+            next_check=now + self._first_check,
+            delay=self._first_check,
+        )
+        self._pending[payment_hash] = pending
+        heapq.heappush(self._schedule, _Scheduled(pending.next_check, payment_hash))
+        return pending.future
+
+    def settle(self, payment_hash: str, paid: bool = True, source: str = "webhook") -> bool:
+        """
+        Resolves a tracked invoice. A webhook for an invoice that is not
+        tracked yet is remembered for the track() call that follows it.
+
+        Returns:
+            - False if the invoice was not being tracked
+        """
+        pending = self._pending.pop(payment_hash, None)
+        if pending is None:
+            if source == "webhook":
+                self._early.set(payment_hash, paid)
+            return False
+        SETTLEMENTS.inc(source=source, result="paid" if paid else "failed")
+        if not pending.future.done():
+            pending.future.set_result(paid)
+        return True
+
+    def _due(self) -> list[_Pending]:
+        now = self._clock()
+        due = []
+        while self._schedule and self._schedule[0].at <= now:
+            entry = heapq.heappop(self._schedule)
+            pending = self._pending.get(entry.payment_hash)
+            # Skip entries left behind by settled or rescheduled invoices
+            if pending is None or pending.next_check != entry.at:
+                continue
+            if pending.expires_at <= now:
+                self.settle(pending.payment_hash, paid=False, source="expired")
+                continue
+            due.append(pending)
+        return due
+
+    def _reschedule(self, pending: _Pending) -> None:
+        pending.delay = min(pending.delay * 2, self._max_delay)
+        pending.next_check = self._clock() + pending.delay
+        heapq.heappush(self._schedule, _Scheduled(pending.next_check, pending.payment_hash))
+
+    async def _check_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._tick)
+            due = self._due()
+            if not due:
+                continue
+
+            by_wallet: dict[str, list[_Pending]] = {}
+            for pending in due:
+                by_wallet.setdefault(pending.wallet_key, []).append(pending)
+
+            semaphore = asyncio.Semaphore(self._concurrency)
+
+            async def bounded(wallet_key: str, invoices: list[_Pending]) -> None:
+                async with semaphore:
+                    await self._check_wallet(wallet_key, invoices)
+
+            await asyncio.gather(*(
+                bounded(wallet_key, invoices) for wallet_key, invoices in by_wallet.items()
+            ))
+
+    async def _check_wallet(self, wallet_key: str, invoices: list[_Pending]) -> None:
+        # Invoices that fell out of the wallet's recent listing are looked up one by one
+        listed = [pending for pending in invoices if not pending.lookup]
+        lookups = [pending for pending in invoices if pending.lookup]
+        statuses: dict[str, str] = {}
+        listing_done = False
+
+        try:
+            if listed:
+                SETTLEMENT_CHECKS.inc(kind="list")
+                for payment in await self._client.list_payments(wallet_key, limit=self._list_limit):
+                    statuses[payment.payment_hash] = payment.status
+                listing_done = True
+            for pending in lookups:
+                SETTLEMENT_CHECKS.inc(kind="lookup")
+                payment = await self._client.get_payment(wallet_key, pending.payment_hash)
+                if payment is not None:
+                    statuses[pending.payment_hash] = payment.status
+        except Exception as e:
+            logger.warning(
+                "Error checking payment statuses: %s", e,
+                extra={"event": "settlement_check_failed", "invoices": len(invoices)}
+            )
+
+        for pending in invoices:
+            if pending.payment_hash not in self._pending:
+                # Settled by a webhook while the check was running
+                continue
+            status = statuses.get(pending.payment_hash)
+            if status == PAYMENT_SUCCESS:
+                self.settle(pending.payment_hash, paid=True, source="check")
+            elif status == PAYMENT_FAILED:
+                self.settle(pending.payment_hash, paid=False, source="check")
+            else:
+                if status is None and listing_done:
+                    pending.lookup = True
+                self._reschedule(pending)
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from admission import REJECT_QUEUE_FULL, REJECT_RATE, REJECT_WALLET_RATE, AdmissionController, AdmissionRejected
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_wallet_over_its_limit_is_rejected_and_others_are_not():
+    async def main():
+        controller = AdmissionController(wallet_rate=1, wallet_burst=1, max_wait=0, clock=FakeClock())
+        async with controller.admit("a"):
+            pass
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit("a"):
+                pass
+        assert (rejected.value.reason, rejected.value.status_code) == (REJECT_WALLET_RATE, 429)
+        async with controller.admit("b"):
+            pass
+
+    asyncio.run(main())
+
+
+def test_wallet_token_is_given_back_when_the_global_limit_rejects():
+    async def main():
+        controller = AdmissionController(
+            rate=1, burst=1, wallet_rate=1, wallet_burst=2, max_wait=0, clock=FakeClock()
+        )
+        async with controller.admit("other"):
+            pass
+        for _ in range(3):
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with controller.admit("a"):
+                    pass
+            assert rejected.value.reason == REJECT_RATE
+        assert controller._wallet_buckets.peek("a")[1]._tokens == 2
+
+    asyncio.run(main())
+
+
+def test_tokens_are_given_back_when_the_queue_is_full():
+    async def main():
+        controller = AdmissionController(
+            max_in_flight=1, max_queue=0, wallet_rate=1, wallet_burst=1, clock=FakeClock()
+        )
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit("a"):
+                pass
+        assert rejected.value.reason == REJECT_QUEUE_FULL
+        release.set()
+        await holder
+
+        # The rejected call didn't use up the wallet's only token
+        async with controller.admit("a"):
+            pass
+        assert controller.in_flight == 0
+
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_expire_and_least_recently_used_are_evicted():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, maxsize=2, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.peek("a")
+    cache.set("c", 3)
+
+    assert cache.peek("b") == (False, None)
+    assert cache.peek("a") == (True, 1)
+
+    clock.now = 10
+    assert cache.peek("a") == (False, None)
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def main():
+        cache = TTLCache(ttl=10, maxsize=10)
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "value"
+
+        values = await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)))
+        assert values == ["value"] * 5
+        assert calls == 1
+        assert await cache.get_or_fetch("k", fetch) == "value"
+        assert (cache.hits, cache.misses) == (1, 5)
+
+    asyncio.run(main())
+
+
+def test_fetch_errors_reach_every_waiter_and_are_not_cached():
+    async def main():
+        cache = TTLCache(ttl=10, maxsize=10)
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(cache.get_or_fetch("k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(cache) == 0
+
+    asyncio.run(main())
+
+
+def test_waiters_take_over_when_the_fetching_caller_is_cancelled():
+    async def main():
+        cache = TTLCache(ttl=10, maxsize=10)
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        leader = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get_or_fetch("k", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # One waiter fetched again and the others shared its result
+        assert await asyncio.gather(*waiters) == [2, 2, 2]
+        assert cache.peek("k") == (True, 2)
+
+    asyncio.run(main())
+
+
+def test_invalidation_keeps_an_earlier_fetch_from_storing_its_value():
+    async def main():
+        cache = TTLCache(ttl=10, maxsize=10)
+        started = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            await asyncio.sleep(0.01)
+            return "stale"
+
+        task = asyncio.create_task(cache.get_or_fetch("k", fetch))
+        await started.wait()
+        cache.invalidate("k")
+
+        assert await task == "stale"
+        assert cache.peek("k") == (False, None)
+
+    asyncio.run(main())
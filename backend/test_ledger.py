@@ -0,0 +1,159 @@
+import asyncio
+
+import httpx
+import pytest
+
+from fake_lnbits import create_app
+from ledger import ENTRY_BET, ENTRY_DEPOSIT, ENTRY_WITHDRAWAL, InsufficientFunds, Ledger, LedgerSettler
+from payouts import PayoutEngine
+from service import AsyncLNbits
+
+
+HOUSE_INKEY, HOUSE_ADMINKEY = "house-in", "house-admin"
+USER_INKEY, USER_ADMINKEY = "user-in", "user-admin"
+
+
+def fake_lnbits(house_sats: int = 1000):
+    app = create_app(seed_wallets=[(HOUSE_INKEY, HOUSE_ADMINKEY, house_sats), (USER_INKEY, USER_ADMINKEY, 0)])
+    node = app.state.node
+    return app, node, node.keys[HOUSE_INKEY][0], node.keys[USER_INKEY][0]
+
+
+def settler(ledger: Ledger, app) -> LedgerSettler:
+    client = AsyncLNbits(
+        "http://lnbits.test",
+        transport=httpx.ASGITransport(app=app),
+        retry_backoff=0,
+        hedge_percentile=None,
+        breaker_threshold=100,
+    )
+    return LedgerSettler(ledger, PayoutEngine(client, payer_adminkey=HOUSE_ADMINKEY, retry_backoff=0))
+
+
+def test_entries_with_the_same_ref_are_posted_once_across_restarts(tmp_path):
+    path = str(tmp_path / "ledger.db")
+
+    async def first_run():
+        ledger = Ledger(path)
+        assert await ledger.post(USER_INKEY, 100, ENTRY_DEPOSIT, ref="deposit:a") is not None
+        assert await ledger.post(USER_INKEY, 100, ENTRY_DEPOSIT, ref="deposit:a") is None
+        await ledger.post(USER_INKEY, -30, ENTRY_BET)
+        assert ledger.balance(USER_INKEY) == 70
+        await ledger.close()
+
+    async def second_run():
+        ledger = Ledger(path)
+        assert ledger.balance(USER_INKEY) == 70
+        assert await ledger.post(USER_INKEY, 100, ENTRY_DEPOSIT, ref="deposit:a") is None
+        assert ledger.balance(USER_INKEY) == 70
+        await ledger.close()
+
+    asyncio.run(first_run())
+    asyncio.run(second_run())
+
+
+def test_overdrafts_and_wrong_signed_entries_are_rejected(tmp_path):
+    async def main():
+        ledger = Ledger(str(tmp_path / "ledger.db"))
+        await ledger.post(USER_INKEY, 50, ENTRY_DEPOSIT)
+
+        with pytest.raises(InsufficientFunds):
+            await ledger.post(USER_INKEY, -51, ENTRY_BET)
+        with pytest.raises(ValueError):
+            await ledger.post(USER_INKEY, 10, ENTRY_WITHDRAWAL)
+        with pytest.raises(ValueError):
+            await ledger.post(USER_INKEY, -10, ENTRY_DEPOSIT)
+        assert ledger.balance(USER_INKEY) == 50
+        await ledger.close()
+
+    asyncio.run(main())
+
+
+def test_paid_withdrawal_is_closed(tmp_path):
+    async def main():
+        app, node, house, user = fake_lnbits()
+        ledger = Ledger(str(tmp_path / "ledger.db"))
+        await ledger.post(USER_INKEY, 100, ENTRY_DEPOSIT)
+
+        result = await settler(ledger, app).withdraw(USER_INKEY, 60)
+
+        assert result.status == "paid"
+        assert ledger.balance(USER_INKEY) == 40
+        assert user.balance_msat == 60_000
+        assert await ledger.open_withdrawals() == []
+        await ledger.close()
+
+    asyncio.run(main())
+
+
+def test_withdrawal_without_an_invoice_is_reversed(tmp_path):
+    async def main():
+        app, node, house, user = fake_lnbits()
+        ledger = Ledger(str(tmp_path / "ledger.db"))
+        # LNbits doesn't know the wallet, so no invoice can be created for it
+        await ledger.post("gone-in", 100, ENTRY_DEPOSIT)
+
+        result = await settler(ledger, app).withdraw("gone-in", 100)
+
+        assert result.status == "failed"
+        assert ledger.balance("gone-in") == 100
+        assert await ledger.open_withdrawals() == []
+        await ledger.close()
+
+    asyncio.run(main())
+
+
+def test_withdrawal_with_an_unknown_outcome_stays_debited_until_resumed(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    app, node, house, user = fake_lnbits(house_sats=0)
+
+    async def first_run():
+        ledger = Ledger(path)
+        await ledger.post(USER_INKEY, 100, ENTRY_DEPOSIT)
+
+        result = await settler(ledger, app).withdraw(USER_INKEY, 100)
+
+        # The invoice may still be paid, giving the sats back could pay them twice
+        assert result.status == "pending"
+        assert ledger.balance(USER_INKEY) == 0
+        [withdrawal] = await ledger.open_withdrawals()
+        assert withdrawal.bolt11 in node.invoices
+        await ledger.close()
+
+    async def after_restart():
+        ledger = Ledger(path)
+        report = await settler(ledger, app).resume()
+
+        assert report.paid == 1
+        assert ledger.balance(USER_INKEY) == 0
+        assert user.balance_msat == 100_000
+        assert len(node.invoices) == 1
+        assert await ledger.open_withdrawals() == []
+        await ledger.close()
+
+    asyncio.run(first_run())
+    house.balance_msat = 1000_000
+    asyncio.run(after_restart())
+
+
+def test_resumed_withdrawal_paid_in_the_meantime_is_not_paid_again(tmp_path):
+    async def main():
+        app, node, house, user = fake_lnbits(house_sats=0)
+        ledger = Ledger(str(tmp_path / "ledger.db"))
+        await ledger.post(USER_INKEY, 100, ENTRY_DEPOSIT)
+        ledger_settler = settler(ledger, app)
+        await ledger_settler.withdraw(USER_INKEY, 100)
+
+        # The payment went through after all
+        [withdrawal] = await ledger.open_withdrawals()
+        house.balance_msat = 100_000
+        node.pay_invoice(house, withdrawal.bolt11)
+
+        report = await ledger_settler.resume()
+
+        assert report.paid == 1
+        assert ledger.balance(USER_INKEY) == 0
+        assert (house.balance_msat, user.balance_msat) == (0, 100_000)
+        await ledger.close()
+
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from bet_store import Bet, MatchClosed, SQLiteBetStore
+from match_locks import MatchLocks
+
+
+def test_resolution_waits_for_placements_and_holds_new_ones_back():
+    async def main():
+        locks = MatchLocks()
+        events = []
+        placing = asyncio.Event()
+
+        async def place(name, delay):
+            async with locks.placing("m"):
+                placing.set()
+                events.append(f"{name} start")
+                await asyncio.sleep(delay)
+                events.append(f"{name} end")
+
+        async def resolve():
+            async with locks.resolving("m"):
+                events.append("resolve")
+                await asyncio.sleep(0.01)
+
+        first = asyncio.create_task(place("first", 0.02))
+        await placing.wait()
+        resolution = asyncio.create_task(resolve())
+        await asyncio.sleep(0)
+        late = asyncio.create_task(place("late", 0))
+        await asyncio.gather(first, resolution, late)
+
+        assert events == ["first start", "first end", "resolve", "late start", "late end"]
+        assert len(locks) == 0
+
+    asyncio.run(main())
+
+
+def test_matches_do_not_wait_on_each_other():
+    async def main():
+        locks = MatchLocks()
+        async with locks.resolving("a"):
+            async with locks.placing("b"):
+                pass
+
+    asyncio.run(asyncio.wait_for(main(), 1))
+
+
+def test_cancelled_resolution_releases_the_match():
+    async def main():
+        locks = MatchLocks()
+        release = asyncio.Event()
+
+        async def place():
+            async with locks.placing("m"):
+                await release.wait()
+
+        placement = asyncio.create_task(place())
+        await asyncio.sleep(0)
+        resolution = asyncio.create_task(locks.resolving("m").__aenter__())
+        await asyncio.sleep(0)
+        resolution.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await resolution
+        release.set()
+        await placement
+
+        # Neither new placements nor the next resolution are blocked
+        async with locks.placing("m"):
+            pass
+        async with locks.resolving("m"):
+            pass
+        assert len(locks) == 0
+
+    asyncio.run(asyncio.wait_for(main(), 1))
+
+
+def test_bets_on_a_match_closed_by_another_process_are_rejected(tmp_path):
+    async def main():
+        path = str(tmp_path / "bets.db")
+        # Two stores on one file stand for two worker processes
+        placing, resolving = SQLiteBetStore(path), SQLiteBetStore(path)
+        bet = Bet(match_id="m", outcome="a", wallet_inkey="in", wallet_adminkey="admin", amount=10, odds=2.0)
+
+        await placing.add(bet)
+        assert await resolving.close_match("m", "a")
+        with pytest.raises(MatchClosed):
+            await placing.add(bet)
+        assert await placing.count() == 1
+
+    asyncio.run(main())
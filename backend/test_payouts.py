@@ -0,0 +1,149 @@
+import asyncio
+
+import httpx
+
+from fake_lnbits import create_app
+from payouts import PayoutEngine, PayoutOrder
+from service import AsyncLNbits
+
+
+HOUSE_INKEY, HOUSE_ADMINKEY = "house-in", "house-admin"
+WINNER_INKEY, WINNER_ADMINKEY = "winner-in", "winner-admin"
+
+
+def fake_lnbits(house_sats: int = 1000):
+    app = create_app(seed_wallets=[(HOUSE_INKEY, HOUSE_ADMINKEY, house_sats), (WINNER_INKEY, WINNER_ADMINKEY, 0)])
+    node = app.state.node
+    return app, node, node.keys[HOUSE_INKEY][0], node.keys[WINNER_INKEY][0]
+
+
+def payout_engine(app) -> PayoutEngine:
+    client = AsyncLNbits(
+        "http://lnbits.test",
+        transport=httpx.ASGITransport(app=app),
+        retry_backoff=0,
+        hedge_percentile=None,
+        breaker_threshold=100,
+    )
+    return PayoutEngine(client, payer_adminkey=HOUSE_ADMINKEY, retry_backoff=0)
+
+
+def test_orders_are_paid_and_their_invoices_reported():
+    async def main():
+        app, node, house, winner = fake_lnbits()
+        engine = payout_engine(app)
+        invoices = []
+
+        async def record_invoice(order, invoice):
+            invoices.append(invoice.payment_hash)
+
+        report = await engine.run([PayoutOrder(WINNER_INKEY, 100, ref=1)], on_invoice=record_invoice)
+
+        assert report.paid == 1
+        assert report.results[0].ref == 1
+        assert invoices == [report.results[0].checking_id]
+        assert (house.balance_msat, winner.balance_msat) == (900_000, 100_000)
+
+    asyncio.run(main())
+
+
+def test_invoice_paid_by_an_interrupted_run_is_not_paid_again():
+    async def main():
+        app, node, house, winner = fake_lnbits()
+        invoice = node.create_invoice(winner, 100, "Winnings", None)
+        # The run paid it, then stopped before recording the result
+        node.pay_invoice(house, invoice.bolt11)
+
+        report = await payout_engine(app).run([
+            PayoutOrder(WINNER_INKEY, 100, bolt11=invoice.bolt11, payment_hash=invoice.payment_hash)
+        ])
+
+        assert report.paid == 1
+        assert (house.balance_msat, winner.balance_msat) == (900_000, 100_000)
+
+    asyncio.run(main())
+
+
+def test_unpaid_invoice_of_an_earlier_run_is_paid_instead_of_a_new_one():
+    async def main():
+        app, node, house, winner = fake_lnbits()
+        invoice = node.create_invoice(winner, 100, "Winnings", None)
+
+        report = await payout_engine(app).run([
+            PayoutOrder(WINNER_INKEY, 100, bolt11=invoice.bolt11, payment_hash=invoice.payment_hash)
+        ])
+
+        assert report.paid == 1
+        assert invoice.paid
+        assert len(node.invoices) == 1
+
+    asyncio.run(main())
+
+
+def test_unknown_invoice_is_replaced_by_a_new_one():
+    async def main():
+        app, node, house, winner = fake_lnbits()
+
+        report = await payout_engine(app).run([
+            PayoutOrder(WINNER_INKEY, 100, bolt11="lnbcrt100n1gone", payment_hash="0" * 64)
+        ])
+
+        assert report.paid == 1
+        assert winner.balance_msat == 100_000
+
+    asyncio.run(main())
+
+
+def test_payment_with_an_unknown_outcome_is_pending_and_recovered_later():
+    async def main():
+        app, node, house, winner = fake_lnbits(house_sats=0)
+        engine = payout_engine(app)
+        invoices = {}
+
+        async def record_invoice(order, invoice):
+            invoices[order.ref] = invoice
+
+        report = await engine.run([PayoutOrder(WINNER_INKEY, 100, ref=1)], on_invoice=record_invoice)
+        # The invoice exists and may still be paid, so this isn't a failure
+        assert (report.paid, report.failed, report.pending) == (0, 0, 1)
+
+        house.balance_msat = 1000_000
+        invoice = invoices[1]
+        report = await engine.run([
+            PayoutOrder(WINNER_INKEY, 100, ref=1, bolt11=invoice.bolt11, payment_hash=invoice.payment_hash)
+        ])
+
+        assert report.paid == 1
+        assert len(node.invoices) == 1
+        assert winner.balance_msat == 100_000
+
+    asyncio.run(main())
+
+
+def test_payment_is_failed_when_no_invoice_could_be_created():
+    async def main():
+        app, node, house, winner = fake_lnbits()
+
+        report = await payout_engine(app).run([PayoutOrder("unknown-in", 100)])
+
+        assert report.failed == 1
+        assert report.results[0].error
+        assert house.balance_msat == 1000_000
+
+    asyncio.run(main())
+
+
+def test_orders_with_the_same_key_are_paid_once():
+    async def main():
+        app, node, house, winner = fake_lnbits()
+        engine = payout_engine(app)
+        order = PayoutOrder(WINNER_INKEY, 100, key="bet:1")
+
+        first, second = await asyncio.gather(engine.run([order]), engine.run([order]))
+        third = await engine.run([order])
+
+        assert [report.paid for report in (first, second, third)] == [1, 1, 1]
+        assert winner.balance_msat == 100_000
+        assert "wallet_inkey" not in third.to_dict()["results"][0]
+
+    asyncio.run(main())
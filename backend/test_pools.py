@@ -0,0 +1,58 @@
+import pytest
+
+from pools import settle_pool
+
+
+def test_winners_split_the_pool_in_proportion_to_their_stakes():
+    settlement = settle_pool([1, 2, 3], ["a", "a", "b"], [100, 300, 600], "a")
+
+    assert settlement.payouts.tolist() == [250, 750, 0]
+    assert settlement.pool == 1000
+    assert settlement.winning_stake == 400
+    assert not settlement.refunded
+
+
+def test_rounding_remainders_go_to_the_largest_remainders_then_earlier_bets():
+    # 10 sats over three equal stakes: 3 each and one left over for the earliest bet
+    settlement = settle_pool([9, 7, 8, 10], ["a", "a", "a", "b"], [3, 3, 3, 1], "a")
+    assert settlement.payouts.tolist() == [3, 4, 3, 0]
+
+    # 100 * 1 / 3 leaves a remainder of 1, 100 * 2 / 3 one of 2, so the second bet gets the sat
+    settlement = settle_pool([1, 2, 3], ["a", "a", "b"], [1, 2, 97], "a")
+    assert settlement.payouts.tolist() == [33, 67, 0]
+
+
+def test_payouts_add_up_to_the_pool_after_the_rake():
+    stakes = [13, 7, 29, 1, 50, 3]
+    outcomes = ["a", "b", "a", "a", "b", "a"]
+    settlement = settle_pool(range(1, 7), outcomes, stakes, "a", rake_bps=250)
+
+    assert settlement.rake == sum(stakes) * 250 // 10000
+    assert settlement.paid_out == sum(stakes) - settlement.rake
+    assert dict(settlement.payouts_by_bet()).keys() == {1, 3, 4, 6}
+
+
+def test_stakes_are_refunded_when_nobody_backed_the_winner():
+    settlement = settle_pool([1, 2], ["a", "b"], [10, 20], "c", rake_bps=500)
+
+    assert settlement.refunded
+    assert settlement.rake == 0
+    assert settlement.payouts.tolist() == [10, 20]
+
+
+def test_large_stakes_are_split_exactly():
+    big = 2 ** 40
+    settlement = settle_pool([1, 2, 3], ["a", "a", "b"], [big, big + 1, big * 3], "a")
+
+    assert settlement.paid_out == settlement.pool
+    assert settlement.payouts[0] + settlement.payouts[1] == big * 5 + 1
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"bet_ids": [1, 2], "outcomes": ["a"], "amounts": [1, 2]},
+    {"bet_ids": [1], "outcomes": ["a"], "amounts": [-1]},
+    {"bet_ids": [1], "outcomes": ["a"], "amounts": [1], "rake_bps": 10001},
+])
+def test_invalid_input_is_rejected(kwargs):
+    with pytest.raises(ValueError):
+        settle_pool(winning_outcome="a", **kwargs)
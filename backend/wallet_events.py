@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from metrics import WALLET_EVENT_DROPS, WALLET_SUBSCRIBERS
+
+
+class WalletSubscription:
+    """
+    One connection's feed of events for a wallet.
+
+    Events wait in a bounded queue. A connection that lets the queue fill up
+    is cut off rather than slowing everyone else down; the client reconnects
+    and reloads its state.
+    """
+
+    def __init__(self, maxsize: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def _offer(self, event: dict) -> bool:
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            return False
+
+    async def get(self, timeout: float | None = None) -> dict | None:
+        """
+        Waits for the next event.
+
+        Returns:
+            - the event, or None if nothing arrived within timeout
+        """
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class WalletEventBus:
+    """
+    Fans balance and bet status events out to the connections subscribed
+    to a wallet. Publishing costs one dict lookup when nobody is listening
+    and one queue put per subscriber otherwise.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        """
+        Args:
+            - queue_size (int): events buffered per connection before it is dropped
+        """
+        self._queue_size = queue_size
+        self._subscribers: dict[str, set[WalletSubscription]] = {}
+
+    def __len__(self) -> int:
+        """Number of wallets with at least one subscriber."""
+        return len(self._subscribers)
+
+    def subscribe(self, wallet_inkey: str) -> WalletSubscription:
+        subscription = WalletSubscription(self._queue_size)
+        self._subscribers.setdefault(wallet_inkey, set()).add(subscription)
+        WALLET_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, wallet_inkey: str, subscription: WalletSubscription) -> None:
+        subscriptions = self._subscribers.get(wallet_inkey)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        WALLET_SUBSCRIBERS.dec()
+        if not subscriptions:
+            del self._subscribers[wallet_inkey]
+
+    def publish(self, wallet_inkey: str, event_type: str, **fields) -> None:
+        """
+        Sends an event to every connection of a wallet.
+
+        Args:
+            - wallet_inkey (str): the wallet the event concerns
+            - event_type (str): e.g. "balance" or "bet"
+            - fields: the event's payload
+        """
+        subscriptions = self._subscribers.get(wallet_inkey)
+        if not subscriptions:
+            return
+
+        event = {"type": event_type, "ts": time.time(), **fields}
+        for subscription in list(subscriptions):
+            if not subscription._offer(event):
+                WALLET_EVENT_DROPS.inc()
+                self.unsubscribe(wallet_inkey, subscription)
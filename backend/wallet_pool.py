@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from service import AsyncLNbits
+
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pooled_wallets (
+    wallet_id TEXT PRIMARY KEY,
+    adminkey TEXT NOT NULL,
+    inkey TEXT NOT NULL,
+    funded INTEGER NOT NULL DEFAULT 0,
+    -- Epoch time until which a process is funding the wallet
+    funding_until REAL
+);
+"""
+
+
+@dataclass
+class PooledWallet:
+    wallet_id: str
+    adminkey: str
+    inkey: str
+    funded: bool = False
+
+
+class WalletPool:
+    """
+    Keeps a stock of already created and funded wallets so that signup
+    only has to take one from the database.
+
+    The stock lives in SQLite, so it survives restarts and is shared by
+    every process using the same file. A background task tops it back up
+    to `size` whenever it drops below `low_watermark`, provisioning up to
+    `concurrency` wallets at once. A wallet is recorded before it is funded
+    and only handed out once funding succeeded; wallets whose funding
+    failed or was interrupted are funded again later, unless their balance
+    shows the first attempt went through.
+    """
+
+    def __init__(
+        self,
+        client: AsyncLNbits,
+        fund: Callable[[str], Awaitable[bool]],
+        path: str,
+        size: int = 20,
+        low_watermark: int = 5,
+        concurrency: int = 4,
+        retry_delay: float = 5.0,
+        funding_lease: float = 60.0,
+    ):
+        """
+        Args:
+            - client (AsyncLNbits): the LNbits client used to create wallets
+            - fund (callable): async function funding a wallet by inkey, returns success
+            - path (str): the database file, created if missing
+            - size (int): number of wallets the pool is refilled to
+            - low_watermark (int): refill starts when fewer wallets than this are left
+            - concurrency (int): wallets provisioned at the same time
+            - retry_delay (float): seconds to wait after a failed provisioning round
+            - funding_lease (float): seconds a process may take to fund a wallet
+              before another one retries it, also how often the stock is checked
+        """
+        self._client = client
+        self._fund = fund
+        self._size = size
+        self._low_watermark = low_watermark
+        self._concurrency = concurrency
+        self._retry_delay = retry_delay
+        self._funding_lease = funding_lease
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wallet-pool")
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+
+        self._refill_needed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Starts the background refill task. Does nothing for a pool of size 0."""
+        if self._size > 0 and self._task is None:
+            self._refill_needed.set()
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def close(self) -> None:
+        await self._run(self._db.close)
+        self._executor.shutdown(wait=True)
+
+    async def take(self) -> PooledWallet | None:
+        """
+        Hands out a funded wallet, or returns None if none is ready.
+
+        Returns:
+            - PooledWallet | None: the wallet, removed from the pool
+        """
+        if self._size <= 0:
+            return None
+        pooled, left = await self._run(self._take)
+        if left < self._low_watermark:
+            self._refill_needed.set()
+        return pooled
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _take(self) -> tuple[PooledWallet | None, int]:
+        # A single statement, so two processes can't hand out the same wallet
+        row = self._db.execute(
+            "DELETE FROM pooled_wallets WHERE wallet_id = ("
+            "SELECT wallet_id FROM pooled_wallets WHERE funded = 1 ORDER BY rowid LIMIT 1"
+            ") RETURNING wallet_id, adminkey, inkey"
+        ).fetchone()
+        left = self._db.execute("SELECT COUNT(*) FROM pooled_wallets WHERE funded = 1").fetchone()[0]
+        pooled = PooledWallet(wallet_id=row[0], adminkey=row[1], inkey=row[2], funded=True) if row else None
+        return pooled, left
+
+    def _claim_unfunded(self, limit: int) -> tuple[int, list[PooledWallet]]:
+        """
+        Returns:
+            - the number of wallets in the pool, funded or not, and up to
+              `limit` unfunded wallets nobody is funding, now leased to this process
+        """
+        now = time.time()
+        cursor = self._db.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            total = cursor.execute("SELECT COUNT(*) FROM pooled_wallets").fetchone()[0]
+            rows = cursor.execute(
+                "SELECT wallet_id, adminkey, inkey FROM pooled_wallets "
+                "WHERE funded = 0 AND (funding_until IS NULL OR funding_until < ?) "
+                "ORDER BY rowid LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            cursor.executemany(
+                "UPDATE pooled_wallets SET funding_until = ? WHERE wallet_id = ?",
+                [(now + self._funding_lease, row[0]) for row in rows]
+            )
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        return total, [PooledWallet(*row) for row in rows]
+
+    def _insert(self, pooled: PooledWallet) -> None:
+        self._db.execute(
+            "INSERT INTO pooled_wallets (wallet_id, adminkey, inkey, funded, funding_until) "
+            "VALUES (?, ?, ?, 0, ?)",
+            (pooled.wallet_id, pooled.adminkey, pooled.inkey, time.time() + self._funding_lease)
+        )
+
+    def _finish_funding(self, wallet_id: str, funded: bool) -> None:
+        self._db.execute(
+            "UPDATE pooled_wallets SET funded = ?, funding_until = NULL WHERE wallet_id = ?",
+            (int(funded), wallet_id)
+        )
+
+    async def _refill_loop(self) -> None:
+        while True:
+            # Also wakes up now and then for wallets other processes took
+            # or left unfunded
+            try:
+                await asyncio.wait_for(self._refill_needed.wait(), self._funding_lease)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_needed.clear()
+
+            while True:
+                total, unfunded = await self._run(self._claim_unfunded, self._concurrency)
+                missing = min(max(self._size - total, 0), self._concurrency - len(unfunded))
+                if not unfunded and not missing:
+                    break
+
+                results = await asyncio.gather(
+                    *(self._refund(pooled) for pooled in unfunded),
+                    *(self._provision() for _ in range(missing)),
+                    return_exceptions=True
+                )
+
+                failed = False
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.warning(
+                            "Error provisioning pooled wallet: %s", result,
+                            extra={"event": "wallet_provisioning_failed"}
+                        )
+                        failed = True
+                    elif not result:
+                        failed = True
+
+                if failed:
+                    await asyncio.sleep(self._retry_delay)
+
+    async def _provision(self) -> bool:
+        name = f"pool-{uuid.uuid4().hex[:12]}"
+        account = await self._client.create_account(name=name)
+        wallet = await self._client.create_wallet(
+            account_api_key=account.adminkey,
+            name=name
+        )
+        pooled = PooledWallet(wallet_id=wallet.id, adminkey=wallet.adminkey, inkey=wallet.inkey)
+        # Recorded first, so a crash while funding can't lose the wallet
+        await self._run(self._insert, pooled)
+        funded = await self._fund(pooled.inkey)
+        await self._run(self._finish_funding, pooled.wallet_id, funded)
+        return funded
+
+    async def _refund(self, pooled: PooledWallet) -> bool:
+        try:
+            info = await self._client.get_wallet(pooled.inkey)
+            if info is None:
+                # The wallet is gone, nothing left to hand out
+                await self._run(self._delete, pooled.wallet_id)
+                return True
+            # Pool wallets receive nothing but their funding, so any balance
+            # means an earlier attempt paid and only its answer got lost
+            funded = info.balance > 0 or await self._fund(pooled.inkey)
+        except BaseException:
+            await self._run(self._finish_funding, pooled.wallet_id, False)
+            raise
+        await self._run(self._finish_funding, pooled.wallet_id, funded)
+        return funded
+
+    def _delete(self, wallet_id: str) -> None:
+        self._db.execute("DELETE FROM pooled_wallets WHERE wallet_id = ?", (wallet_id,))
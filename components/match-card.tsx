@@ -1,6 +1,6 @@
 "use client"
 
-import { useState } from "react"
+import { useEffect, useState } from "react"
 import Image from "next/image"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent } from "@/components/ui/card"
@@ -46,6 +46,40 @@ export function MatchCard({ match }: MatchCardProps) {
 
   const [hasBetPlaced, setHasBetPlaced] = useState(false)
 
+  // Live prices from the server by outcome, bets are placed at these
+  const [prices, setPrices] = useState<Record<string, number>>({})
+
+  useEffect(() => {
+    fetch(`http://127.0.0.1:80/api/odds/${match.id}`)
+      .then((response) => response.json())
+      .then((data) => {
+        if (data.success) setPrices(data.prices)
+      })
+      .catch((error) => console.error("Error fetching odds:", error))
+  }, [match.id])
+
+  // Follow price changes while the bet dialog is open
+  useEffect(() => {
+    if (!showBetDialog) return
+    const source = new EventSource(`http://127.0.0.1:80/api/odds/${match.id}/stream`)
+    source.onmessage = (event) => {
+      const update = JSON.parse(event.data)
+      // Updates only carry the prices that changed
+      setPrices((current) => ({ ...current, ...update.prices }))
+      if (update.closed) source.close()
+    }
+    return () => source.close()
+  }, [showBetDialog, match.id])
+
+  // The server price, or the listed odds when the server has none
+  const oddsFor = (outcome: string | null) => {
+    if (outcome && prices[outcome] !== undefined) return prices[outcome]
+    if (outcome === match.homeTeam) return Number.parseFloat(match.homeOdds)
+    if (outcome === match.awayTeam) return Number.parseFloat(match.awayOdds)
+    if (outcome === "Draw") return Number.parseFloat(match.drawOdds)
+    return 0
+  }
+
 
 
     // const { satBalance,  } = useWalletAuth()
@@ -180,15 +214,8 @@ const handlePlaceBet = async () => {
     const taprootAddress = `tb1p${Math.random().toString(36).substring(2, 15)}${Math.random().toString(36).substring(2, 15)}`
     setEscrowAddress(taprootAddress)
     
-    // Determine the odds based on selected outcome
-    let odds = 1.0
-    if (selectedOutcome === match.homeTeam) {
-      odds = parseFloat(match.homeOdds)
-    } else if (selectedOutcome === match.awayTeam) {
-      odds = parseFloat(match.awayOdds)
-    } else if (selectedOutcome === "Draw") {
-      odds = parseFloat(match.drawOdds)
-    }
+    // Lowest price accepted is the one shown, without one the bet takes the server's price
+    const odds = prices[selectedOutcome]
     
     // Convert betAmount to number
     const amount = Number.parseInt(betAmount)
@@ -225,8 +252,8 @@ const handlePlaceBet = async () => {
       setEscrowStatus("Finalizing transaction...")
       await new Promise(resolve => setTimeout(resolve, 800)) // Small delay for visual effect
       
-      // Calculate potential winnings
-      const potentialWinnings = Math.floor(amount * odds)
+      // Calculate potential winnings at the price the bet was placed at
+      const potentialWinnings = Math.floor(amount * data.odds)
       
       // Important: Use the refreshBalance function from context
       // This is the key change needed
@@ -359,19 +386,19 @@ const handlePlaceBet = async () => {
                       <div className="flex items-center space-x-2">
                         <RadioGroupItem value={match.homeTeam} id="home" />
                         <Label htmlFor="home" className="flex-1">
-                          {match.homeTeam} <span className="text-amber-500 ml-2">({match.homeOdds})</span>
+                          {match.homeTeam} <span className="text-amber-500 ml-2">({oddsFor(match.homeTeam).toFixed(2)})</span>
                         </Label>
                       </div>
                       <div className="flex items-center space-x-2">
                         <RadioGroupItem value="Draw" id="draw" />
                         <Label htmlFor="draw" className="flex-1">
-                          Draw <span className="text-amber-500 ml-2">({match.drawOdds})</span>
+                          Draw <span className="text-amber-500 ml-2">({oddsFor("Draw").toFixed(2)})</span>
                         </Label>
                       </div>
                       <div className="flex items-center space-x-2">
                         <RadioGroupItem value={match.awayTeam} id="away" />
                         <Label htmlFor="away" className="flex-1">
-                          {match.awayTeam} <span className="text-amber-500 ml-2">({match.awayOdds})</span>
+                          {match.awayTeam} <span className="text-amber-500 ml-2">({oddsFor(match.awayTeam).toFixed(2)})</span>
                         </Label>
                       </div>
                     </RadioGroup>
@@ -391,13 +418,7 @@ const handlePlaceBet = async () => {
                       </div>
                       <div className="text-xs text-muted-foreground">
                         Potential win:{" "}
-                        {selectedOutcome === match.homeTeam
-                          ? (Number.parseInt(betAmount) * Number.parseFloat(match.homeOdds)).toLocaleString()
-                          : selectedOutcome === match.awayTeam
-                            ? (Number.parseInt(betAmount) * Number.parseFloat(match.awayOdds)).toLocaleString()
-                            : selectedOutcome === "Draw"
-                              ? (Number.parseInt(betAmount) * Number.parseFloat(match.drawOdds)).toLocaleString()
-                              : 0}{" "}
+                        {Math.floor(Number.parseInt(betAmount) * oddsFor(selectedOutcome)).toLocaleString()}{" "}
                         sats
                       </div>
                     </div>
@@ -458,15 +479,15 @@ const handlePlaceBet = async () => {
 
         <div className="grid grid-cols-3 border-t border-zinc-800 text-center">
           <button className="py-2 hover:bg-zinc-800 transition-colors">
-            <div className="text-sm font-medium">{match.homeOdds}</div>
+            <div className="text-sm font-medium">{oddsFor(match.homeTeam).toFixed(2)}</div>
             <div className="text-xs text-muted-foreground">Home</div>
           </button>
           <button className="py-2 border-x border-zinc-800 hover:bg-zinc-800 transition-colors">
-            <div className="text-sm font-medium">{match.drawOdds}</div>
+            <div className="text-sm font-medium">{oddsFor("Draw").toFixed(2)}</div>
             <div className="text-xs text-muted-foreground">Draw</div>
           </button>
           <button className="py-2 hover:bg-zinc-800 transition-colors">
-            <div className="text-sm font-medium">{match.awayOdds}</div>
+            <div className="text-sm font-medium">{oddsFor(match.awayTeam).toFixed(2)}</div>
             <div className="text-xs text-muted-foreground">Away</div>
           </button>
         </div>
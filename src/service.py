@@ -1,3 +1,4 @@
+import logging
 import requests
 import json
 # Removed NamedTuple import as models are now separate
@@ -5,6 +6,8 @@ from .models import Account, Wallet, Invoice, PaymentResult
 
 # Removed NamedTuple definitions for Account, Wallet, Invoice, PaymentResult
 
+logger = logging.getLogger(__name__)
+
 class LNbitsError(Exception):
     """Custom exception for LNbits API errors."""
     pass
@@ -17,7 +20,7 @@ class LNbits:
         if not base_url.startswith("http"):
             base_url = f"https://{base_url}"
         self.base_url = base_url.rstrip('/')
-        print(f"LNbits client initialized for URL: {self.base_url}")
+        logger.debug("LNbits client initialized", extra={"url": self.base_url})
 
     def _make_request(self, method: str, endpoint: str, api_key: str = None, **kwargs):
         """Helper method to make HTTP requests to the LNbits API."""
@@ -31,7 +34,7 @@ class LNbits:
             response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"HTTP Request failed: {e}")
+            logger.warning("HTTP request failed: %s", e, extra={"endpoint": endpoint})
             # Attempt to parse error details from LNbits response if available
             error_detail = "Unknown error"
             try:
@@ -44,14 +47,14 @@ class LNbits:
 
     def create_account(self, name: str) -> Account:
         """Creates a new user account."""
-        print(f"Attempting to create account: {name}")
+        logger.debug("Creating account", extra={"account_name": name})
         # Note: LNbits account creation might be manual or handled differently depending on deployment
         # This is a placeholder assuming an endpoint exists, which might not be standard.
         # You might need to manage accounts/users directly in your LNbits instance.
         
         # Placeholder: Simulate account creation if no direct API endpoint exists
         # In a real scenario, you might fetch admin key from config or environment variables
-        print("Placeholder: Simulating account creation.")
+        logger.debug("Placeholder: Simulating account creation.")
         # Replace with actual logic if an API endpoint becomes available or use pre-configured keys
         return Account(id="simulated_admin_id", name=name, adminkey="simulated_admin_key")
 
@@ -70,7 +73,7 @@ class LNbits:
 
     def create_wallet(self, account_api_key: str, name: str) -> Wallet:
         """Creates a new wallet for a user."""
-        print(f"Attempting to create wallet: {name}")
+        logger.debug("Creating wallet", extra={"wallet_name": name})
         try:
             data = self._make_request(
                 'POST',
@@ -78,18 +81,18 @@ class LNbits:
                 api_key=account_api_key,
                 json={'name': name}
             )
-            print(f"Wallet creation response: {data}")
+            logger.debug("Wallet created", extra={"wallet_id": data.get("id")})
             # Ensure the keys exist in the response
             if not all(k in data for k in ['id', 'adminkey', 'inkey', 'name']):
                 raise LNbitsError(f"Incomplete data received for wallet '{name}' creation.")
             return Wallet(id=data['id'], name=data['name'], adminkey=data['adminkey'], inkey=data['inkey'])
         except LNbitsError as e:
-            print(f"Failed to create wallet '{name}': {e}")
+            logger.error("Failed to create wallet: %s", e, extra={"wallet_name": name})
             raise
 
     def create_invoice(self, wallet_key: str, amount_sats: int, memo: str) -> Invoice:
         """Creates a new invoice."""
-        print(f"Attempting to create invoice for {amount_sats} sats with memo: {memo}")
+        logger.debug("Creating invoice", extra={"amount_sats": amount_sats, "memo": memo})
         try:
             payload = {
                 "out": False, # We are creating an invoice to receive funds
@@ -103,17 +106,17 @@ class LNbits:
                 api_key=wallet_key, # Use invoice/read key
                 json=payload
             )
-            print(f"Invoice creation response: {data}")
+            logger.debug("Invoice created", extra={"payment_hash": data.get("payment_hash")})
             if not all(k in data for k in ['payment_hash', 'payment_request', 'checking_id']):
                  raise LNbitsError("Incomplete data received for invoice creation.")
             return Invoice(payment_hash=data['payment_hash'], payment_request=data['payment_request'], checking_id=data['checking_id'])
         except LNbitsError as e:
-            print(f"Failed to create invoice: {e}")
+            logger.error("Failed to create invoice: %s", e)
             raise
 
     def pay_invoice(self, wallet_adminkey: str, invoice: str) -> PaymentResult:
         """Pays an invoice."""
-        print(f"Attempting to pay invoice: {invoice[:30]}..." ) # Print prefix for brevity
+        logger.debug("Paying invoice", extra={"invoice": invoice[:30]}) # Log prefix for brevity
         try:
             payload = {
                 "out": True, # We are paying an invoice
@@ -125,39 +128,39 @@ class LNbits:
                 api_key=wallet_adminkey, # Use admin key for paying out
                 json=payload
             )
-            print(f"Payment response: {data}")
+            logger.debug("Invoice paid", extra={"payment_hash": data.get("payment_hash")})
             if not all(k in data for k in ['payment_hash', 'checking_id']):
                  raise LNbitsError("Incomplete data received for payment.")
             return PaymentResult(payment_hash=data['payment_hash'], checking_id=data['checking_id'])
         except LNbitsError as e:
-            print(f"Failed to pay invoice: {e}")
+            logger.error("Failed to pay invoice: %s", e)
             raise
 
     def check_invoice_status(self, wallet_key: str, payment_hash: str):
         """Checks the status of an invoice/payment."""
-        print(f"Checking status for payment hash: {payment_hash}")
+        logger.debug("Checking payment status", extra={"payment_hash": payment_hash})
         try:
             data = self._make_request(
                 'GET',
                 f'/api/v1/payments/{payment_hash}',
                 api_key=wallet_key # Use invoice/read key
             )
-            print(f"Payment status response: {data}")
+            logger.debug("Payment status", extra={"payment_hash": payment_hash, "paid": data.get("paid")})
             return data # Returns payment details, including 'paid': True/False
         except LNbitsError as e:
-            print(f"Failed to check payment status: {e}")
+            logger.error("Failed to check payment status: %s", e, extra={"payment_hash": payment_hash})
             raise
 
     def get_wallet_details(self, wallet_key: str) -> Wallet:
         """Fetches details for a specific wallet, including balance."""
-        print(f"Fetching details for wallet associated with key: {wallet_key[:10]}...")
+        logger.debug("Fetching wallet details")
         try:
             data = self._make_request(
                 'GET',
                 '/api/v1/wallet', # Endpoint to fetch wallet details
                 api_key=wallet_key # Use invoice/read key
             )
-            print(f"Wallet details response: {data}")
+            logger.debug("Wallet details fetched", extra={"wallet_id": data.get("id")})
             # Ensure the necessary keys exist in the response
             # Adjust keys based on actual LNbits response (e.g., 'balance')
             if not all(k in data for k in ['id', 'adminkey', 'inkey', 'name', 'balance']):
@@ -171,5 +174,5 @@ class LNbits:
                 balance_msat=data['balance'] 
             )
         except LNbitsError as e:
-            print(f"Failed to get wallet details: {e}")
+            logger.error("Failed to get wallet details: %s", e)
             raise 
\ No newline at end of file